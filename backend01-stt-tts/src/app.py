@@ -1,18 +1,39 @@
-from flask import Flask, request, jsonify
+import time
+_import_started = time.time()
+
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
-import uuid
+import base64
 from datetime import datetime
-import time
-import requests
 import json
+import itertools
 import logging
 import sys
 import subprocess
+from concurrent.futures import CancelledError
 
-# Import Vosk components at the top level
-from vosk import Model, KaldiRecognizer
-import wave
+from voices import VoiceRegistry, UnknownVoice
+from stt_models import SttModelRegistry, UnknownLanguage, SttModelUnavailable, SttModelLoading
+from tts_cache import TtsCache
+from tts_batch import BatchRunner, BatchBusy
+from artifacts import ArtifactStore
+from llm_client import LlmClient, CircuitBreaker, LlmBackendError
+from pipeline import VoiceTurnPipeline
+from stt import (decode_to_pcm, transcribe_pcm, transcribe_segments, pcm_chunks, resample_pcm, parse_sample_rate,
+                 InvalidPcm, StreamingSession, SAMPLE_RATE)
+from startup import StartupTracker, Degraded
+from history import ChatHistoryStore, open_persistence
+from metrics import LatencyMetrics, Trace, render_gauge
+from stt_pool import SttWorkerPool, PoolSaturated
+from vad import VoiceActivityDetector
+from cancellation import CancellationRegistry, Cancelled, total_reclaimed
+
+# WebSocket support is optional; streaming STT is disabled without flask-sock
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 # Set up logging with configurable level
 def setup_logging(debug_level=0):
@@ -41,38 +62,249 @@ logger = setup_logging(DEBUG_LEVEL)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+sock = Sock(app) if Sock else None
 
-# In-memory storage for chat history (in production, use a database)
-chat_history = {}
+# Chat history: bounded per-user ring buffers under a global memory cap,
+# optionally persisted write-behind to SQLite or a JSON-lines log
+HISTORY_MAX_MESSAGES = int(os.getenv('HISTORY_MAX_MESSAGES', '100'))
+HISTORY_MEMORY_MB = int(os.getenv('HISTORY_MEMORY_MB', '64'))
+HISTORY_BACKEND = os.getenv('HISTORY_BACKEND', 'memory').lower()  # memory, sqlite or log
+HISTORY_PATH = os.getenv('HISTORY_PATH', '/tmp/chat_history.db' if HISTORY_BACKEND == 'sqlite' else '/tmp/chat_history.jsonl')
+chat_history = ChatHistoryStore(HISTORY_MAX_MESSAGES, HISTORY_MEMORY_MB * 1024 * 1024,
+                                persistence=open_persistence(HISTORY_BACKEND, HISTORY_PATH))
 
 # Piper TTS configuration
-PIPER_AVAILABLE = False
-PIPER_MODEL_PATH = os.path.expanduser("/app/piper_models/en_US-lessac-medium.onnx")
-PIPER_MODEL_CONFIG = os.path.expanduser("/app/piper_models/en_US-lessac-medium.onnx.json")
+PIPER_MODEL_PATH = os.path.expanduser(os.getenv('PIPER_MODEL_PATH', "/app/piper_models/en_US-lessac-medium.onnx"))
+PIPER_MODEL_CONFIG = os.path.expanduser(os.getenv('PIPER_MODEL_CONFIG', "/app/piper_models/en_US-lessac-medium.onnx.json"))
+PIPER_ENGINE_WORKERS = int(os.getenv('PIPER_ENGINE_WORKERS', '1'))
 
-# Check if Piper is available
-try:
-    subprocess.run(["piper", "--help"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    if os.path.exists(PIPER_MODEL_PATH) and os.path.exists(PIPER_MODEL_CONFIG):
-        PIPER_AVAILABLE = True
-        logger.info("Piper TTS initialized successfully")
-    else:
-        logger.warning("Piper TTS installed but model files not found")
-except (subprocess.CalledProcessError, FileNotFoundError):
-    logger.warning("Piper TTS not available")
+# Voices are the .onnx/.onnx.json pairs in PIPER_MODELS_DIR, picked per request
+# with "voice". The default voice (PIPER_MODEL_PATH) loads at startup, the
+# others on first use; resident voices are unloaded least-recently-used once
+# their models exceed PIPER_VOICE_MEMORY_MB
+PIPER_MODELS_DIR = os.path.expanduser(os.getenv('PIPER_MODELS_DIR', os.path.dirname(PIPER_MODEL_PATH)))
+PIPER_DEFAULT_VOICE = os.path.basename(PIPER_MODEL_PATH)[:-len('.onnx')] if PIPER_MODEL_PATH.endswith('.onnx') \
+    else os.path.basename(PIPER_MODEL_PATH)
+PIPER_VOICE_MEMORY_MB = int(os.getenv('PIPER_VOICE_MEMORY_MB', '512'))
+tts_voices = VoiceRegistry(PIPER_MODELS_DIR, PIPER_DEFAULT_VOICE, PIPER_VOICE_MEMORY_MB * 1024 * 1024,
+                           workers=PIPER_ENGINE_WORKERS)
+tts_voices.discover()
+tts_voices.add(PIPER_DEFAULT_VOICE, PIPER_MODEL_PATH, PIPER_MODEL_CONFIG)
 
-# Initialize Vosk model
-VOSK_MODEL_PATH = None
-try:
-    VOSK_MODEL_PATH = Model(lang="en-us")
+# Synthesized audio is cached by text + voice, in memory and on disk
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', '/tmp/tts_cache')
+TTS_CACHE_MEMORY_MB = int(os.getenv('TTS_CACHE_MEMORY_MB', '32'))
+TTS_CACHE_DISK_MB = int(os.getenv('TTS_CACHE_DISK_MB', '256'))
+tts_cache = TtsCache(TTS_CACHE_DIR, TTS_CACHE_MEMORY_MB * 1024 * 1024, TTS_CACHE_DISK_MB * 1024 * 1024,
+                     voice_id=os.path.basename(PIPER_MODEL_PATH))
+
+# Batch pre-rendering into the TTS cache, run as a tts_batch.py subprocess
+# with TTS_BATCH_WORKERS synthesis processes (default: one per core), one
+# batch per server worker at a time
+TTS_BATCH_WORKERS = int(os.getenv('TTS_BATCH_WORKERS', str(os.cpu_count() or 1)))
+TTS_BATCH_MAX_TEXTS = int(os.getenv('TTS_BATCH_MAX_TEXTS', '10000'))
+tts_batch = BatchRunner(TTS_CACHE_DIR, TTS_CACHE_DISK_MB, TTS_BATCH_WORKERS)
+
+# Generated audio waiting to be fetched through /tts/<filename>
+TTS_ARTIFACT_MEMORY_MB = int(os.getenv('TTS_ARTIFACT_MEMORY_MB', '64'))
+TTS_ARTIFACT_TTL = int(os.getenv('TTS_ARTIFACT_TTL', '300'))  # seconds kept after the first fetch
+TTS_ARTIFACT_UNFETCHED_TTL = int(os.getenv('TTS_ARTIFACT_UNFETCHED_TTL', '600'))  # max wait for the first fetch
+tts_artifacts = ArtifactStore(TTS_ARTIFACT_MEMORY_MB * 1024 * 1024, TTS_ARTIFACT_TTL, TTS_ARTIFACT_UNFETCHED_TTL)
+
+# LLM backend client: pooled connections, retries and a circuit breaker
+LLM_BACKEND_URL = os.getenv('LLM_BACKEND_URL', 'http://localhost:5002')
+# Set to backend02-llm/src to call the LLM backend in-process instead of over HTTP
+LLM_IN_PROCESS_PATH = os.getenv('LLM_IN_PROCESS_PATH')
+llm_client = LlmClient(
+    LLM_BACKEND_URL,
+    connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('LLM_READ_TIMEOUT', '30')),
+    retries=int(os.getenv('LLM_RETRIES', '2')),
+    pool_size=int(os.getenv('LLM_POOL_SIZE', '10')),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv('LLM_BREAKER_THRESHOLD', '5')),
+        reset_timeout=float(os.getenv('LLM_BREAKER_RESET', '10'))
+    ),
+    in_process_path=LLM_IN_PROCESS_PATH
+)
+
+# Vosk models by language, picked per request with "lang". VOSK_LANG is the
+# default and loads at startup from VOSK_MODEL_PATH; an explicit local
+# directory avoids resolving (and possibly downloading) a model by language.
+# Other languages come from VOSK_MODELS ("de=/models/de,fr=/models/fr") or the
+# vosk-model-* directories in VOSK_MODELS_DIR, load on first use, and are
+# unloaded least-recently-used beyond VOSK_MEMORY_MB
+VOSK_MODEL_PATH = os.getenv('VOSK_MODEL_PATH')
+VOSK_LANG = os.getenv('VOSK_LANG', 'en-us')
+VOSK_MODELS = os.getenv('VOSK_MODELS', '')
+VOSK_MODELS_DIR = os.getenv('VOSK_MODELS_DIR')
+# Answer voice requests with a placeholder transcription instead of running
+# Vosk, e.g. to benchmark the rest of the pipeline without a model
+STT_SIMULATION = os.getenv('STT_SIMULATION', 'false').lower() == 'true'
+VOSK_MEMORY_MB = int(os.getenv('VOSK_MEMORY_MB', '4096'))
+stt_models = SttModelRegistry(VOSK_LANG, VOSK_MEMORY_MB * 1024 * 1024)
+for entry in filter(None, VOSK_MODELS.split(',')):
+    lang, _, path = entry.partition('=')
+    stt_models.add(lang.strip(), os.path.expanduser(path.strip()))
+if VOSK_MODELS_DIR:
+    stt_models.discover(os.path.expanduser(VOSK_MODELS_DIR))
+if VOSK_MODEL_PATH or VOSK_LANG.lower() not in stt_models.paths:
+    stt_models.add(VOSK_LANG, VOSK_MODEL_PATH)
+
+# Bounded STT worker pool sharing the loaded Vosk model
+STT_WORKERS = int(os.getenv('STT_WORKERS', str(os.cpu_count() or 1)))
+STT_MAX_QUEUE = int(os.getenv('STT_MAX_QUEUE', str(STT_WORKERS * 2)))
+stt_pool = SttWorkerPool(STT_WORKERS, STT_MAX_QUEUE)
+
+# Voice activity detection: silence is trimmed before Vosk, clips without
+# speech skip STT and the LLM, and long recordings are split at pauses into
+# segments of up to VAD_MAX_SEGMENT_SECONDS that decode in parallel
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() == 'true'
+vad = VoiceActivityDetector(
+    threshold_db=float(os.getenv('VAD_THRESHOLD_DB', '-45')),
+    margin_db=float(os.getenv('VAD_MARGIN_DB', '12')),
+    min_speech_ms=int(os.getenv('VAD_MIN_SPEECH_MS', '120')),
+    min_silence_ms=int(os.getenv('VAD_MIN_SILENCE_MS', '300')),
+    padding_ms=int(os.getenv('VAD_PADDING_MS', '150')),
+    max_segment_s=float(os.getenv('VAD_MAX_SEGMENT_SECONDS', '15'))
+)
+
+def load_vosk_model():
+    """Load the default language's Vosk model; the others load when first requested"""
+    if STT_SIMULATION or not stt_models.installed:
+        raise Degraded("Vosk not in use, voice requests get simulated transcriptions")
+    if stt_models.get() is None:
+        raise Degraded(f"Vosk model for {VOSK_LANG} not available, voice requests get 503")
     logger.info("Vosk model initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Vosk model: {e}")
-    VOSK_MODEL_PATH = None
+
+def load_piper():
+    """Load the default voice; the others load when first requested"""
+    if tts_voices.get() is None:
+        raise Degraded("Piper TTS not available, replies are text only")
+
+def warm_up_stt():
+    """Decode half a second of silence so the first request skips Kaldi's cold start"""
+    if stt_models.available:
+        transcribe_pcm(stt_models.get(), [bytes(SAMPLE_RATE)])
+
+def warm_up_tts():
+    """Synthesize a short phrase once per default voice worker to warm up onnxruntime"""
+    if tts_voices.available:
+        tts_engine = tts_voices.get()
+        for _ in range(tts_engine.workers):
+            tts_engine.synthesize("Hello.")
+
+# Models load and warm up in the background so the server is live at once;
+# /ready turns healthy when they are done. With MODEL_LOADING=preload (set by
+# gunicorn.conf.py) the default Vosk model loads here, before the workers
+# fork, so they share it; Piper's onnxruntime sessions do not survive fork and
+# load per worker, as do Vosk models for other languages.
+MODEL_LOADING = os.getenv('MODEL_LOADING', 'background').lower()
+startup = StartupTracker(started=_import_started)
+WORKER_STARTUP_STEPS = [("piper_load", load_piper), ("warmup_stt", warm_up_stt), ("warmup_tts", warm_up_tts)]
+if MODEL_LOADING == 'preload':
+    startup.step("vosk_load", load_vosk_model)
+else:
+    startup.run_in_background([("vosk_load", load_vosk_model)] + WORKER_STARTUP_STEPS)
+startup.record("import", time.time() - _import_started)
+
+# Cancellation tokens of in-flight turns by request id and user, so a stop
+# (barge-in) can kill their Piper process, drop queued STT/TTS work and abort
+# the LLM generation; /voice/stop waits up to CANCEL_WAIT seconds for them
+cancellations = CancellationRegistry()
+CANCEL_WAIT = float(os.getenv('CANCEL_WAIT', '1.0'))
+
+# Per-stage latency histograms fed by request traces, served on /metrics
+metrics = LatencyMetrics('sts_backend01')
+
+@app.before_request
+def start_trace():
+    # Reuse the caller's request id so one turn can be followed across services
+    g.trace = Trace(metrics, request.headers.get('X-Request-ID'))
+
+@app.after_request
+def finish_trace(response):
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['X-Request-ID'] = trace.request_id
+        if trace.spans:
+            logger.debug(f"[TRACE] {trace.request_id} {request.path} {trace.describe()}")
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage latency histograms and process gauges in Prometheus text format"""
+    stt_stats = stt_pool.stats()
+    voice_stats = tts_voices.stats()
+    stt_model_stats = stt_models.stats()
+    status = startup.status()
+    body = metrics.render()
+    body += render_gauge("sts_backend01_startup_step_seconds", "Duration of each startup step",
+                         {f'step="{name}"': ms / 1000 for name, ms in status["timings"].items()})
+    body += render_gauge("sts_backend01_ready", "1 once models are loaded and warmed up", {"": int(status["ready"])})
+    body += render_gauge("sts_backend01_cancelled_work", "Work cut short by cancelled turns, by kind",
+                         {f'kind="{kind}"': amount for kind, amount in cancellations.stats()["reclaimed"].items()})
+    body += render_gauge("sts_backend01_tts_voice_bytes", "Estimated memory of resident Piper voices",
+                         {'state="resident"': voice_stats["bytes"], 'state="budget"': voice_stats["budget"]})
+    body += render_gauge("sts_backend01_stt_model_bytes", "Resident memory of each loaded Vosk model",
+                         {f'lang="{lang}"': stt_model_stats["models"][lang]["resident_bytes"]
+                          for lang in stt_model_stats["resident"]})
+    body += render_gauge("sts_backend01_stt_model_load_seconds", "Last load time of each Vosk model",
+                         {f'lang="{lang}"': info["load_ms"] / 1000 for lang, info in stt_model_stats["models"].items()})
+    body += render_gauge("sts_backend01_stt_pool_jobs", "STT jobs running or waiting",
+                         {'state="active"': stt_stats["active"], 'state="queued"': stt_stats["queued"]})
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/health')
+def health_check():
+    """Liveness: the process is up and serving, whether or not models are loaded"""
+    return jsonify({"status": "alive", "uptime": round(time.time() - startup.started, 3)})
+
+@app.route('/ready')
+def readiness_check():
+    """Readiness: 200 once startup has finished without error; missing engines are listed as degraded"""
+    return jsonify(startup.status()), 200 if startup.ready else 503
 
 @app.route('/')
 def index():
-    return jsonify({"message": "STT/TTS Backend Server Running", "version": "1.0"})
+    return jsonify({"message": "STT/TTS Backend Server Running", "version": "1.0", "stt_pool": stt_pool.stats(),
+                    "tts_cache": tts_cache.stats(),
+                    "tts_voices": tts_voices.stats(),
+                    "stt_models": stt_models.stats(),
+                    "tts_artifacts": tts_artifacts.stats(),
+                    "startup": startup.status(),
+                    "chat_history": chat_history.stats(),
+                    "llm_client": {"mode": llm_client.mode, "circuit": llm_client.breaker.state}})
+
+@app.route('/voices')
+def list_voices():
+    """Available Piper voices, which are resident, and their load times"""
+    return jsonify(tts_voices.stats())
+
+@app.route('/stt/models')
+def list_stt_models():
+    """Vosk model languages, which are resident, and their load times and memory"""
+    return jsonify(stt_models.stats())
+
+@app.errorhandler(UnknownVoice)
+def unknown_voice(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(UnknownLanguage)
+def unknown_language(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(InvalidPcm)
+def invalid_pcm(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(SttModelUnavailable)
+def stt_model_unavailable(e):
+    return jsonify({"error": str(e)}), 503
+
+@app.errorhandler(SttModelLoading)
+def stt_model_loading(e):
+    return jsonify({"error": str(e), "startup": startup.status()}), 503, {'Retry-After': '5'}
 
 @app.route('/chat/text', methods=['POST'])
 def handle_text_chat():
@@ -84,55 +316,67 @@ def handle_text_chat():
         
         if not message:
             return jsonify({"error": "Message is required"}), 400
+        voice = tts_voices.resolve(data.get('voice'))
+        cancel = open_turn(user_id)
             
         # Forward text to LLM backend (backend02-llm)
         llm_latency = 0
         try:
-            llm_response = requests.post('http://localhost:5002/generate', 
-                                       json={'prompt': message}, 
-                                       timeout=30)
-            
-            if llm_response.status_code == 200:
-                llm_data = llm_response.json()
-                response_text = llm_data.get('response', '')
-                # Extract latency information from LLM response
-                if 'latency' in llm_data and 'processing' in llm_data['latency']:
-                    llm_latency = llm_data['latency']['processing']
-            else:
-                # If LLM backend returns an error, we still want to show a response
-                response_text = "Error: Unable to get response from LLM backend"
+            with g.trace.span("llm"):
+                llm_data = llm_client.generate(message, priority='text', request_id=g.trace.request_id,
+                                               **llm_session(user_id))
+            response_text = llm_data.get('response', '')
+            # Extract latency information from LLM response
+            if 'latency' in llm_data and 'processing' in llm_data['latency']:
+                llm_latency = llm_data['latency']['processing']
+            record_llm_spans(g.trace, llm_data.get('latency', {}))
+        except LlmBackendError as e:
+            logger.warning(f"[WORKFLOW] LLM backend rejected the request: {e}")
+            # If LLM backend returns an error, we still want to show a response
+            response_text = "Error: Unable to get response from LLM backend"
         except Exception as e:
             print(f"Error calling LLM backend: {e}")
             # If there's a network error, we still want to show a response
             response_text = "Error: Unable to connect to LLM backend"
         
+        if cancel.cancelled:
+            return cancelled_response(cancel)
+        
         # Store in chat history
         store_chat_message(user_id, "user", message)
         store_chat_message(user_id, "ai", response_text)
         
         # Convert LLM response to speech using Piper TTS for text chat as well
-        tts_file_path = None
+        tts_file = None
         tts_time = 0
-        if PIPER_AVAILABLE:
+        tts_engine = tts_voices.get(voice) if tts_voices.available else None
+        if tts_engine:
             tts_start_time = time.time()
-            tts_file_path = text_to_speech(response_text, user_id)
+            tts_file = text_to_speech(response_text, user_id, tts_engine, cancel)
             tts_time = time.time() - tts_start_time
+            g.trace.record("tts_synthesis", tts_time)
         
+        g.trace.record("chat_text_total", time.time() - g.trace.started)
         response_data = {
             "status": "success",
             "response": response_text,
+            "voice": voice,
             "timestamp": datetime.now().isoformat(),
+            "request_id": g.trace.request_id,
             "latency": {
                 "processing": llm_latency,
-                "tts": round(tts_time * 1000) if tts_time > 0 else 0
+                "tts": round(tts_time * 1000) if tts_time > 0 else 0,
+                "spans": g.trace.describe()
             }
         }
         
         # Include TTS file path if available
-        if tts_file_path and os.path.exists(tts_file_path):
-            response_data["tts_file"] = f"/tts/{os.path.basename(tts_file_path)}"
+        if tts_file:
+            response_data["tts_file"] = f"/tts/{tts_file}"
         
         return jsonify(response_data)
+    except UnknownVoice as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -143,42 +387,73 @@ def handle_voice_chat():
     start_time = time.time()
     
     try:
-        # Check if audio file is present in request
-        if 'audio' not in request.files:
+        # Raw PCM bodies carry their fields in the query string, uploads in the form
+        pcm_rate = pcm_upload_rate()
+        if not pcm_rate and 'audio' not in request.files:
             logger.warning("[VALIDATION] No audio file provided in voice chat request")
             return jsonify({"error": "No audio file provided"}), 400
             
-        audio_file = request.files['audio']
-        user_id = request.form.get('user_id', 'anonymous')
+        audio_file = request.files['audio'] if not pcm_rate else None
+        user_id = request.values.get('user_id', 'anonymous')
+        # "stream" leaves synthesis to /tts/stream so playback can start on the first sentence
+        tts_mode = request.values.get('tts_mode', 'file')
         
-        if audio_file.filename == '':
+        if audio_file is not None and audio_file.filename == '':
             logger.warning("[VALIDATION] No audio file selected in voice chat request")
             return jsonify({"error": "No audio file selected"}), 400
             
-        logger.debug(f"[WORKFLOW] Voice chat - User ID: {user_id}, Audio filename: {audio_file.filename}")
+        voice = tts_voices.resolve(request.values.get('voice'))
+        lang = stt_models.resolve(request.values.get('lang'))
+        logger.debug(f"[WORKFLOW] Voice chat - User ID: {user_id}, "
+                     f"audio: {f'{pcm_rate} Hz PCM' if pcm_rate else audio_file.filename}, voice: {voice}, lang: {lang}")
+        cancel = open_turn(user_id)
             
-        # Save the audio file temporarily
-        temp_audio_path = f"/tmp/temp_audio_{user_id}.webm"
-        audio_file.save(temp_audio_path)
-        logger.debug(f"[WORKFLOW] Audio file saved to {temp_audio_path}")
+        # Keep the upload in memory; it is piped straight into the decoder
+        with g.trace.span("upload_save"):
+            audio_bytes = read_pcm_body() if pcm_rate else audio_file.read()
         
-        # Process audio file with Vosk STT
-        if VOSK_MODEL_PATH:
+        # Process audio with Vosk STT on the worker pool
+        stt_timings = {}
+        speech = {}
+        stt_model = stt_model_for(lang)
+        if stt_model:
             logger.debug("[WORKFLOW] Processing audio with Vosk STT")
-            transcribed_text = transcribe_with_vosk(temp_audio_path)
+            stt_spans = {}
+            stt_job = stt_pool.submit(transcribe_with_vosk, stt_model, audio_bytes, stt_spans, speech, cancel,
+                                      pcm_rate)
+            drop_when_cancelled(cancel, stt_job)
+            transcribed_text = stt_job.result()
+            stt_timings = stt_job.timings()
+            record_stt_spans(g.trace, stt_job, stt_spans)
         else:
             # Fallback to simulation if Vosk model is not available
             logger.debug("[WORKFLOW] Vosk not available, using simulation")
             time.sleep(0.3)  # Simulate 300ms STT processing
             transcribed_text = "This is a placeholder transcription of your voice message"
-            # Clean up temp file
-            if os.path.exists(temp_audio_path):
-                os.remove(temp_audio_path)
         
         stt_end_time = time.time()
         stt_time = stt_end_time - start_time
         logger.debug(f"[WORKFLOW] STT completed - Time: {stt_time*1000:.2f}ms, Transcription: {transcribed_text[:50]}...")
         
+        # An empty clip ends here, without an LLM round trip or TTS
+        if no_speech(speech):
+            g.trace.record("chat_voice_total", stt_time)
+            logger.info(f"[API CALL] Completed /chat/voice - No speech detected, total time: {stt_time*1000:.2f}ms")
+            return jsonify({
+                "status": "no_speech",
+                "transcription": "",
+                "response": "",
+                "vad": speech,
+                "timestamp": datetime.now().isoformat(),
+                "request_id": g.trace.request_id,
+                "latency": {
+                    "stt": round(stt_time * 1000),
+                    "stt_queue": stt_timings.get("queue_wait", 0),
+                    "stt_decode": stt_timings.get("decode", 0),
+                    "spans": g.trace.describe()
+                }
+            })
+        
         # Store in chat history
         store_chat_message(user_id, "user_voice", transcribed_text)
         
@@ -186,101 +461,437 @@ def handle_voice_chat():
         llm_latency = 0
         try:
             logger.debug("[WORKFLOW] Forwarding transcription to LLM backend")
-            llm_response = requests.post('http://localhost:5002/generate', 
-                                       json={'prompt': transcribed_text}, 
-                                       timeout=30)
-            
-            if llm_response.status_code == 200:
-                llm_data = llm_response.json()
-                response_text = llm_data.get('response', '')
-                # Extract latency information from LLM response
-                if 'latency' in llm_data and 'processing' in llm_data['latency']:
-                    llm_latency = llm_data['latency']['processing']
-                logger.debug(f"[WORKFLOW] LLM response received - Latency: {llm_latency}ms")
-            else:
-                # If LLM backend returns an error, we still want to show a response
-                response_text = "Error: Unable to get response from LLM backend"
-                logger.warning(f"[WORKFLOW] LLM backend returned error status: {llm_response.status_code}")
+            with g.trace.span("llm"):
+                llm_data = llm_client.generate(transcribed_text, priority='voice', request_id=g.trace.request_id,
+                                               **llm_session(user_id))
+            response_text = llm_data.get('response', '')
+            # Extract latency information from LLM response
+            if 'latency' in llm_data and 'processing' in llm_data['latency']:
+                llm_latency = llm_data['latency']['processing']
+            record_llm_spans(g.trace, llm_data.get('latency', {}))
+            logger.debug(f"[WORKFLOW] LLM response received - Latency: {llm_latency}ms")
+        except LlmBackendError as e:
+            # If LLM backend returns an error, we still want to show a response
+            response_text = "Error: Unable to get response from LLM backend"
+            logger.warning(f"[WORKFLOW] LLM backend returned error status: {e.status_code}")
         except Exception as e:
             logger.error(f"[WORKFLOW] Error calling LLM backend: {e}")
             # If there's a network error, we still want to show a response
             response_text = "Error: Unable to connect to LLM backend"
         
+        if cancel.cancelled:
+            return cancelled_response(cancel)
         store_chat_message(user_id, "ai", response_text)
         
         # Convert LLM response to speech using Piper TTS
-        tts_file_path = None
-        if PIPER_AVAILABLE:
+        tts_file = None
+        tts_time = 0
+        tts_engine = None
+        if tts_voices.available and tts_mode == 'stream':
+            logger.debug("[WORKFLOW] TTS deferred to /tts/stream")
+        elif tts_voices.available:
+            tts_engine = tts_voices.get(voice)
+        if tts_engine:
             logger.debug("[WORKFLOW] Converting response to speech with Piper TTS")
-            tts_file_path = text_to_speech(response_text, user_id)
-            tts_time = time.time() - stt_end_time
+            tts_start_time = time.time()
+            tts_file = text_to_speech(response_text, user_id, tts_engine, cancel)
+            tts_time = time.time() - tts_start_time
+            g.trace.record("tts_synthesis", tts_time)
             logger.debug(f"[WORKFLOW] TTS completed - Time: {tts_time*1000:.2f}ms")
-        else:
-            # Simulate TTS processing time
-            time.sleep(0.2)  # Simulate 200ms TTS processing
-            tts_time = 0.2
-            logger.debug("[WORKFLOW] Piper TTS not available, using simulation")
+        elif tts_mode != 'stream':
+            # No synthesis happened, so none is reported
+            logger.debug("[WORKFLOW] Piper TTS not available, skipping TTS")
         
         total_time = time.time() - start_time
+        g.trace.record("chat_voice_total", total_time)
         logger.info(f"[API CALL] Completed /chat/voice - Total time: {total_time*1000:.2f}ms")
         
         response_data = {
             "status": "success",
             "transcription": transcribed_text,
             "response": response_text,
+            "lang": lang,
+            "voice": voice,
             "timestamp": datetime.now().isoformat(),
+            "request_id": g.trace.request_id,
             "latency": {
                 "stt": round(stt_time * 1000),  # Convert to milliseconds
+                "stt_queue": stt_timings.get("queue_wait", 0),
+                "stt_decode": stt_timings.get("decode", 0),
                 "llm": llm_latency,
-                "tts": round(tts_time * 1000) if tts_time > 0 else 200  # Convert to milliseconds
+                "tts": round(tts_time * 1000),  # Convert to milliseconds
+                "spans": g.trace.describe()
             }
         }
+        if speech:
+            response_data["vad"] = speech
         
         # Include TTS file path if available
-        if tts_file_path and os.path.exists(tts_file_path):
-            response_data["tts_file"] = f"/tts/{os.path.basename(tts_file_path)}"
+        if tts_file:
+            response_data["tts_file"] = f"/tts/{tts_file}"
+        elif tts_voices.available and tts_mode == 'stream':
+            response_data["tts_stream"] = "/tts/stream"
         
         return jsonify(response_data)
+    except PoolSaturated as e:
+        return jsonify({"error": str(e)}), 503, {'Retry-After': '1'}
+    except (UnknownVoice, UnknownLanguage, InvalidPcm) as e:
+        return jsonify({"error": str(e)}), 400
+    except SttModelLoading as e:
+        return stt_model_loading(e)
+    except SttModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except (Cancelled, CancelledError):
+        return cancelled_response(g.cancel)
     except Exception as e:
         logger.error(f"[ERROR] Exception in /chat/voice: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/chat/voice/stream', methods=['POST'])
+def handle_voice_chat_stream():
+    """Handle voice chat with overlapped STT -> LLM -> TTS, streamed back as NDJSON"""
+    logger.info("[API CALL] POST /chat/voice/stream - Processing pipelined voice chat")
+    start_time = time.time()
+    # Raw PCM bodies carry their fields in the query string, uploads in the form
+    pcm_rate = pcm_upload_rate()
+    user_id = request.values.get('user_id', 'anonymous')
+    # Text already recognized over /stt/stream skips the STT stage
+    transcription = request.values.get('transcription') if not pcm_rate else None
+    voice = tts_voices.resolve(request.values.get('voice'))
+    lang = stt_models.resolve(request.values.get('lang'))
+    audio_bytes = None
+    
+    if pcm_rate:
+        with g.trace.span("upload_save"):
+            audio_bytes = read_pcm_body()
+    elif transcription is None:
+        if 'audio' not in request.files:
+            logger.warning("[VALIDATION] No audio file provided in voice chat request")
+            return jsonify({"error": "No audio file provided"}), 400
+        
+        audio_file = request.files['audio']
+        if audio_file.filename == '':
+            logger.warning("[VALIDATION] No audio file selected in voice chat request")
+            return jsonify({"error": "No audio file selected"}), 400
+        
+        with g.trace.span("upload_save"):
+            audio_bytes = audio_file.read()
+    
+    # Queue STT before the stream starts so saturation can still be a 503
+    cancel = open_turn(user_id)
+    stt_job = None
+    stt_spans = {}
+    speech = {}
+    stt_model = stt_model_for(lang) if transcription is None else None
+    if stt_model:
+        try:
+            stt_job = stt_pool.submit(transcribe_with_vosk, stt_model, audio_bytes, stt_spans, speech, cancel,
+                                      pcm_rate)
+        except PoolSaturated as e:
+            return jsonify({"error": str(e)}), 503, {'Retry-After': '1'}
+        drop_when_cancelled(cancel, stt_job)
+    
+    trace = g.trace
+    
+    def generate():
+        try:
+            yield from run_turn()
+        except GeneratorExit:
+            # The client hung up (e.g. the browser aborted the fetch): stop the turn's work too
+            cancel.cancel("disconnected")
+            raise
+    
+    def run_turn():
+        # STT has to finish before the LLM can start, so it runs up front
+        try:
+            if transcription is not None:
+                transcribed_text = transcription or "Could not transcribe audio"
+            elif stt_job:
+                transcribed_text = stt_job.result()
+            else:
+                cancel.wait(0.3)  # Simulate 300ms STT processing
+                transcribed_text = "This is a placeholder transcription of your voice message"
+            cancel.check()
+        except (Cancelled, CancelledError):
+            yield ndjson_event("cancelled", **cancel.describe())
+            return
+        except Exception as e:
+            logger.error(f"[ERROR] STT failed in /chat/voice/stream: {e}")
+            yield ndjson_event("error", stage="stt", error=str(e))
+            return
+        
+        stt_time = time.time() - start_time
+        stt_latency = {"stt": round(stt_time * 1000)}
+        if stt_job:
+            record_stt_spans(trace, stt_job, stt_spans)
+            stt_latency.update({"stt_queue": stt_job.timings()["queue_wait"], "stt_decode": stt_job.timings()["decode"]})
+        if no_speech(speech):
+            # Nothing to answer: skip the LLM round trip and TTS
+            trace.record("chat_voice_stream_total", stt_time)
+            logger.info(f"[API CALL] Completed /chat/voice/stream - No speech detected, "
+                        f"total time: {stt_time*1000:.2f}ms")
+            stt_latency["spans"] = trace.describe()
+            yield ndjson_event("no_speech", vad=speech, request_id=trace.request_id, latency=stt_latency)
+            return
+        store_chat_message(user_id, "user_voice", transcribed_text)
+        yield ndjson_event("transcription", text=transcribed_text, lang=lang, latency=stt_latency,
+                           **({"vad": speech} if speech else {}))
+        
+        # LLM tokens and TTS segments now flow concurrently
+        pipeline = VoiceTurnPipeline(start_time, stt_time, cancel)
+        tts_engine = tts_voices.get(voice) if tts_voices.available else None
+        synthesize = (lambda text: synthesize_cached(text, tts_engine, cancel)) if tts_engine else None
+        llm_events = llm_client.stream(transcribed_text, priority='voice', request_id=trace.request_id,
+                                       **llm_session(user_id))
+        for event in pipeline.run(llm_events, synthesize):
+            if event["type"] == "audio":
+                event["audio"] = base64.b64encode(event["audio"]).decode('ascii')
+            yield ndjson_event(event.pop("type"), **event)
+        
+        if cancel.cancelled:
+            logger.info(f"[API CALL] Cancelled /chat/voice/stream - reclaimed {cancel.describe()['reclaimed']}")
+            yield ndjson_event("cancelled", response=pipeline.response, **cancel.describe())
+            return
+        response_text = pipeline.response or "Error: Unable to connect to LLM backend"
+        store_chat_message(user_id, "ai", response_text)
+        
+        latency = pipeline.latency()
+        record_llm_spans(trace, latency["llm_backend"])
+        if synthesize:
+            trace.record("tts_synthesis", latency["tts"] / 1000)
+            trace.record("first_audio", latency["first_audio"] / 1000)
+        trace.record("chat_voice_stream_total", latency["total"] / 1000)
+        latency["spans"] = trace.describe()
+        logger.info(f"[API CALL] Completed /chat/voice/stream - Total time: {latency['total']}ms, "
+                    f"overlap: {latency['overlap']}ms")
+        yield ndjson_event("done", response=response_text, voice=voice, timestamp=datetime.now().isoformat(),
+                           request_id=trace.request_id, latency=latency)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def stream_stt(ws):
+    """Recognize speech incrementally from audio chunks sent over a WebSocket
+
+    The client sends compressed audio as binary messages and {"type": "end"}
+    when the user stops talking; partial and final results are pushed back as
+    JSON text messages while the audio is still arriving. The language is
+    picked with ?lang= on the WebSocket URL.
+    """
+    logger.info("[API CALL] WS /stt/stream - Streaming speech recognition")
+    try:
+        stt_model = stt_model_for(request.args.get('lang'))
+    except (UnknownLanguage, SttModelUnavailable) as e:
+        ws.send(json.dumps({"type": "error", "error": str(e)}))
+        return
+    if not stt_model:
+        ws.send(json.dumps({"type": "error", "error": "Vosk model not available"}))
+        return
+    try:
+        # ?sample_rate= means the binary messages are raw PCM16, which skips ffmpeg
+        pcm_rate = parse_sample_rate(request.args['sample_rate']) if 'sample_rate' in request.args else None
+    except InvalidPcm as e:
+        ws.send(json.dumps({"type": "error", "error": str(e)}))
+        return
+    
+    session = StreamingSession(stt_model, pcm_rate=pcm_rate)
+    try:
+        while True:
+            # Poll so recognizer events are relayed even while the client is quiet
+            message = ws.receive(timeout=0.05)
+            if isinstance(message, bytes):
+                session.feed(message)
+            elif message is not None and json.loads(message).get("type") == "end":
+                break
+            for event in session.drain_events():
+                ws.send(json.dumps(event))
+        
+        end_time = time.time()
+        transcription = session.finish()
+        for event in session.drain_events():
+            ws.send(json.dumps(event))
+        
+        finalize_time = time.time() - end_time
+        g.trace.record("stt_finalize", finalize_time)
+        logger.info(f"[API CALL] Completed /stt/stream - Finalized {finalize_time*1000:.2f}ms after end of speech")
+        ws.send(json.dumps({
+            "type": "final",
+            "text": transcription if transcription else "Could not transcribe audio",
+            "latency": {
+                "stt": round(finalize_time * 1000),  # Decode time left once the user stopped talking
+                "session": round((time.time() - session.started) * 1000)
+            }
+        }))
+    except Exception as e:
+        logger.error(f"[ERROR] Exception in /stt/stream: {e}")
+    finally:
+        session.close()
+
+if sock:
+    sock.route('/stt/stream')(stream_stt)
+else:
+    logger.warning("flask-sock not installed, WebSocket streaming STT disabled")
+
 @app.route('/tts/<filename>')
 def serve_tts_file(filename):
-    """Serve TTS audio files"""
+    """Serve TTS audio from the artifact store with Range and ETag support"""
     logger.info(f"[API CALL] GET /tts/{filename} - Serving TTS file")
+    serve_start_time = time.time()
     try:
-        from flask import send_file, make_response
-        file_path = f"/tmp/{filename}"
-        if os.path.exists(file_path):
-            logger.debug(f"[WORKFLOW] Serving TTS file: {file_path}")
-            response = make_response(send_file(file_path))
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Content-Type'] = 'audio/wav'
-            return response
+        artifact_id = filename[:-len('.wav')] if filename.endswith('.wav') else filename
+        artifact = tts_artifacts.get(artifact_id)
+        if artifact is not None:
+            data, etag = artifact.data, artifact.etag
         else:
-            logger.warning(f"[WORKFLOW] TTS file not found: {file_path}")
+            # Ids are cache keys, and the cache reads clips from its shared
+            # directory, so audio expired here or generated by another worker
+            # or the batch renderer is still served
+            data = tts_cache.get(artifact_id) if tts_cache.path_for_filename(filename) else None
+            etag = artifact_id
+        
+        if data is None:
+            logger.warning(f"[WORKFLOW] TTS file not found: {filename}")
             return jsonify({"error": "TTS file not found"}), 404
+        
+        response = Response(data, mimetype='audio/wav')
+        response.set_etag(etag)
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['Cache-Control'] = f'private, max-age={TTS_ARTIFACT_TTL}'
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        # Handles If-None-Match (304) and Range (206) requests
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+        g.trace.record("file_serve", time.time() - serve_start_time)
+        return response
     except Exception as e:
         logger.error(f"[ERROR] Exception in /tts/{filename}: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/tts/stream', methods=['POST'])
+def stream_tts():
+    """Stream synthesized audio sentence by sentence as NDJSON"""
+    logger.info("[API CALL] POST /tts/stream - Streaming TTS")
+    data = request.get_json() or {}
+    text = data.get('text', '')
+    
+    if not text:
+        return jsonify({"error": "Text is required"}), 400
+    tts_engine = tts_voices.get(data.get('voice')) if tts_voices.available else None
+    if tts_engine is None:
+        return jsonify({"error": "Piper TTS not available"}), 503
+    cancel = open_turn(data.get('user_id', 'anonymous'))
+    
+    def generate():
+        start_time = time.time()
+        first_audio_time = 0
+        segments = 0
+        synthesize = lambda segment: synthesize_cached(segment, tts_engine, cancel)
+        for index, (segment, wav_bytes) in enumerate(tts_engine.synthesize_stream(text, synthesize, cancel)):
+            if index == 0:
+                first_audio_time = time.time() - start_time
+                logger.debug(f"[WORKFLOW] First TTS chunk ready - Time: {first_audio_time*1000:.2f}ms")
+            segments += 1
+            yield ndjson_event("audio", index=index, text=segment,
+                               audio=base64.b64encode(wav_bytes).decode('ascii'))
+        if cancel.cancelled:
+            yield ndjson_event("cancelled", **cancel.describe())
+            return
+        tts_time = time.time() - start_time
+        logger.info(f"[API CALL] Completed /tts/stream - {segments} segments, Total time: {tts_time*1000:.2f}ms")
+        yield ndjson_event("done", segments=segments, latency={
+            "first_audio": round(first_audio_time * 1000),
+            "tts": round(tts_time * 1000)
+        })
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/tts/batch', methods=['POST'])
+def batch_tts():
+    """Pre-render many texts into the TTS cache, streaming each result as NDJSON
+
+    Takes {"texts": [...], "voice": optional}. Identical texts are rendered
+    once and cached ones are skipped; no LLM call or chat history is
+    involved. Each result carries the input indexes it covers and a
+    tts_file URL; the final done event reports utterances/sec and the
+    realtime factor.
+    """
+    logger.info("[API CALL] POST /tts/batch - Pre-rendering TTS")
+    data = request.get_json() or {}
+    texts = data.get('texts')
+    
+    if not isinstance(texts, list) or not texts:
+        return jsonify({"error": "texts must be a non-empty list"}), 400
+    if len(texts) > TTS_BATCH_MAX_TEXTS:
+        return jsonify({"error": f"At most {TTS_BATCH_MAX_TEXTS} texts per batch"}), 413
+    if not tts_voices.available:
+        return jsonify({"error": "Piper TTS not available"}), 503
+    model_path, config_path = tts_voices.voices[tts_voices.resolve(data.get('voice'))]
+    cancel = open_turn(data.get('user_id', 'anonymous'))
+    # Claim the batch slot (the "started" event) before the stream starts so a busy server is still a 503
+    events = tts_batch.render(texts, model_path, config_path, cancel)
+    try:
+        first_event = next(events)
+    except BatchBusy as e:
+        return jsonify({"error": str(e)}), 503, {'Retry-After': '5'}
+    trace = g.trace
+    
+    def generate():
+        try:
+            for event in itertools.chain([first_event], events):
+                if event["type"] == "result":
+                    event["tts_file"] = f"/tts/{event['key']}.wav"
+                elif event["type"] == "done":
+                    trace.record("tts_batch_total", event["elapsed_ms"] / 1000)
+                    logger.info(f"[API CALL] Completed /tts/batch - {event['rendered']} rendered, "
+                                f"{event['cached']} cached, {event['failed']} failed, "
+                                f"{event['utterances_per_sec']} utterances/s, RTF {event['rtf']}")
+                yield ndjson_event(event.pop("type"), **event)
+        except GeneratorExit:
+            # The client went away: stop rendering texts nobody will collect
+            cancel.cancel("disconnected")
+            events.close()
+            raise
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Frees the batch slot even if the stream is never read
+    response.call_on_close(events.close)
+    return response
+
 @app.route('/voice/stop', methods=['POST'])
 def stop_ai_voice():
-    """Handle AI voice stop command"""
+    """Stop the user's in-flight turns (barge-in) and report the compute reclaimed
+
+    Cancels every turn of user_id, or only request_id when given: queued STT
+    jobs and TTS sentences are dropped, Piper processes are killed and the
+    LLM backend aborts the generation. The LLM backend is always asked to
+    stop the user's session, which also reaches a turn running in another
+    server worker.
+    """
+    logger.info("[API CALL] POST /voice/stop - Cancelling in-flight turns")
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         user_id = data.get('user_id', 'anonymous')
+        request_ids = [data['request_id']] if data.get('request_id') else []
+        owner = None if request_ids or user_id == 'anonymous' else user_id
         
-        # Process voice stop command (placeholder for actual implementation)
-        # In a real implementation, you would:
-        # 1. Send a signal to stop current TTS playback
-        # 2. Update any relevant state
+        turns = cancellations.find(request_ids, owner)
+        session_id = llm_session(user_id).get('session_id') if owner else None
+        llm_report = {}
+        if turns or session_id:
+            # The LLM backend goes first so its report covers the generations we are about to abandon
+            llm_report = llm_client.cancel(request_ids + [turn.request_id for turn in turns], session_id)
+        cancellations.cancel_tokens(turns, reason="barge-in", wait=CANCEL_WAIT)
+        
+        reclaimed = total_reclaimed(turns)
+        for kind, amount in llm_report.get("reclaimed", {}).items():
+            reclaimed[kind] = reclaimed.get(kind, 0) + amount
+        logger.info(f"[API CALL] Completed /voice/stop - {len(turns)} turn(s) cancelled, reclaimed {reclaimed}")
         
         return jsonify({
             "status": "success",
             "message": "AI voice output stopped",
             "user_id": user_id,
+            "cancelled": [turn.describe() for turn in turns],
+            "llm_cancelled": llm_report.get("cancelled", []),
+            "reclaimed": reclaimed,
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
@@ -288,14 +899,27 @@ def stop_ai_voice():
 
 @app.route('/chat/history/<user_id>', methods=['GET'])
 def get_chat_history(user_id):
-    """Retrieve chat history for a specific user"""
+    """Retrieve chat history for a specific user
+
+    Optional query parameters: `limit` returns only the newest messages (at
+    most HISTORY_MAX_MESSAGES), and `before` (a `next_cursor` from a previous
+    page) pages back from there.
+    """
     try:
-        history = chat_history.get(user_id, [])
+        before = request.args.get('before', type=int)
+        limit = request.args.get('limit', type=int)
+        if 'limit' in request.args and (limit is None or limit < 1):
+            return jsonify({"error": "limit must be a positive integer"}), 400
+        if limit is not None:
+            limit = min(limit, HISTORY_MAX_MESSAGES)
+        history, next_cursor, total = chat_history.page(user_id, before=before, limit=limit)
         return jsonify({
             "status": "success",
             "user_id": user_id,
             "history": history,
-            "count": len(history)
+            "count": len(history),
+            "total": total,
+            "next_cursor": next_cursor
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -304,8 +928,9 @@ def get_chat_history(user_id):
 def clear_chat_history(user_id):
     """Clear chat history for a specific user"""
     try:
-        if user_id in chat_history:
-            del chat_history[user_id]
+        chat_history.clear(user_id)
+        # Start the next conversation without the model's memory of this one
+        llm_client.end_session(user_id)
         return jsonify({
             "status": "success",
             "message": f"Chat history cleared for user {user_id}"
@@ -313,133 +938,183 @@ def clear_chat_history(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def open_turn(user_id):
+    """Open the cancellation token of this request; it is closed when the request ends"""
+    # The shared anonymous id is only cancellable by request id
+    g.cancel = cancellations.open(g.trace.request_id, user_id if user_id != 'anonymous' else None)
+    return g.cancel
+
+@app.teardown_request
+def close_turn(exc):
+    # Runs after a streamed response has been fully sent, too
+    cancel = g.pop('cancel', None)
+    if cancel is not None:
+        cancellations.close(cancel)
+
+def drop_when_cancelled(cancel, stt_job):
+    """Remove a queued STT job from the pool if its turn is cancelled first"""
+    def drop():
+        if stt_job.future.cancel():
+            cancel.reclaim("stt_queued")
+    cancel.on_cancel(drop)
+
+def cancelled_response(cancel):
+    """Response for a turn stopped before it finished"""
+    logger.info(f"[WORKFLOW] Turn {cancel.request_id} cancelled, reclaimed {cancel.describe()['reclaimed']}")
+    return jsonify({"status": "cancelled", **cancel.describe()}), 499
+
+def llm_session(user_id):
+    """LLM request options that continue this user's conversation"""
+    # The shared anonymous id would mix unrelated users into one conversation
+    return {"session_id": user_id} if user_id != 'anonymous' else {}
+
 def store_chat_message(user_id, message_type, content):
     """Helper function to store chat messages in memory"""
-    if user_id not in chat_history:
-        chat_history[user_id] = []
-        
-    message_entry = {
-        "id": str(uuid.uuid4()),
-        "type": message_type,  # user, ai, user_voice
-        "content": content,
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    chat_history[user_id].append(message_entry)
-    
-    # Keep only the last 100 messages per user to prevent memory issues
-    if len(chat_history[user_id]) > 100:
-        chat_history[user_id] = chat_history[user_id][-100:]
+    chat_history.append(user_id, message_type, content)
 
-def transcribe_with_vosk(audio_path):
-    """Transcribe audio file using Vosk STT"""
-    wav_path = None
+def transcribe_with_vosk(stt_model, audio_bytes, timings=None, speech=None, cancel=None, pcm_rate=None):
+    """Transcribe uploaded audio using Vosk STT, decoding in memory
+
+    audio_bytes is compressed audio for ffmpeg to decode or, with pcm_rate,
+    PCM16 recorded at that rate, which only needs resampling if it is not
+    16 kHz. With VAD enabled, only the detected speech is recognized and the
+    speech dict receives the VAD stats; a clip without speech returns "" at
+    once. A cancelled turn stops decoding between chunks and raises Cancelled.
+    """
+    if timings is None:
+        timings = {}
     try:
-        # Convert webm to wav using ffmpeg
-        wav_path = audio_path.replace('.webm', '.wav')
-        subprocess.run([
-            'ffmpeg', '-y', '-i', audio_path, '-acodec', 'pcm_s16le', 
-            '-ac', '1', '-ar', '16000', wav_path
-        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        # Open the wave file
-        wf = wave.open(wav_path, "rb")
-        
-        # Check if wave file is valid
-        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
-            raise ValueError("Audio file must be WAV format mono PCM.")
-        
-        # Initialize Vosk recognizer with pre-loaded model
-        rec = KaldiRecognizer(VOSK_MODEL_PATH, wf.getframerate())
-        
-        # Process audio
-        results = []
-        chunk_size = 4000
-        while True:
-            data = wf.readframes(chunk_size)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                result = json.loads(rec.Result())
-                results.append(result.get("text", ""))
-        
-        # Get final result
-        final_result = json.loads(rec.FinalResult())
-        results.append(final_result.get("text", ""))
+        step_start = time.time()
+        if pcm_rate:
+            pcm = resample_pcm(audio_bytes, pcm_rate)
+            if pcm_rate != SAMPLE_RATE:
+                timings["resample"] = time.time() - step_start
         
-        # Combine all results
-        transcription = " ".join(results).strip()
+        if not VAD_ENABLED:
+            if pcm_rate:
+                recognize_start = time.time()
+                transcription = transcribe_pcm(stt_model, pcm_chunks(pcm), cancel=cancel)
+                timings["recognize"] = time.time() - recognize_start
+            else:
+                transcription = transcribe_pcm(stt_model, decode_to_pcm(audio_bytes), timings=timings, cancel=cancel)
+            return transcription if transcription else "Could not transcribe audio"
         
-        # Clean up temporary files
-        cleanup_files(audio_path, wav_path)
+        if not pcm_rate:
+            pcm = b"".join(decode_to_pcm(audio_bytes))
+            timings["decode"] = time.time() - step_start
+        vad_start = time.time()
+        segments, stats = vad.segments(pcm, SAMPLE_RATE)
+        recognize_start = time.time()
+        timings["vad"] = recognize_start - vad_start
+        if speech is not None:
+            speech.update(stats)
+        if not segments:
+            logger.info(f"[WORKFLOW] No speech detected in {stats['input_ms']}ms of audio, skipping STT")
+            return ""
         
+        transcription = transcribe_segments(stt_model, segments, SAMPLE_RATE, submit=stt_pool.submit_if_idle,
+                                            cancel=cancel)
+        timings["recognize"] = time.time() - recognize_start
+        logger.debug(f"[WORKFLOW] VAD kept {stats['speech_ms']}ms of {stats['input_ms']}ms "
+                     f"in {stats['segments']} segment(s)")
         return transcription if transcription else "Could not transcribe audio"
-        
+    except Cancelled:
+        cancel.reclaim("stt_decodes")
+        raise
     except subprocess.CalledProcessError as e:
-        # Clean up temporary files
-        cleanup_files(audio_path, wav_path)
         raise Exception(f"Failed to convert audio file: {str(e)}")
-    except Exception as e:
-        # Clean up temporary files
-        cleanup_files(audio_path, wav_path)
-        raise e
 
-def text_to_speech(text, user_id):
-    """Convert text to speech using Piper TTS"""
-    if not PIPER_AVAILABLE:
+def pcm_upload_rate():
+    """Sample rate of a raw PCM16 request body, or None for a multipart upload
+
+    Raw bodies are sent as Content-Type: audio/pcm, mono 16-bit little-endian,
+    with the rate as a content type parameter (audio/pcm;rate=16000) or a
+    sample_rate query parameter. Raises InvalidPcm if the rate is missing.
+    """
+    if request.mimetype != 'audio/pcm':
         return None
-    
+    return parse_sample_rate(request.mimetype_params.get('rate') or request.args.get('sample_rate'))
+
+def read_pcm_body():
+    """Read a raw PCM16 request body; raises InvalidPcm if it is empty or cuts a sample in half"""
+    pcm = request.get_data(cache=False)
+    if not pcm or len(pcm) % 2:
+        raise InvalidPcm("audio/pcm body must hold whole 16-bit mono samples")
+    return pcm
+
+def stt_model_for(lang):
+    """Loaded Vosk model for a language, or None when STT runs in simulation
+
+    Only STT_SIMULATION or a server without vosk installed simulates. Raises SttModelLoading
+    while startup is still loading the default model, and SttModelUnavailable
+    when this language's model does not load, rather than answering real
+    speech with a simulated transcription.
+    """
+    if STT_SIMULATION or not stt_models.installed:
+        return None
+    if 'vosk_load' not in startup.timings:
+        raise SttModelLoading("Speech recognition is not ready yet, the Vosk model is still loading")
+    lang = stt_models.resolve(lang)
+    stt_model = stt_models.get(lang)
+    if stt_model is None:
+        raise SttModelUnavailable(f"Vosk model for {lang} not available")
+    return stt_model
+
+def record_stt_spans(trace, stt_job, stt_spans):
+    """Record queue wait, ffmpeg decode or PCM resampling, VAD and Vosk decode of a finished STT job"""
+    trace.record("stt_queue", stt_job.started - stt_job.submitted)
+    for key, stage in (("decode", "ffmpeg_decode"), ("resample", "pcm_resample"), ("vad", "vad"),
+                       ("recognize", "vosk_decode")):
+        if key in stt_spans:
+            trace.record(stage, stt_spans[key])
+
+def no_speech(speech):
+    """True when VAD ran on a clip and found nothing to transcribe"""
+    return bool(speech) and speech["segments"] == 0
+
+def record_llm_spans(trace, llm_latency):
+    """Record the LLM backend's own queue and generation times (reported in ms)"""
+    if "queue_wait" in llm_latency:
+        trace.record("llm_queue", llm_latency["queue_wait"] / 1000)
+        trace.record("llm_generation", llm_latency["generation"] / 1000)
+
+def synthesize_cached(text, tts_engine, cancel=None):
+    """Return WAV bytes for text in the engine's voice, synthesizing only on a cache miss"""
+    return tts_cache.get_or_synthesize(text, lambda segment: tts_engine.synthesize(segment, cancel),
+                                       voice_id=os.path.basename(tts_engine.model_path))[1]
+
+def text_to_speech(text, user_id, tts_engine, cancel=None):
+    """Convert text to speech using Piper TTS, returning the artifact filename to fetch"""
     try:
-        # Create output file path
-        tts_file_path = f"/tmp/tts_output_{user_id}_{int(time.time())}.wav"
-        logger.debug(f"[WORKFLOW] Generating TTS output: {tts_file_path}")
-        
-        # Run Piper TTS command
-        cmd = [
-            "piper",
-            "--model", PIPER_MODEL_PATH,
-            "--output_file", tts_file_path
-        ]
-        
-        # Execute Piper with text input
-        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate(input=text.encode())
-        
-        if process.returncode != 0:
-            logger.error(f"[ERROR] Piper TTS failed: {stderr.decode()}")
-            if os.path.exists(tts_file_path):
-                os.remove(tts_file_path)
+        # Identical replies (greetings, error strings) are served from the cache
+        key, wav_bytes = tts_cache.get_or_synthesize(text, lambda segment: tts_engine.synthesize(segment, cancel),
+                                                     voice_id=os.path.basename(tts_engine.model_path))
+        if wav_bytes is None:
             return None
-            
-        logger.debug(f"[WORKFLOW] TTS file generated successfully: {tts_file_path}")
         
-        # Clean up old TTS files (keep only the most recent 10)
-        try:
-            tts_files = [f for f in os.listdir("/tmp") if f.startswith("tts_output_") and f.endswith(".wav")]
-            if len(tts_files) > 10:
-                tts_files.sort(key=lambda x: os.path.getmtime(os.path.join("/tmp", x)))
-                for old_file in tts_files[:-10]:  # Keep the 10 most recent files
-                    old_file_path = os.path.join("/tmp", old_file)
-                    if os.path.exists(old_file_path):
-                        os.remove(old_file_path)
-                        logger.debug(f"[WORKFLOW] Cleaned up old TTS file: {old_file_path}")
-        except Exception as e:
-            logger.warning(f"[WORKFLOW] Failed to clean up old TTS files: {e}")
-        
-        return tts_file_path
+        # Pin the audio in memory until this client has fetched it
+        tts_artifacts.put(key, wav_bytes)
+        logger.debug(f"[WORKFLOW] TTS output for {user_id}: {key}.wav")
+        return f"{key}.wav"
         
     except Exception as e:
         logger.error(f"[ERROR] Exception in text_to_speech: {e}")
         return None
 
-def cleanup_files(*file_paths):
-    """Safely remove temporary files"""
-    for file_path in file_paths:
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass  # Ignore errors during cleanup
+def after_fork():
+    """Start per-process model loading in a freshly forked server worker"""
+    startup.run_in_background(WORKER_STARTUP_STEPS)
+    logger.info(f"[WORKFLOW] Worker {os.getpid()} started, loading models in the background")
+
+def shutdown():
+    """Release per-process resources when a server worker exits"""
+    llm_client.close()
+    chat_history.close()
+    logger.info(f"[WORKFLOW] Worker {os.getpid()} exiting, STT pool: {stt_pool.stats()}")
+
+def ndjson_event(event_type, **fields):
+    """Serialize one event of a streamed response as a JSON line"""
+    return json.dumps({"type": event_type, **fields}) + "\n"
 
 if __name__ == '__main__':
     # Get debug level from command line argument
@@ -452,14 +1127,9 @@ if __name__ == '__main__':
     logger = setup_logging(args.debug_level)
     
     logger.info(f"Starting STT/TTS Backend Server with debug level {args.debug_level}")
-    if VOSK_MODEL_PATH:
-        logger.info("Using Vosk for speech recognition")
-    else:
-        logger.warning("Vosk not available, using simulation mode")
-        
-    if PIPER_AVAILABLE:
-        logger.info("Using Piper for text-to-speech")
-    else:
-        logger.warning("Piper TTS not available, using simulation mode")
+    logger.info(f"Imported in {startup.timings['import']*1000:.0f}ms; models are loading in the background, "
+                f"GET /ready reports when they are warm")
     
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    # The reloader re-imports this module in a child process, loading every
+    # model twice; production serving goes through gunicorn.conf.py instead
+    app.run(host='0.0.0.0', port=5001, debug=True, use_reloader=os.getenv('FLASK_RELOAD', 'false').lower() == 'true')
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""Bounded in-memory store for generated TTS audio awaiting download.
+
+Artifacts are pinned until their client has fetched them (up to a safety
+TTL), then kept for a short TTL so the browser can seek and re-fetch. Every
+artifact in a list shares the same TTL, so each OrderedDict is also sorted by
+expiry and expiring or evicting is an O(1) pop from the front.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class Artifact:
+    """One generated audio clip and its lifecycle state"""
+
+    def __init__(self, artifact_id, data, mimetype, expires):
+        self.id = artifact_id
+        self.data = data
+        self.mimetype = mimetype
+        self.etag = artifact_id
+        self.created = time.time()
+        self.expires = expires
+        self.pending_fetches = 1
+
+
+class ArtifactStore:
+    """Serve-once-then-linger artifact store with a byte budget"""
+
+    def __init__(self, max_bytes, ttl, unfetched_ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.unfetched_ttl = unfetched_ttl
+        self._pending = OrderedDict()  # id -> Artifact, not yet fetched
+        self._fetched = OrderedDict()  # id -> Artifact, fetched at least once
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def put(self, artifact_id, data, mimetype='audio/wav'):
+        """Add an artifact (ids are content hashes, so re-adding pins it again)"""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            artifact = self._pending.pop(artifact_id, None) or self._fetched.pop(artifact_id, None)
+            if artifact is None:
+                artifact = Artifact(artifact_id, data, mimetype, now + self.unfetched_ttl)
+                self._bytes += len(data)
+            else:
+                artifact.pending_fetches += 1
+                artifact.expires = now + self.unfetched_ttl
+            self._pending[artifact_id] = artifact
+            self._evict()
+        return artifact
+
+    def get(self, artifact_id):
+        """Return an artifact and record the fetch, or None if it is gone"""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            artifact = self._pending.get(artifact_id)
+            if artifact is not None:
+                artifact.pending_fetches -= 1
+                if artifact.pending_fetches <= 0:
+                    # Every client it was generated for has fetched it; start the linger TTL
+                    del self._pending[artifact_id]
+                    artifact.expires = now + self.ttl
+                    self._fetched[artifact_id] = artifact
+                return artifact
+            artifact = self._fetched.get(artifact_id)
+            if artifact is not None:
+                # Range requests and re-fetches keep a clip alive while it is playing
+                artifact.expires = now + self.ttl
+                self._fetched.move_to_end(artifact_id)
+            return artifact
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "fetched": len(self._fetched),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "expired": self.expired,
+                "evicted": self.evicted
+            }
+
+    def _drop(self, items):
+        _, artifact = items.popitem(last=False)
+        self._bytes -= len(artifact.data)
+
+    def _expire(self, now):
+        for items in (self._pending, self._fetched):
+            while items and next(iter(items.values())).expires <= now:
+                self._drop(items)
+                self.expired += 1
+
+    def _evict(self):
+        # Only fetched artifacts are evicted for space; unfetched ones are
+        # guaranteed to survive until their client fetches them or they expire
+        while self._bytes > self.max_bytes and self._fetched:
+            self._drop(self._fetched)
+            self.evicted += 1
+        if self._bytes > self.max_bytes:
+            logger.warning(f"[WORKFLOW] TTS artifact store over budget with {len(self._pending)} unfetched artifacts")
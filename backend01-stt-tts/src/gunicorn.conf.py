@@ -0,0 +1,47 @@
+"""Gunicorn settings for serving the STT/TTS backend in production.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+preload_app imports app.py, and with it the Vosk model, once in the master
+before forking, so workers share those pages copy-on-write instead of each
+loading their own copy. Each worker then loads and warms up Piper in the
+background and reports ready on /ready. Worker and thread counts come from
+the environment.
+
+Keep one worker by default: chat history, cancellable turns, TTS artifacts
+and metrics live in each worker's memory, so with several workers a stop,
+history or audio request that lands on another worker does not see them.
+"""
+import gc
+import os
+
+# Load Vosk synchronously in the master instead of on a background thread
+os.environ.setdefault('MODEL_LOADING', 'preload')
+
+bind = os.getenv('BIND', '0.0.0.0:5001')
+workers = int(os.getenv('WEB_WORKERS', '1'))
+# Threads serve blocking work (STT waits, LLM calls, WebSocket sessions)
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '8'))
+preload_app = True
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+# On SIGTERM workers stop accepting and get this long to finish in-flight turns
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+accesslog = '-'
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach, so gc passes
+    # in the workers don't write to (and un-share) the preloaded pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.after_fork()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown()
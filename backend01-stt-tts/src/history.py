@@ -0,0 +1,292 @@
+"""Bounded chat history store with optional append-only persistence.
+
+Each user's messages live in a fixed-size ring buffer (deque), so appends are
+O(1) and old messages fall off without copying. A global byte budget evicts
+the least recently active users as a whole. Persistence is write-behind: the
+request path only queues a record, and a background thread appends batches to
+SQLite or a JSON-lines log that is replayed on startup.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message overhead of the dict, strings and deque slot, in bytes
+MESSAGE_OVERHEAD = 200
+
+
+def message_size(message):
+    return MESSAGE_OVERHEAD + len(message["content"]) + len(message["type"])
+
+
+class UserHistory:
+    """One user's ring buffer of messages"""
+
+    def __init__(self, max_messages):
+        self.messages = deque(maxlen=max_messages)
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.next_seq = 1
+        self.last_active = time.time()
+
+
+class ChatHistoryStore:
+    """Per-user ring buffers under a global memory cap with LRU eviction"""
+
+    def __init__(self, max_messages_per_user=100, max_bytes=64 * 1024 * 1024, persistence=None):
+        self.max_messages_per_user = max_messages_per_user
+        self.max_bytes = max_bytes
+        self.persistence = persistence
+        self._users = OrderedDict()  # user_id -> UserHistory, least recently active first
+        self._bytes = 0
+        self._lock = threading.Lock()  # guards _users and byte accounting; taken after a user lock
+        self.evicted_users = 0
+        if persistence:
+            self._replay()
+
+    def append(self, user_id, message_type, content):
+        """Store a message and return its entry"""
+        entry = {
+            "id": str(uuid.uuid4()),
+            "type": message_type,  # user, ai, user_voice
+            "content": content,
+            "timestamp": datetime.now().isoformat()
+        }
+        self._append(user_id, entry)
+        if self.persistence:
+            self.persistence.submit(("append", user_id, entry))
+        return entry
+
+    def page(self, user_id, before=None, limit=None):
+        """Return (messages, next_cursor, total) in chronological order
+
+        Messages are the newest `limit` ones with seq < before; next_cursor is
+        the `before` value for the previous page, or None at the start.
+        """
+        with self._lock:
+            history = self._users.get(user_id)
+        if history is None:
+            return [], None, 0
+        with history.lock:
+            messages = list(history.messages)
+        if before is not None:
+            messages = [m for m in messages if m["seq"] < before]
+        if limit is not None and limit < 1:
+            # messages[-0:] would be the whole history
+            return [], None, len(history.messages)
+        has_more = limit is not None and len(messages) > limit
+        if has_more:
+            messages = messages[-limit:]
+        next_cursor = messages[0]["seq"] if has_more else None
+        return messages, next_cursor, len(history.messages)
+
+    def clear(self, user_id):
+        """Delete a user's history; returns True if there was any in memory"""
+        existed = self._forget(user_id)
+        if self.persistence:
+            self.persistence.submit(("clear", user_id, None))
+        return existed
+
+    def close(self):
+        """Flush pending writes to the persistence backend"""
+        if self.persistence:
+            self.persistence.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_messages_per_user": self.max_messages_per_user,
+                "evicted_users": self.evicted_users,
+                "persistence": self.persistence.name if self.persistence else None
+            }
+
+    def _append(self, user_id, entry):
+        with self._lock:
+            history = self._users.get(user_id)
+            if history is None:
+                history = self._users[user_id] = UserHistory(self.max_messages_per_user)
+            self._users.move_to_end(user_id)
+
+        with history.lock:
+            entry["seq"] = history.next_seq
+            history.next_seq += 1
+            size = message_size(entry)
+            if len(history.messages) == history.messages.maxlen:
+                # The oldest message drops off the ring buffer
+                size -= message_size(history.messages[0])
+            history.messages.append(entry)
+            history.last_active = time.time()
+            with self._lock:
+                history.bytes += size
+                if self._users.get(user_id) is history:
+                    self._bytes += size
+                self._evict(user_id)
+
+    def _evict(self, current_user):
+        # Called with the lock held; never evicts the user being written to
+        while self._bytes > self.max_bytes and len(self._users) > 1:
+            user_id, history = next(iter(self._users.items()))
+            if user_id == current_user:
+                break
+            del self._users[user_id]
+            self._bytes -= history.bytes
+            self.evicted_users += 1
+            logger.debug(f"[WORKFLOW] Evicted chat history of idle user {user_id}")
+
+    def _replay(self):
+        start_time = time.time()
+        count = 0
+        for op, user_id, entry in self.persistence.replay():
+            if op == "append":
+                entry.pop("seq", None)
+                self._append(user_id, entry)
+                count += 1
+            elif op == "clear":
+                self._forget(user_id)
+        logger.info(f"[WORKFLOW] Replayed {count} chat messages from {self.persistence.name} "
+                    f"in {(time.time() - start_time)*1000:.0f}ms")
+
+    def _forget(self, user_id):
+        with self._lock:
+            history = self._users.pop(user_id, None)
+            if history is not None:
+                self._bytes -= history.bytes
+        return history is not None
+
+
+class WriteBehindLog:
+    """Base for persistence backends: records are queued and written in batches
+
+    The writer thread starts on first use in each process, so a store created
+    before a pre-forking server forks still persists from every worker.
+    """
+
+    name = None
+
+    def __init__(self, path, batch_size=100):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started_pid = None
+
+    def submit(self, record):
+        self._ensure_started()
+        self._queue.put(record)
+
+    def flush(self, timeout=5.0):
+        """Wait up to timeout seconds for queued records to be written"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def replay(self):
+        """Yield (op, user_id, entry) records in write order"""
+        raise NotImplementedError
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write(self, handle, records):
+        raise NotImplementedError
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._run, name=f"history-{self.name}", daemon=True).start()
+
+    def _run(self):
+        handle = self._open()
+        while True:
+            records = [self._queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(handle, records)
+            except Exception as e:
+                logger.error(f"[WORKFLOW] Failed to persist {len(records)} chat history records: {e}")
+            for _ in records:
+                self._queue.task_done()
+
+
+class JsonLinesLog(WriteBehindLog):
+    """Append-only JSON-lines file"""
+
+    name = "log"
+
+    def replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    continue
+                yield record["op"], record["user_id"], record.get("message")
+
+    def _open(self):
+        return open(self.path, 'a', encoding='utf-8')
+
+    def _write(self, handle, records):
+        handle.write("".join(json.dumps({"op": op, "user_id": user_id, "message": entry}) + "\n"
+                             for op, user_id, entry in records))
+        handle.flush()
+
+
+class SqliteLog(WriteBehindLog):
+    """Append-only SQLite table; clears are recorded as rows too"""
+
+    name = "sqlite"
+    SCHEMA = "CREATE TABLE IF NOT EXISTS chat_history (op TEXT NOT NULL, user_id TEXT NOT NULL, message TEXT)"
+
+    def replay(self):
+        if not os.path.exists(self.path):
+            return
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.execute(self.SCHEMA)
+            for op, user_id, message in connection.execute(
+                    "SELECT op, user_id, message FROM chat_history ORDER BY rowid"):
+                yield op, user_id, json.loads(message) if message else None
+        finally:
+            connection.close()
+
+    def _open(self):
+        connection = sqlite3.connect(self.path)
+        # WAL keeps appends cheap and lets several worker processes write
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(self.SCHEMA)
+        return connection
+
+    def _write(self, handle, records):
+        with handle:
+            handle.executemany("INSERT INTO chat_history (op, user_id, message) VALUES (?, ?, ?)",
+                               [(op, user_id, json.dumps(entry) if entry else None)
+                                for op, user_id, entry in records])
+
+
+def open_persistence(backend, path):
+    """Return the persistence backend named by `backend` ("sqlite", "log" or "memory")"""
+    if backend == "sqlite":
+        return SqliteLog(path)
+    if backend == "log":
+        return JsonLinesLog(path)
+    return None
@@ -0,0 +1,259 @@
+"""Shared client for the LLM backend (backend02-llm).
+
+Keeps a pooled keep-alive session with split connect/read timeouts, retries
+failures to connect and 502/503 with jittered backoff, and trips a circuit
+breaker so callers fail fast while the LLM tier is down. The backend's own
+overload (503) and deadline (504) answers are not retried: resending would
+overrun the request's deadline, and an overloaded backend is still healthy. Nor
+are read timeouts and dropped connections on a request that was sent: the
+backend may still be generating, and a resend would start a second generation. In in-process mode
+the backend's Flask app is imported and called directly, skipping the HTTP hop
+on single-box deployments.
+"""
+import json
+import logging
+import random
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {502, 503}
+# "reason" of backend02's scheduler rejections, which are final answers rather than outages
+SCHEDULER_REASONS = {"overloaded", "deadline_expired"}
+
+
+class LlmBackendError(Exception):
+    """The LLM backend answered with an error status"""
+
+    def __init__(self, status_code, message=""):
+        super().__init__(f"LLM backend returned status {status_code} {message}".strip())
+        self.status_code = status_code
+
+
+class CircuitOpen(Exception):
+    """The circuit breaker is open; the LLM backend is considered down"""
+
+
+class CircuitBreaker:
+    """Open after consecutive failures, then let a single probe through after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.time() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        """Return True if a request may be attempted now"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.time() - self.opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    logger.warning(f"[WORKFLOW] LLM circuit breaker opened after {self.failures} failures")
+                self.opened_at = time.time()
+                self._probing = False
+
+
+class LlmClient:
+    """Pooled, retrying client for /generate and /generate/stream"""
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=30, retries=2, backoff=0.2,
+                 pool_size=10, breaker=None, in_process_path=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._local_app = self._load_in_process_app(in_process_path) if in_process_path else None
+
+    @property
+    def mode(self):
+        return "in-process" if self._local_app else "http"
+
+    def generate(self, prompt, request_id=None, **options):
+        """Return the backend's /generate JSON for prompt"""
+        payload = self._payload(prompt, options)
+        headers = self._headers(request_id)
+        if self._local_app:
+            response = self._local_app.post('/generate', json=payload, headers=headers)
+            if response.status_code != 200:
+                raise LlmBackendError(response.status_code)
+            return response.get_json()
+
+        response = self._request('/generate', payload, headers, stream=False)
+        try:
+            return response.json()
+        finally:
+            response.close()
+
+    def stream(self, prompt, request_id=None, **options):
+        """Yield parsed events from the backend's /generate/stream"""
+        payload = self._payload(prompt, options)
+        headers = self._headers(request_id)
+        if self._local_app:
+            response = self._local_app.post('/generate/stream', json=payload, headers=headers, buffered=False)
+            if response.status_code != 200:
+                raise LlmBackendError(response.status_code)
+            yield from _iter_ndjson(response.response)
+            return
+
+        # Retries only cover establishing the stream, never a partly relayed one
+        response = self._request('/generate/stream', payload, headers, stream=True)
+        with response:
+            yield from _iter_ndjson(response.iter_content(chunk_size=None))
+
+    def cancel(self, request_ids=(), session_id=None):
+        """Stop the backend's generations for these requests or this session
+
+        Returns the backend's report of what was cancelled; best effort, so
+        an unreachable backend yields an empty report.
+        """
+        payload = {"request_ids": list(request_ids), "session_id": session_id, "reason": "barge-in"}
+        try:
+            if self._local_app:
+                return self._local_app.post('/generate/cancel', json=payload).get_json()
+            response = self.session.post(f"{self.base_url}/generate/cancel", json=payload, timeout=self.timeout)
+            with response:
+                return response.json() if response.status_code == 200 else {}
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"[WORKFLOW] Could not cancel LLM generation: {e}")
+            return {}
+
+    def close(self):
+        """Close pooled connections to the backend"""
+        self.session.close()
+
+    def _payload(self, prompt, options):
+        # Past the read timeout we have given up, so the backend may drop the request
+        return {"prompt": prompt, "deadline_ms": round(self.timeout[1] * 1000), **options}
+
+    def end_session(self, session_id):
+        """Forget a conversation session on the backend; best effort"""
+        path = f'/sessions/{session_id}'
+        try:
+            if self._local_app:
+                self._local_app.delete(path)
+            else:
+                self.session.delete(f"{self.base_url}{path}", timeout=self.timeout).close()
+        except requests.RequestException as e:
+            logger.warning(f"[WORKFLOW] Could not end LLM session {session_id}: {e}")
+
+    @staticmethod
+    def _headers(request_id):
+        # Propagated so the backend's logs and traces line up with ours
+        return {'X-Request-ID': request_id} if request_id else {}
+
+    def _request(self, path, payload, headers, stream):
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM backend unavailable (circuit open)")
+
+        url = f"{self.base_url}{path}"
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout,
+                                                 stream=stream)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if not _never_sent(e):
+                        # e.g. a read timeout: the backend may still be generating, and a resend starts another
+                        raise
+                    error = e
+                else:
+                    if response.status_code < 400:
+                        self.breaker.record_success()
+                        return response
+                    retryable = response.status_code in RETRYABLE_STATUS and not _scheduler_rejection(response)
+                    response.close()
+                    if not retryable:
+                        # The backend is up; the request itself was rejected or ran out of time
+                        self.breaker.record_success()
+                        raise LlmBackendError(response.status_code)
+                    error = LlmBackendError(response.status_code)
+
+                if attempt < self.retries:
+                    # Full jitter keeps retries from a burst of callers from synchronizing
+                    delay = random.uniform(0, self.backoff * (2 ** attempt))
+                    logger.warning(f"[WORKFLOW] LLM request failed ({error}), retrying in {delay*1000:.0f}ms")
+                    time.sleep(delay)
+        except LlmBackendError:
+            raise
+        except Exception:
+            # Any other failure (e.g. ChunkedEncodingError, InvalidURL) must still settle
+            # the breaker, or a half-open probe would keep it from ever closing
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_failure()
+        raise error
+
+    @staticmethod
+    def _load_in_process_app(src_path):
+        """Import backend02's Flask app from src_path and return a test client for it"""
+        if src_path not in sys.path:
+            sys.path.insert(0, src_path)
+        import server
+        logger.info(f"LLM backend running in-process from {src_path}")
+        return server.app.test_client()
+
+
+def _never_sent(error):
+    """True if a failed request never reached the backend, so resending cannot duplicate work"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _scheduler_rejection(response):
+    """True if an error response is backend02's scheduler turning the request away"""
+    try:
+        return response.json().get("reason") in SCHEDULER_REASONS
+    except (ValueError, AttributeError):
+        return False
+
+
+def _iter_ndjson(chunks):
+    """Parse newline-delimited JSON from an iterable of byte chunks"""
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            if line.strip():
+                yield json.loads(line)
+    if buffer.strip():
+        yield json.loads(buffer)
@@ -0,0 +1,139 @@
+"""Request tracing and Prometheus metrics.
+
+Every request carries an id (X-Request-ID, accepted from the caller or
+generated here) and collects per-stage spans. Span durations feed one
+histogram per stage, exposed on /metrics in Prometheus text format: bucketed
+histograms for PromQL's histogram_quantile, plus p50/p95/p99 over a window of
+recent samples so tail latency can be read straight off the endpoint.
+
+Metrics live in process memory. Every series carries a pid label, so with
+several server workers each worker's counters stay monotonic in Prometheus
+even though a scrape only reaches one worker; aggregate with
+sum without (pid). The services are deployed as separate images, so this
+module is copied into both and the copies must be kept identical.
+"""
+import bisect
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# Bucket upper bounds in seconds, from sub-10ms cache hits to multi-second LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def pid_label():
+    return f'pid="{os.getpid()}"'
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+class StageHistogram:
+    """Cumulative buckets, sum and count, plus a window of recent samples"""
+
+    def __init__(self, buckets, window):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        samples = sorted(self.recent)
+        if not samples:
+            return {}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class LatencyMetrics:
+    """Per-stage latency histograms rendered in Prometheus text format"""
+
+    def __init__(self, namespace, buckets=DEFAULT_BUCKETS, window=1024):
+        self.namespace = namespace
+        self.buckets = buckets
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = StageHistogram(self.buckets, self.window)
+            histogram.observe(seconds)
+
+    def summary(self):
+        """Count and p50/p95/p99 in milliseconds per stage"""
+        with self._lock:
+            return {stage: {"count": h.count, **{f"p{int(q * 100)}": round(v * 1000)
+                                                 for q, v in h.quantiles().items()}}
+                    for stage, h in sorted(self._stages.items())}
+
+    def render(self):
+        name = f"{self.namespace}_stage_latency_seconds"
+        window_name = f"{self.namespace}_stage_latency_recent_seconds"
+        lines = [f"# HELP {name} Latency of each request stage",
+                 f"# TYPE {name} histogram"]
+        window_lines = [f"# HELP {window_name} Latency quantiles over the last {self.window} samples per stage",
+                        f"# TYPE {window_name} summary"]
+        pid = pid_label()
+        with self._lock:
+            for stage, h in sorted(self._stages.items()):
+                labels = f'stage="{stage}",{pid}'
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ["+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {h.sum:.6f}')
+                lines.append(f'{name}_count{{{labels}}} {h.count}')
+                for q, value in h.quantiles().items():
+                    window_lines.append(f'{window_name}{{{labels},quantile="{q}"}} {value:.6f}')
+                window_lines.append(f'{window_name}_sum{{{labels}}} {sum(h.recent):.6f}')
+                window_lines.append(f'{window_name}_count{{{labels}}} {len(h.recent)}')
+        return "\n".join(lines + window_lines) + "\n"
+
+
+def render_gauge(name, help_text, samples):
+    """Prometheus text for a gauge; samples maps a label string to a value"""
+    pid = pid_label()
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{{{labels},{pid}}} {value}" if labels else f"{name}{{{pid}}} {value}"
+              for labels, value in samples.items()]
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Spans of one request, recorded into the shared metrics as they finish"""
+
+    def __init__(self, metrics, request_id=None):
+        self.metrics = metrics
+        self.request_id = request_id or new_request_id()
+        self.started = time.time()
+        self.spans = {}  # stage -> seconds
+
+    def record(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0) + seconds
+        self.metrics.observe(stage, seconds)
+
+    @contextmanager
+    def span(self, stage):
+        span_start = time.time()
+        try:
+            yield
+        finally:
+            self.record(stage, time.time() - span_start)
+
+    def describe(self):
+        """Span durations in milliseconds, for logs and response bodies"""
+        return {stage: round(seconds * 1000) for stage, seconds in self.spans.items()}
@@ -0,0 +1,157 @@
+"""Overlapped LLM -> TTS execution for streamed voice turns.
+
+LLM tokens are cut into sentences as they arrive and each sentence is handed
+to a TTS worker thread while generation continues, so a turn takes roughly as
+long as its slowest stage instead of the sum of all stages.
+"""
+import logging
+import queue
+import threading
+import time
+
+from tts_engine import SentenceBuffer
+
+logger = logging.getLogger(__name__)
+
+# Sentinel marking the end of a stage's output queue
+_END = object()
+
+
+class StageTimer:
+    """Wall-clock span and busy time of one pipeline stage"""
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.busy = 0.0
+
+    def record(self, started, ended):
+        if self.start is None:
+            self.start = started
+        self.end = ended
+        self.busy += ended - started
+
+
+class VoiceTurnPipeline:
+    """Run LLM generation and sentence-level TTS concurrently for one voice turn"""
+
+    def __init__(self, request_start, stt_time, cancel=None):
+        self.request_start = request_start
+        self.stt_time = stt_time
+        self.cancel = cancel
+        self.response = ""
+        self.llm_latency = {}
+        self.first_text_time = None
+        self.first_audio_time = None
+        self.end_time = None
+        self.llm_stage = StageTimer()
+        self.tts_stage = StageTimer()
+
+    def run(self, llm_events, synthesize=None):
+        """Yield text/audio/error events while generation and synthesis overlap
+
+        llm_events yields the LLM backend's stream events ("token", "done",
+        "cancelled", "error"); synthesize turns a sentence into WAV bytes, or is None when
+        TTS is unavailable. Once the cancel token fires, the LLM stream is
+        abandoned and sentences still waiting for TTS are dropped.
+        """
+        events = queue.Queue()
+        segments = queue.Queue()
+
+        llm_thread = threading.Thread(target=self._llm_worker, args=(llm_events, events, segments), daemon=True)
+        tts_thread = threading.Thread(target=self._tts_worker, args=(synthesize, events, segments), daemon=True)
+        llm_thread.start()
+        tts_thread.start()
+
+        # The TTS worker only finishes after the LLM worker has, so its end
+        # marker means every event has been queued
+        while True:
+            event = events.get()
+            if event is _END:
+                break
+            yield event
+
+        self.end_time = time.time()
+
+    def _llm_worker(self, llm_events, events, segments):
+        sentence_buffer = SentenceBuffer()
+        parts = []
+        started = time.time()
+        try:
+            for event in llm_events:
+                if self.cancel is not None and self.cancel.cancelled:
+                    break
+                if event.get("type") == "token":
+                    if self.first_text_time is None:
+                        self.first_text_time = time.time()
+                    parts.append(event["token"])
+                    events.put({"type": "text", "token": event["token"]})
+                    for segment in sentence_buffer.feed(event["token"]):
+                        segments.put(segment)
+                elif event.get("type") == "done":
+                    self.llm_latency = event.get("latency", {})
+                elif event.get("type") == "cancelled":
+                    # Stopped at the LLM backend, e.g. by a stop handled in another worker
+                    if self.cancel is not None:
+                        self.cancel.cancel("upstream")
+                    break
+                elif event.get("type") == "error":
+                    raise RuntimeError(event.get("error"))
+        except Exception as e:
+            logger.error(f"[WORKFLOW] LLM stream failed: {e}")
+            events.put({"type": "error", "stage": "llm", "error": str(e)})
+        finally:
+            if hasattr(llm_events, "close"):
+                # Drops the connection to the LLM backend if we stopped early
+                llm_events.close()
+            # Finished before the end marker: the caller reads response as soon as the turn ends
+            self.response = "".join(parts)
+            self.llm_stage.record(started, time.time())
+            for segment in sentence_buffer.flush():
+                segments.put(segment)
+            segments.put(_END)
+
+    def _tts_worker(self, synthesize, events, segments):
+        index = 0
+        while True:
+            segment = segments.get()
+            if segment is _END:
+                break
+            if synthesize is None:
+                continue
+            if self.cancel is not None and self.cancel.cancelled:
+                self.cancel.reclaim("tts_segments")
+                continue
+            started = time.time()
+            wav_bytes = synthesize(segment)
+            self.tts_stage.record(started, time.time())
+            if wav_bytes is None:
+                continue
+            if self.first_audio_time is None:
+                self.first_audio_time = time.time()
+            events.put({"type": "audio", "index": index, "text": segment, "audio": wav_bytes})
+            index += 1
+        events.put(_END)
+
+    def latency(self):
+        """Per-stage and end-to-end timings in milliseconds, including overlap"""
+        def since_start(timestamp):
+            return round((timestamp - self.request_start) * 1000) if timestamp else 0
+
+        llm_time = (self.llm_stage.end - self.llm_stage.start) if self.llm_stage.start else 0
+        total_time = (self.end_time or time.time()) - self.request_start
+        # What the turn would have cost with each stage waiting for the previous one
+        sequential_time = self.stt_time + llm_time + self.tts_stage.busy
+        overlap_time = max(0.0, sequential_time - total_time)
+        return {
+            "stt": round(self.stt_time * 1000),
+            "llm": round(llm_time * 1000),
+            "llm_backend": self.llm_latency,
+            "tts": round(self.tts_stage.busy * 1000),
+            "first_text": since_start(self.first_text_time),
+            "first_audio": since_start(self.first_audio_time),
+            "total": round(total_time * 1000),
+            "sequential": round(sequential_time * 1000),
+            "overlap": round(overlap_time * 1000),
+            "overlap_ratio": round(overlap_time / sequential_time, 3) if sequential_time > 0 else 0
+        }
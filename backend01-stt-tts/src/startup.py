@@ -0,0 +1,87 @@
+"""Startup tracking: background model loading, warm-up and readiness.
+
+The server starts answering liveness checks as soon as the module is
+imported; models load and warm up on a background thread, and /ready only
+reports ready once every step has finished without error. A step that finds
+an optional engine missing (no Piper voice, no Vosk model) marks the server
+degraded rather than failed: it is ready for the requests it can serve, and
+the ones needing that engine are refused. Each step's duration is kept so
+slow starts can be traced to the step responsible.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Degraded(Exception):
+    """A startup step found an optional engine missing; the server runs without it"""
+
+
+class StartupTracker:
+    """Timed startup steps and the readiness flag they gate"""
+
+    def __init__(self, started=None):
+        self.started = started or time.time()
+        self.timings = {}  # step name -> seconds
+        self.errors = {}  # step name -> error message
+        self.degraded = {}  # step name -> what is missing
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    @property
+    def ready(self):
+        # A failed step left the server in an unknown state; a degraded one did not
+        return self.finished and not self.errors
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.timings[name] = seconds
+        logger.info(f"[WORKFLOW] Startup step {name} took {seconds*1000:.0f}ms")
+
+    def step(self, name, fn, *args):
+        """Run fn(*args) as a timed step; failures are recorded, not raised"""
+        step_start = time.time()
+        try:
+            result = fn(*args)
+        except Degraded as e:
+            logger.warning(f"[WORKFLOW] Startup step {name}: {e}")
+            with self._lock:
+                self.degraded[name] = str(e)
+            result = None
+        except Exception as e:
+            logger.error(f"[WORKFLOW] Startup step {name} failed: {e}")
+            with self._lock:
+                self.errors[name] = str(e)
+            result = None
+        self.record(name, time.time() - step_start)
+        return result
+
+    def run_in_background(self, steps):
+        """Run (name, fn) steps in order on a daemon thread, then mark startup finished"""
+        def run():
+            for name, fn in steps:
+                self.step(name, fn)
+            self.record("total", time.time() - self.started)
+            self._finished.set()
+
+        threading.Thread(target=run, name="model-warmup", daemon=True).start()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def status(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "finished": self.finished,
+                "uptime": round(time.time() - self.started, 3),
+                "timings": {name: round(seconds * 1000) for name, seconds in self.timings.items()},
+                "errors": dict(self.errors),
+                "degraded": dict(self.degraded)
+            }
@@ -0,0 +1,251 @@
+"""Vosk speech recognition helpers.
+
+Uploads are decoded by an ffmpeg pipe straight into 16 kHz mono PCM16 that is
+fed to the recognizer as it arrives; nothing touches the filesystem. Clients
+that capture raw PCM16 skip ffmpeg: their audio goes to the recognizer as is,
+resampled to 16 kHz only when recorded at another rate. When silence is
+trimmed first, the PCM is collected and only its speech segments are
+recognized, in parallel when there are several.
+"""
+import json
+import logging
+import queue
+import subprocess
+import threading
+import time
+
+import numpy as np
+try:
+    from vosk import KaldiRecognizer
+except ImportError:
+    KaldiRecognizer = None  # STT is simulated; see stt_models
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# 4000 frames of 16-bit mono audio per recognizer call
+CHUNK_BYTES = 8000
+# Sample rates accepted for raw PCM input
+MIN_PCM_RATE = 8000
+MAX_PCM_RATE = 192000
+
+
+class InvalidPcm(Exception):
+    """Raw PCM input with a missing or unusable sample rate, or a malformed body"""
+
+
+def parse_sample_rate(value):
+    """Declared sample rate of raw PCM input as an int; raises InvalidPcm"""
+    try:
+        rate = int(value)
+    except (TypeError, ValueError):
+        raise InvalidPcm("Raw PCM needs its sample rate, e.g. Content-Type: audio/pcm;rate=16000")
+    if not MIN_PCM_RATE <= rate <= MAX_PCM_RATE:
+        raise InvalidPcm(f"Sample rate {rate} is outside {MIN_PCM_RATE}-{MAX_PCM_RATE} Hz")
+    return rate
+
+
+def start_decoder(sample_rate=SAMPLE_RATE):
+    """Start an ffmpeg process that turns compressed audio on stdin into PCM16 on stdout"""
+    return subprocess.Popen([
+        'ffmpeg', '-loglevel', 'error', '-i', 'pipe:0',
+        '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(sample_rate),
+        'pipe:1'
+    ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def decode_to_pcm(audio_bytes, sample_rate=SAMPLE_RATE, chunk_bytes=CHUNK_BYTES):
+    """Decode compressed audio (e.g. webm) with ffmpeg and yield PCM16 chunks"""
+    process = start_decoder(sample_rate)
+
+    # Feed stdin from a thread so ffmpeg can emit PCM while the upload is still
+    # being written, without either pipe filling up and deadlocking
+    def write_input():
+        try:
+            process.stdin.write(audio_bytes)
+        except BrokenPipeError:
+            pass
+        finally:
+            process.stdin.close()
+
+    writer = threading.Thread(target=write_input, daemon=True)
+    writer.start()
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield data
+    finally:
+        process.stdout.close()
+        writer.join()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, 'ffmpeg', stderr=stderr)
+
+
+def resample_pcm(pcm, from_rate, to_rate=SAMPLE_RATE):
+    """Resample mono PCM16 by linear interpolation; returned unchanged when the rates match"""
+    if from_rate == to_rate or not pcm:
+        return pcm
+    samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+    count = max(1, round(len(samples) * to_rate / from_rate))
+    positions = np.arange(count) * (from_rate / to_rate)
+    resampled = np.interp(positions, np.arange(len(samples)), samples)
+    return np.clip(np.round(resampled), -32768, 32767).astype('<i2').tobytes()
+
+
+def transcribe_pcm(model, pcm_chunks, sample_rate=SAMPLE_RATE, timings=None, cancel=None):
+    """Run PCM16 chunks through a fresh recognizer and return the transcription
+
+    If a timings dict is given, the seconds spent waiting for PCM (the ffmpeg
+    decode) and inside the recognizer are stored under "decode" and "recognize".
+    A cancel token is checked between chunks and raises Cancelled.
+    """
+    rec = KaldiRecognizer(model, sample_rate)
+    waited = recognized = 0.0
+
+    results = []
+    chunks = iter(pcm_chunks)
+    while True:
+        wait_start = time.time()
+        data = next(chunks, None)
+        recognize_start = time.time()
+        waited += recognize_start - wait_start
+        if data is None:
+            break
+        if cancel is not None:
+            cancel.check()
+        if rec.AcceptWaveform(data):
+            result = json.loads(rec.Result())
+            results.append(result.get("text", ""))
+        recognized += time.time() - recognize_start
+
+    # Get final result
+    recognize_start = time.time()
+    final_result = json.loads(rec.FinalResult())
+    results.append(final_result.get("text", ""))
+    recognized += time.time() - recognize_start
+
+    if timings is not None:
+        timings["decode"] = waited
+        timings["recognize"] = recognized
+
+    # Combine all results
+    return " ".join(results).strip()
+
+
+def pcm_chunks(pcm, chunk_bytes=CHUNK_BYTES):
+    """Split in-memory PCM16 into recognizer-sized chunks"""
+    return [pcm[i:i + chunk_bytes] for i in range(0, len(pcm), chunk_bytes)]
+
+
+def transcribe_segments(model, segments, sample_rate=SAMPLE_RATE, submit=None, cancel=None):
+    """Decode PCM16 segments with one recognizer each and join the texts in order
+
+    Segments after the first are offered to submit(fn, *args), which returns
+    a pool job or None, to decode in parallel. Any that have not started by
+    the time this thread is done with its own are cancelled and decoded here,
+    so a worker waiting on jobs queued behind it can never deadlock the pool.
+    """
+    jobs = [(segment, submit(transcribe_pcm, model, pcm_chunks(segment), sample_rate, None, cancel) if submit else None)
+            for segment in segments[1:]]
+
+    texts = [transcribe_pcm(model, pcm_chunks(segments[0]), sample_rate, cancel=cancel)] if segments else []
+    for segment, job in jobs:
+        if job is None or job.future.cancel():
+            texts.append(transcribe_pcm(model, pcm_chunks(segment), sample_rate, cancel=cancel))
+        else:
+            texts.append(job.result())
+    return " ".join(text for text in texts if text).strip()
+
+
+class StreamingSession:
+    """Live recognition of one utterance whose audio arrives in small chunks
+
+    Compressed chunks (e.g. MediaRecorder webm timeslices) are written to a
+    long-lived ffmpeg process; a reader thread feeds its PCM output to a
+    per-session KaldiRecognizer and queues partial and final results, so
+    decoding keeps pace with the speaker instead of starting when they stop.
+    With pcm_rate set, chunks are already PCM16 at that rate and go to the
+    reader thread directly, without an ffmpeg process.
+    """
+
+    def __init__(self, model, sample_rate=SAMPLE_RATE, pcm_rate=None):
+        self.recognizer = KaldiRecognizer(model, sample_rate)
+        self.sample_rate = sample_rate
+        self.pcm_rate = pcm_rate
+        self.process = None if pcm_rate else start_decoder(sample_rate)
+        self._pcm = queue.Queue()  # raw PCM chunks, then None at the end
+        self._odd_byte = b""
+        self.events = queue.Queue()
+        self.results = []
+        self.started = time.time()
+        self.audio_bytes = 0
+        self._last_partial = ""
+        self._reader = threading.Thread(target=self._read_pcm, daemon=True)
+        self._reader.start()
+
+    def feed(self, data):
+        """Pass a chunk of compressed audio to the decoder, or of PCM to the recognizer"""
+        self.audio_bytes += len(data)
+        if self.pcm_rate:
+            # A sample split across messages waits for its second byte
+            data = self._odd_byte + data
+            self._odd_byte = data[len(data) - len(data) % 2:]
+            data = data[:len(data) - len(self._odd_byte)]
+            if data:
+                self._pcm.put(resample_pcm(data, self.pcm_rate, self.sample_rate))
+            return
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def drain_events(self):
+        """Return the partial/result events produced since the last call"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def finish(self):
+        """Flush the decoder and return the full transcription"""
+        if self.process:
+            self.process.stdin.close()
+        else:
+            self._pcm.put(None)
+        self._reader.join()
+        if self.process:
+            self.process.wait()
+        final_result = json.loads(self.recognizer.FinalResult())
+        self.results.append(final_result.get("text", ""))
+        return " ".join(text for text in self.results if text).strip()
+
+    def close(self):
+        """Release the decoder process if the session ends abnormally"""
+        if self.process is None:
+            self._pcm.put(None)
+        elif self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def _read_pcm(self):
+        while True:
+            data = self._pcm.get() if self.process is None else self.process.stdout.read(CHUNK_BYTES)
+            if not data:
+                break
+            if self.recognizer.AcceptWaveform(data):
+                text = json.loads(self.recognizer.Result()).get("text", "")
+                if text:
+                    self.results.append(text)
+                    self.events.put({"type": "result", "text": text})
+                self._last_partial = ""
+            else:
+                partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+                # Only push partials that changed to keep the socket quiet
+                if partial and partial != self._last_partial:
+                    self._last_partial = partial
+                    self.events.put({"type": "partial", "text": partial})
@@ -0,0 +1,210 @@
+"""Registry of Vosk models by language, loaded on demand within a memory cap.
+
+Each language maps to a local model directory, either listed explicitly or
+discovered among the `vosk-model-*` directories of a models directory. A
+model loads the first time a request asks for its language and is then
+shared by every recognizer in the process. Concurrent first requests share
+one load. Once the resident models exceed the memory cap, the least recently
+used languages are unloaded. Recognizers still using an unloaded model keep
+it alive until they finish, because Kaldi reference-counts models.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    from vosk import Model
+except ImportError:
+    # Without vosk the server answers voice turns with a simulated transcription
+    Model = None
+
+from tts_cache import LruTier
+
+logger = logging.getLogger(__name__)
+
+# vosk-model-small-en-us-0.15 and vosk-model-en-us-0.22-lgraph both serve en-us
+_MODEL_DIR_NAME = re.compile(r'^vosk-model-(?:small-)?(.+?)(?:-\d[\w.-]*)?$')
+
+
+class UnknownLanguage(Exception):
+    """No Vosk model is registered for the requested language"""
+
+
+class SttModelUnavailable(Exception):
+    """The Vosk model for a request's language failed to load"""
+
+
+class SttModelLoading(SttModelUnavailable):
+    """Startup has not finished loading the default Vosk model yet"""
+
+
+def language_of(dirname):
+    """Language code of a model directory, e.g. vosk-model-small-de-0.15 -> de"""
+    match = _MODEL_DIR_NAME.match(dirname)
+    return match.group(1) if match else dirname
+
+
+def directory_size(path):
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+
+def resident_bytes():
+    """Resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class SttModelRegistry:
+    """Vosk models by language, loaded lazily and evicted least-recently-used
+
+    A model's size is the growth of the process's resident memory while it
+    loaded, or its size on disk where that cannot be measured. Loads are
+    serialized so each measurement belongs to one model. The model just
+    loaded is always kept, even if it alone exceeds the cap. A language whose
+    model fails to load is not retried for retry_after seconds.
+    """
+
+    def __init__(self, default_lang, memory_budget, retry_after=30.0):
+        self.default_lang = default_lang
+        self.retry_after = retry_after
+        self.paths = {}  # lang -> model directory, or None to resolve it by language
+        self._resident = LruTier(memory_budget)  # lang -> loaded Model
+        self._loading = {}  # lang -> Future of the load in progress
+        self._failed = {}  # lang -> (why its load failed, when to retry)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.models = {}  # lang -> {"load_ms", "resident_bytes", "disk_bytes"} of its last load
+
+    def discover(self, models_dir):
+        """Register each model directory in models_dir under its language"""
+        if not os.path.isdir(models_dir):
+            logger.warning(f"Vosk models directory not found: {models_dir}")
+            return
+        for dirname in sorted(os.listdir(models_dir)):
+            path = os.path.join(models_dir, dirname)
+            if not os.path.isdir(path):
+                continue
+            lang = language_of(dirname)
+            if lang in self.paths:
+                logger.warning(f"Skipping {path}: {lang} is already served by {self.paths[lang]}")
+                continue
+            self.add(lang, path)
+        logger.info(f"[WORKFLOW] Discovered Vosk models for {', '.join(sorted(self.paths)) or 'no languages'} "
+                    f"in {models_dir}")
+
+    def add(self, lang, path):
+        with self._lock:
+            self.paths[lang.lower()] = path
+
+    def resolve(self, lang=None):
+        """Registered language for a request; "en" matches "en-us". Raises UnknownLanguage"""
+        lang = (lang or self.default_lang).lower()
+        if lang in self.paths:
+            return lang
+        for registered in sorted(self.paths):
+            if registered.startswith(f"{lang}-"):
+                return registered
+        raise UnknownLanguage(f"No Vosk model for language '{lang}', available: {', '.join(sorted(self.paths))}")
+
+    def get(self, lang=None):
+        """Return the loaded model for a language, loading it if needed; None if it cannot load"""
+        lang = self.resolve(lang)
+        with self._lock:
+            model = self._resident.get(lang)
+            if model is not None:
+                return model
+            failed = self._failed.get(lang)
+            if failed is not None and time.time() < failed[1]:
+                return None
+            pending = self._loading.get(lang)
+            loading = pending is None
+            if loading:
+                pending = self._loading[lang] = Future()
+        if not loading:
+            # Another request is loading this language; share its result
+            return pending.result()
+
+        model = None
+        try:
+            model = self._load(lang)
+        finally:
+            pending.set_result(model)
+            with self._lock:
+                del self._loading[lang]
+        return model
+
+    def _load(self, lang):
+        path = self.paths[lang]
+        with self._load_lock:
+            rss_before = resident_bytes()
+            start_time = time.time()
+            try:
+                if path:
+                    model = Model(model_path=path)
+                else:
+                    logger.warning(f"No model path for {lang}, resolving the Vosk model by language")
+                    model = Model(lang=lang)
+            except Exception as e:
+                logger.error(f"[WORKFLOW] Failed to load Vosk model for {lang}: {e}")
+                with self._lock:
+                    self._failed[lang] = (str(e), time.time() + self.retry_after)
+                return None
+            load_time = time.time() - start_time
+            rss_after = resident_bytes()
+
+        disk_bytes = directory_size(path) if path else 0
+        measured = rss_after - rss_before if rss_before is not None and rss_after is not None else 0
+        size = measured if measured > 0 else disk_bytes
+        with self._lock:
+            self._failed.pop(lang, None)
+            evicted = self._resident.put(lang, model, size)
+            self.loads += 1
+            self.evictions += len(evicted)
+            self.models[lang] = {"load_ms": round(load_time * 1000), "resident_bytes": size,
+                                 "disk_bytes": disk_bytes}
+        logger.info(f"[WORKFLOW] Loaded Vosk model for {lang} in {load_time*1000:.0f}ms "
+                    f"({size / 1024 / 1024:.1f}MB resident)")
+        for old_lang, _ in evicted:
+            logger.info(f"[WORKFLOW] Unloaded Vosk model for {old_lang} to stay within the memory cap")
+        return model
+
+    @property
+    def installed(self):
+        """True if vosk could be imported, so models can load at all"""
+        return Model is not None
+
+    @property
+    def available(self):
+        """True once any model has loaded"""
+        with self._lock:
+            return bool(self._resident.entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "default": self.default_lang,
+                "languages": sorted(self.paths),
+                "resident": list(self._resident.entries),
+                "loading": list(self._loading),
+                "failed": {lang: reason for lang, (reason, _) in self._failed.items()},
+                "bytes": self._resident.size,
+                "budget": self._resident.budget,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "models": {lang: dict(info) for lang, info in self.models.items()}
+            }
@@ -0,0 +1,136 @@
+"""Bounded worker pool for Vosk decoding.
+
+Workers share the loaded Model (Kaldi releases the GIL while decoding, so
+threads use several cores). The queue in front of them is bounded: when it is
+full new jobs are rejected immediately rather than slowing every request down.
+Threads do not survive fork, so they are started on first use in each process.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(Exception):
+    """Raised when the STT queue is full and a job cannot be accepted"""
+
+
+class SttJob:
+    """One queued decode with its queue-wait and decode timings"""
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def timings(self):
+        """Queue wait and decode time in milliseconds"""
+        started = self.started or time.time()
+        finished = self.finished or time.time()
+        return {
+            "queue_wait": round((started - self.submitted) * 1000),
+            "decode": round((finished - started) * 1000) if self.started else 0
+        }
+
+
+class SttWorkerPool:
+    """Fixed set of decode threads fed from a bounded queue"""
+
+    def __init__(self, workers, max_queue):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        # Admission is bounded by one slot per running or queued job, which
+        # also allows max_queue=0 (reject whenever every worker is busy)
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.active = 0
+        self._started_pid = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        for index in range(self.workers):
+            threading.Thread(target=self._work, name=f"stt-worker-{index}", daemon=True).start()
+
+    def submit(self, fn, *args):
+        """Queue fn(*args); raises PoolSaturated when workers and queue are all taken"""
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            logger.warning("[WORKFLOW] STT pool saturated, rejecting job")
+            raise PoolSaturated("STT capacity exhausted, retry later")
+        return self._enqueue(fn, args)
+
+    def submit_if_idle(self, fn, *args):
+        """Queue fn(*args) only if a worker is free to start it now, else return None
+
+        Used to spread one request's work over spare workers without taking
+        queue slots that admission of new requests relies on.
+        """
+        self._ensure_started()
+        with self._lock:
+            idle = self.workers - self.active - self._queue.qsize()
+        if idle <= 0 or not self._slots.acquire(blocking=False):
+            return None
+        return self._enqueue(fn, args)
+
+    def _enqueue(self, fn, args):
+        job = SttJob(fn, args)
+        with self._lock:
+            self.submitted += 1
+        self._queue.put(job)
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queued": self._queue.qsize(),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.started = time.time()
+            with self._lock:
+                self.active += 1
+            result, error = None, None
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    result = job.fn(*job.args)
+                except Exception as e:
+                    error = e
+            # Timings and capacity are settled before the caller is woken up
+            job.finished = time.time()
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+            self._slots.release()
+            if job.future.cancelled():
+                continue
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
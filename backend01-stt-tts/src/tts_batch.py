@@ -0,0 +1,289 @@
+"""Batch pre-rendering of TTS audio on a pool of synthesis processes.
+
+Prompt libraries (IVR menus, canned answers) are rendered ahead of time into
+the TTS cache, so replies that use them are served without synthesis. Inputs
+are de-duplicated by cache key and texts already cached are skipped. The rest
+are spread over worker processes, one Piper voice each, so the batch uses
+every core. Results are yielded as they complete. The pool only lives for the
+batch, so its voices do not stay resident. A batch's clips, cached ones
+included, must fit in the cache's disk budget together: the texts that would
+overflow it fail, rather than evicting clips the batch has already returned.
+
+The server does not start the pool itself: it runs this module as a
+subprocess (BatchRunner) and relays its events, so no process is forked from
+a threaded server worker and the server module is never re-imported in the
+pool. Rendered clips land in the shared cache directory, where the server's
+cache finds them.
+
+    python tts_batch.py prompts.txt --workers 8
+"""
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tts_cache import TtsCache
+from tts_engine import PiperEngine
+
+logger = logging.getLogger(__name__)
+
+# Voice loaded by the initializer of each worker process
+_engine = None
+
+
+class BatchBusy(Exception):
+    """Another batch is already using the synthesis processes"""
+
+
+def _load_voice(model_path, config_path):
+    global _engine
+    engine = PiperEngine(model_path, config_path)
+    _engine = engine if engine.load() else None
+
+
+def _render(text):
+    """Synthesize text in a worker process; returns (wav_bytes, seconds spent)"""
+    if _engine is None:
+        raise RuntimeError("Piper TTS not available")
+    start_time = time.time()
+    wav_bytes = _engine.synthesize(text)
+    if wav_bytes is None:
+        raise RuntimeError("Piper synthesis failed")
+    return wav_bytes, time.time() - start_time
+
+
+def wav_duration(wav_bytes):
+    """Length of a WAV clip in seconds"""
+    with wave.open(io.BytesIO(wav_bytes)) as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+
+class BatchRenderer:
+    """Render many texts into the TTS cache on a process pool"""
+
+    def __init__(self, cache, workers=None):
+        self.cache = cache
+        self.workers = workers or os.cpu_count() or 1
+
+    def render(self, texts, model_path, config_path):
+        """Yield a result or error event per distinct text as it finishes, then a done event
+
+        Events are dicts with a "type". Each result names the cache key and
+        the input indexes it covers.
+        """
+        start_time = time.time()
+        voice_id = os.path.basename(model_path)
+        pending = {}  # key -> (text, input indexes)
+        stats = {"utterances": len(texts), "unique": 0, "cached": 0, "rendered": 0, "failed": 0,
+                 "audio_ms": 0, "synth_ms": 0}
+        audio_time = synth_time = 0.0
+
+        for index, text in enumerate(texts):
+            if not isinstance(text, str) or not text.strip():
+                stats["failed"] += 1
+                yield {"type": "error", "indexes": [index], "error": "Text is empty"}
+                continue
+            key = self.cache.key(text, voice_id)
+            if key in pending:
+                pending[key][1].append(index)
+            else:
+                pending[key] = (text, [index])
+        stats["unique"] = len(pending)
+
+        budget = self.cache.stats()["disk"]["budget"]
+        batch_bytes = 0
+        for key in [key for key in pending if self.cache.contains(key)]:
+            text, indexes = pending.pop(key)
+            # Reading it marks the clip recently used, so this batch's renders evict older clips first
+            wav_bytes = self.cache.get(key)
+            if wav_bytes is None:
+                # Evicted in the meantime; render it again
+                pending[key] = (text, indexes)
+                continue
+            batch_bytes += len(wav_bytes)
+            stats["cached"] += 1
+            yield {"type": "result", "key": key, "text": text, "indexes": indexes, "cached": True}
+
+        workers = min(self.workers, len(pending))
+        if pending:
+            logger.info(f"[WORKFLOW] Rendering {len(pending)} texts on {workers} synthesis processes")
+            # Spawned: onnxruntime sessions do not survive fork, and each worker loads its own voice anyway
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_load_voice, initargs=(model_path, config_path)) as executor:
+                futures = {executor.submit(_render, text): key for key, (text, _) in pending.items()}
+                over_budget = None
+                for future in as_completed(futures):
+                    key = futures[future]
+                    text, indexes = pending[key]
+                    try:
+                        if over_budget is None:
+                            wav_bytes, seconds = future.result()
+                            duration = wav_duration(wav_bytes)
+                            if batch_bytes + len(wav_bytes) > budget:
+                                # Caching it would evict clips this batch has already returned
+                                over_budget = (f"Batch exceeds the TTS cache's disk budget of "
+                                               f"{budget // (1024 * 1024)} MB; split it or raise TTS_CACHE_DISK_MB")
+                                for other in futures:
+                                    other.cancel()
+                        if over_budget is not None:
+                            raise RuntimeError(over_budget)
+                    except Exception as e:
+                        stats["failed"] += len(indexes)
+                        yield {"type": "error", "key": key, "text": text, "indexes": indexes, "error": str(e)}
+                        continue
+                    batch_bytes += len(wav_bytes)
+                    self.cache.put(key, wav_bytes)
+                    audio_time += duration
+                    synth_time += seconds
+                    stats["rendered"] += 1
+                    yield {"type": "result", "key": key, "text": text, "indexes": indexes, "cached": False,
+                           "audio_ms": round(duration * 1000), "synth_ms": round(seconds * 1000)}
+
+        elapsed = time.time() - start_time
+        stats.update(
+            workers=workers,
+            elapsed_ms=round(elapsed * 1000),
+            audio_ms=round(audio_time * 1000),
+            synth_ms=round(synth_time * 1000),
+            # Inputs handled per second, cached and duplicate ones included
+            utterances_per_sec=round(len(texts) / elapsed, 2) if elapsed > 0 else 0,
+            rendered_per_sec=round(stats["rendered"] / elapsed, 2) if elapsed > 0 else 0,
+            # Synthesis time per second of audio, per process and for the batch as a whole
+            rtf=round(synth_time / audio_time, 4) if audio_time > 0 else 0,
+            wall_rtf=round(elapsed / audio_time, 4) if audio_time > 0 else 0,
+            cancelled=False
+        )
+        yield {"type": "done", **stats}
+
+
+class BatchRunner:
+    """Run batches in a tts_batch.py subprocess, max_batches at a time, relaying its events"""
+
+    def __init__(self, cache_dir, disk_budget_mb, workers=None, max_batches=1):
+        self.cache_dir = cache_dir
+        self.disk_budget_mb = disk_budget_mb
+        self.workers = workers or os.cpu_count() or 1
+        self._slots = threading.BoundedSemaphore(max_batches)
+
+    def render(self, texts, model_path, config_path, cancel=None):
+        """Yield a started event, then the subprocess's events; see BatchRenderer.render
+
+        Raises BatchBusy on the first next() when max_batches batches are
+        already running. Cancelling kills the subprocess and its pool; the
+        batch then ends with a done event marked cancelled.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise BatchBusy("A TTS batch is already running, retry later")
+        try:
+            yield {"type": "started", "utterances": len(texts)}
+            yield from self._run(texts, model_path, config_path, cancel)
+        finally:
+            self._slots.release()
+
+    def _run(self, texts, model_path, config_path, cancel):
+        start_time = time.time()
+        cmd = [sys.executable, os.path.abspath(__file__), "-", "--jsonl", "--model", model_path,
+               "--config", config_path, "--cache-dir", self.cache_dir,
+               "--cache-disk-mb", str(self.disk_budget_mb), "--workers", str(self.workers)]
+        # Its own session, so a cancel can kill the pool processes along with it
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True)
+
+        def kill():
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        def write_input():
+            try:
+                for text in texts:
+                    process.stdin.write(json.dumps(text).encode('utf-8') + b"\n")
+            except BrokenPipeError:
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        unregister = cancel.on_cancel(kill) if cancel is not None else None
+        writer = threading.Thread(target=write_input, daemon=True)
+        writer.start()
+        reported = set()
+        counts = {"cached": 0, "rendered": 0, "failed": 0}
+        done = None
+        try:
+            for line in process.stdout:
+                event = json.loads(line)
+                if event["type"] == "done":
+                    done = event
+                    continue
+                reported.update(event.get("indexes", []))
+                if event["type"] == "error":
+                    counts["failed"] += len(event.get("indexes", []))
+                else:
+                    counts["cached" if event["cached"] else "rendered"] += 1
+                yield event
+        finally:
+            if unregister:
+                unregister()
+            if process.poll() is None:
+                kill()
+            process.stdout.close()
+            writer.join()
+            returncode = process.wait()
+
+        if done is not None:
+            yield done
+            return
+        cancelled = cancel is not None and cancel.cancelled
+        if cancelled:
+            cancel.reclaim("tts_segments", len(texts) - len(reported))
+        else:
+            yield {"type": "error", "error": f"Batch renderer exited with status {returncode}"}
+        elapsed = time.time() - start_time
+        yield {"type": "done", "utterances": len(texts), **counts, "elapsed_ms": round(elapsed * 1000),
+               "utterances_per_sec": round(len(reported) / elapsed, 2) if elapsed > 0 else 0, "rtf": 0,
+               "cancelled": cancelled}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render texts (one per line) into the TTS cache")
+    parser.add_argument("input", help="Text file with one utterance per line, or - for stdin")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="Each input line is a JSON string; blank texts are reported, not skipped")
+    parser.add_argument("--model", default=os.getenv("PIPER_MODEL_PATH", "/app/piper_models/en_US-lessac-medium.onnx"),
+                        help="Piper voice (.onnx)")
+    parser.add_argument("--config", help="Voice config; defaults to the .onnx.json next to the model")
+    parser.add_argument("--cache-dir", default=os.getenv("TTS_CACHE_DIR", "/tmp/tts_cache"))
+    parser.add_argument("--cache-disk-mb", type=int, default=int(os.getenv("TTS_CACHE_DISK_MB", "256")))
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Synthesis processes")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    with source:
+        if args.jsonl:
+            texts = [json.loads(line) for line in source if line.strip()]
+        else:
+            texts = [line.strip() for line in source if line.strip()]
+    # The memory tier is irrelevant here; everything goes to disk for the servers to pick up
+    cache = TtsCache(args.cache_dir, 0, args.cache_disk_mb * 1024 * 1024, voice_id=os.path.basename(args.model))
+    renderer = BatchRenderer(cache, args.workers)
+    for event in renderer.render(texts, args.model, args.config or f"{args.model}.json"):
+        if event["type"] == "done" or not args.quiet:
+            print(json.dumps(event), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Content-addressed cache for synthesized TTS audio.
+
+Entries are keyed by a hash of the normalized text, the voice model and the
+synthesis parameters. A small in-memory tier holds the hottest clips and an
+on-disk tier holds the rest; both evict least-recently-used entries once they
+exceed their byte budget. The cache directory is shared: a key missing from
+this process's index is still looked up on disk, so clips written by other
+server workers or the batch renderer are found and adopted into the index.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_CACHE_FILENAME = re.compile(r'^[0-9a-f]{64}\.wav$')
+
+
+def normalize_text(text):
+    """Normalize text so trivially different replies share a cache entry"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class LruTier:
+    """Byte-budgeted LRU index; values are whatever the tier stores per key"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.entries = OrderedDict()  # key -> (value, nbytes)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, nbytes):
+        """Insert an entry and return the (key, value) pairs evicted to make room"""
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (value, nbytes)
+        self.size += nbytes
+        evicted = []
+        while self.size > self.budget and len(self.entries) > 1:
+            old_key, (old_value, old_nbytes) = self.entries.popitem(last=False)
+            self.size -= old_nbytes
+            evicted.append((old_key, old_value))
+        return evicted
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class TtsCache:
+    """Two-tier (memory + disk) LRU cache of WAV bytes"""
+
+    def __init__(self, cache_dir, memory_budget, disk_budget, voice_id, params=None):
+        self.cache_dir = cache_dir
+        self.voice_id = voice_id
+        self.params = params or {}
+        self._memory = LruTier(memory_budget)
+        self._disk = LruTier(disk_budget)
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    def key(self, text, voice_id=None):
+        """Cache key for text rendered with a voice (this cache's by default) and its parameters"""
+        material = json.dumps([normalize_text(text), voice_id or self.voice_id, self.params], sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def path_for_filename(self, filename):
+        """Map a served filename back to its disk path, or None if it is not a cache file"""
+        if not _CACHE_FILENAME.match(filename):
+            return None
+        return os.path.join(self.cache_dir, filename)
+
+    def get(self, key):
+        """Return cached WAV bytes, promoting disk hits into memory"""
+        with self._lock:
+            wav_bytes = self._memory.get(key)
+            if wav_bytes is not None:
+                self.hits["memory"] += 1
+                return wav_bytes
+            indexed = self._disk.get(key) is not None
+
+        # Not indexed here may still mean written by another process
+        try:
+            with open(self.path(key), 'rb') as f:
+                wav_bytes = f.read()
+        except OSError:
+            if indexed:
+                # Removed behind our back (e.g. by another worker's eviction)
+                with self._lock:
+                    self._disk.discard(key)
+        else:
+            evicted = []
+            with self._lock:
+                self.hits["disk"] += 1
+                self._memory.put(key, wav_bytes, len(wav_bytes))
+                if not indexed:
+                    evicted = self._disk.put(key, self.path(key), len(wav_bytes))
+            self._remove_files(evicted)
+            return wav_bytes
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def contains(self, key):
+        """True if key is cached, without reading it or counting a lookup"""
+        with self._lock:
+            if key in self._memory.entries or key in self._disk.entries:
+                return True
+        return os.path.exists(self.path(key))
+
+    def put(self, key, wav_bytes):
+        """Store WAV bytes in both tiers"""
+        path = self.path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(wav_bytes)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._memory.put(key, wav_bytes, len(wav_bytes))
+            evicted = self._disk.put(key, path, len(wav_bytes))
+        self._remove_files(evicted)
+
+    def _remove_files(self, evicted):
+        for old_key, old_path in evicted:
+            try:
+                os.remove(old_path)
+                logger.debug(f"[WORKFLOW] Evicted cached TTS file: {old_path}")
+            except OSError:
+                pass
+
+    def get_or_synthesize(self, text, synthesize, voice_id=None):
+        """Return (key, wav_bytes), synthesizing and caching on a miss"""
+        key = self.key(text, voice_id)
+        wav_bytes = self.get(key)
+        if wav_bytes is None:
+            wav_bytes = synthesize(text)
+            if wav_bytes is not None:
+                self.put(key, wav_bytes)
+        return key, wav_bytes
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_rate": round((lookups - self.misses) / lookups, 3) if lookups else 0,
+                "memory": {"entries": len(self._memory.entries), "bytes": self._memory.size,
+                           "budget": self._memory.budget},
+                "disk": {"entries": len(self._disk.entries), "bytes": self._disk.size,
+                         "budget": self._disk.budget}
+            }
+
+    def _load_disk_index(self):
+        """Rebuild the disk tier from files left by a previous run, oldest first"""
+        files = []
+        for filename in os.listdir(self.cache_dir):
+            if _CACHE_FILENAME.match(filename):
+                path = os.path.join(self.cache_dir, filename)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, filename[:-4], path, stat.st_size))
+        for _, key, path, nbytes in sorted(files):
+            for _, old_path in self._disk.put(key, path, nbytes):
+                os.remove(old_path)
@@ -0,0 +1,185 @@
+"""Resident Piper TTS engine.
+
+The voice is loaded once and kept in memory, so a reply only pays for
+synthesis instead of process startup plus ONNX model load.
+"""
+import io
+import logging
+import os
+import queue
+import re
+import subprocess
+import tempfile
+import time
+import wave
+
+logger = logging.getLogger(__name__)
+
+# The in-process engine needs the piper-tts Python package; the CLI is only
+# used as a fallback when the package is missing.
+try:
+    from piper import PiperVoice
+    PIPER_PYTHON_AVAILABLE = True
+except ImportError:
+    PiperVoice = None
+    PIPER_PYTHON_AVAILABLE = False
+
+# Sentence ends, plus newlines; clauses are only split when a sentence is long
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;:])\s+|\n+')
+_CLAUSE_BOUNDARY = re.compile(r'(?<=,)\s+')
+
+
+class SentenceBuffer:
+    """Accumulate streamed text and release sentence/clause segments as they close"""
+
+    def __init__(self, min_chars=20, max_chars=200):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+        self._pending = ""
+
+    def feed(self, text):
+        """Add text and return the segments it completed"""
+        self._buffer += text
+        parts = _SENTENCE_BOUNDARY.split(self._buffer)
+        # The trailing part has no closing boundary yet, so keep it buffered
+        self._buffer = parts.pop()
+        if len(self._buffer) > self.max_chars:
+            clauses = _CLAUSE_BOUNDARY.split(self._buffer)
+            self._buffer = clauses.pop()
+            parts.extend(clauses)
+        return list(self._segments(parts))
+
+    def flush(self):
+        """Return whatever text is left once the stream has ended"""
+        segments = list(self._segments([self._buffer]))
+        self._buffer = ""
+        if self._pending:
+            segments.append(self._pending)
+            self._pending = ""
+        return segments
+
+    def _segments(self, parts):
+        for part in parts:
+            part = part.strip()
+            if not part:
+                continue
+            clauses = [part] if len(part) <= self.max_chars else _CLAUSE_BOUNDARY.split(part)
+            for clause in clauses:
+                # Merge very short fragments so Piper gets enough context for prosody
+                self._pending = f"{self._pending} {clause}".strip()
+                if len(self._pending) >= self.min_chars:
+                    yield self._pending
+                    self._pending = ""
+
+
+def split_sentences(text, min_chars=20, max_chars=200):
+    """Split text into sentence/clause segments for incremental synthesis"""
+    sentence_buffer = SentenceBuffer(min_chars, max_chars)
+    return sentence_buffer.feed(text) + sentence_buffer.flush()
+
+
+class PiperEngine:
+    """Pool of resident Piper voices that synthesize text to WAV bytes"""
+
+    def __init__(self, model_path, config_path, workers=1):
+        self.model_path = model_path
+        self.config_path = config_path
+        self.workers = max(1, workers)
+        self.mode = None  # "python", "cli" or None when unavailable
+        self.load_time = 0
+        self._voices = queue.Queue()
+
+    @property
+    def available(self):
+        return self.mode is not None
+
+    def load(self):
+        """Load the voice(s) once; returns True if synthesis is available"""
+        if not (os.path.exists(self.model_path) and os.path.exists(self.config_path)):
+            logger.warning("Piper TTS model files not found")
+            return False
+
+        start_time = time.time()
+        if PIPER_PYTHON_AVAILABLE:
+            try:
+                for _ in range(self.workers):
+                    self._voices.put(PiperVoice.load(self.model_path, config_path=self.config_path))
+                self.mode = "python"
+            except Exception as e:
+                logger.error(f"Failed to load Piper voice in-process: {e}")
+
+        if self.mode is None:
+            try:
+                subprocess.run(["piper", "--help"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                self.mode = "cli"
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                logger.warning("Piper TTS not available")
+                return False
+
+        self.load_time = time.time() - start_time
+        logger.info(f"Piper TTS engine ready (mode={self.mode}, workers={self.workers}, "
+                    f"load: {self.load_time*1000:.2f}ms)")
+        return True
+
+    def synthesize(self, text, cancel=None):
+        """Synthesize text and return WAV bytes, or None on failure or cancellation"""
+        if cancel is not None and cancel.cancelled:
+            return None
+        if self.mode == "python":
+            return self._synthesize_in_process(text)
+        if self.mode == "cli":
+            return self._synthesize_with_cli(text, cancel)
+        return None
+
+    def synthesize_stream(self, text, synthesize=None, cancel=None):
+        """Yield (segment, wav_bytes) for each sentence as soon as it is rendered
+
+        synthesize overrides how a single segment is rendered, e.g. through a cache.
+        Sentences not yet rendered when cancel fires are dropped.
+        """
+        synthesize = synthesize or self.synthesize
+        segments = split_sentences(text)
+        for index, segment in enumerate(segments):
+            if cancel is not None and cancel.cancelled:
+                cancel.reclaim("tts_segments", len(segments) - index)
+                return
+            wav_bytes = synthesize(segment)
+            if wav_bytes is not None:
+                yield segment, wav_bytes
+
+    def _synthesize_in_process(self, text):
+        voice = self._voices.get()
+        try:
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav_file:
+                # piper-tts >= 1.3 renamed the WAV writer to synthesize_wav()
+                if hasattr(voice, "synthesize_wav"):
+                    voice.synthesize_wav(text, wav_file)
+                else:
+                    voice.synthesize(text, wav_file)
+            return buffer.getvalue()
+        except Exception as e:
+            logger.error(f"[ERROR] Piper synthesis failed: {e}")
+            return None
+        finally:
+            self._voices.put(voice)
+
+    def _synthesize_with_cli(self, text, cancel=None):
+        with tempfile.NamedTemporaryFile(suffix=".wav") as output_file:
+            cmd = ["piper", "--model", self.model_path, "--output_file", output_file.name]
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            # A cancelled turn kills the process instead of waiting for audio nobody will hear
+            unregister = cancel.on_cancel(process.kill) if cancel is not None else None
+            try:
+                _, stderr = process.communicate(input=text.encode())
+            finally:
+                if unregister:
+                    unregister()
+            if cancel is not None and cancel.cancelled:
+                cancel.reclaim("tts_processes")
+                return None
+            if process.returncode != 0:
+                logger.error(f"[ERROR] Piper TTS failed: {stderr.decode()}")
+                return None
+            return output_file.read()
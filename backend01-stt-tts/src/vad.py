@@ -0,0 +1,104 @@
+"""Energy-based voice activity detection on PCM16 audio.
+
+Every push-to-talk clip starts and ends with silence, and some contain no
+speech at all. Frame energies are computed for the whole clip at once with
+numpy; frames above an adaptive threshold are speech. Speech regions are
+merged across short pauses, padded, and grouped into segments. Leading and
+trailing silence is dropped, as are pauses between segments, so Kaldi only
+sees speech and long recordings can be decoded one segment per worker.
+"""
+import numpy as np
+
+# Level reported for digital silence, in dBFS
+SILENCE_DB = -100.0
+
+
+def find_runs(mask):
+    """Start and end (exclusive) indexes of each run of True in a boolean array"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def merge_gaps(starts, ends, min_gap):
+    """Join consecutive runs separated by fewer than min_gap frames"""
+    if len(starts) < 2:
+        return starts, ends
+    keep = (starts[1:] - ends[:-1]) >= min_gap
+    return starts[np.concatenate(([True], keep))], ends[np.concatenate((keep, [True]))]
+
+
+class VoiceActivityDetector:
+    """Find the speech in a clip and cut it into independently decodable segments
+
+    A frame is speech when its level is above threshold_db (dBFS) and at least
+    margin_db above the clip's noise floor, but the threshold never rises
+    above the loudest frame minus margin_db. This keeps quiet speech in a
+    clip that has no silent frames. Pauses shorter than min_silence_ms do
+    not split speech, bursts shorter than min_speech_ms are dropped, and
+    padding_ms is kept around each region so word onsets are not clipped.
+    Segments are at most max_segment_s long unless a single region is
+    longer; 0 keeps one segment.
+    """
+
+    def __init__(self, threshold_db=-45.0, margin_db=12.0, frame_ms=20, min_speech_ms=120,
+                 min_silence_ms=300, padding_ms=150, max_segment_s=15.0):
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.frame_ms = frame_ms
+        self.min_speech_ms = min_speech_ms
+        self.min_silence_ms = min_silence_ms
+        self.padding_ms = padding_ms
+        self.max_segment_s = max_segment_s
+
+    def frame_levels(self, samples, frame_len):
+        """RMS level in dBFS of each whole frame"""
+        frames = samples[:len(samples) // frame_len * frame_len].astype(np.float32).reshape(-1, frame_len)
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        return np.maximum(20 * np.log10(rms / 32768.0 + 1e-10), SILENCE_DB)
+
+    def segments(self, pcm, sample_rate=16000):
+        """Return (segments, stats): PCM16 byte strings of speech and what was trimmed"""
+        samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+        frame_len = max(1, sample_rate * self.frame_ms // 1000)
+        stats = {"input_ms": round(len(samples) * 1000 / sample_rate), "speech_ms": 0, "trimmed_ms": 0,
+                 "segments": 0, "threshold_db": None}
+        if len(samples) < frame_len:
+            stats["trimmed_ms"] = stats["input_ms"]
+            return [], stats
+
+        levels = self.frame_levels(samples, frame_len)
+        noise_floor = float(np.percentile(levels, 10))
+        threshold = max(self.threshold_db, min(noise_floor + self.margin_db, float(levels.max()) - self.margin_db))
+        stats["threshold_db"] = round(threshold, 1)
+
+        starts, ends = find_runs(levels > threshold)
+        starts, ends = merge_gaps(starts, ends, self.min_silence_ms // self.frame_ms)
+        long_enough = (ends - starts) >= max(1, self.min_speech_ms // self.frame_ms)
+        starts, ends = starts[long_enough], ends[long_enough]
+        padding = self.padding_ms // self.frame_ms
+        starts = np.maximum(starts - padding, 0)
+        ends = np.minimum(ends + padding, len(levels))
+        starts, ends = merge_gaps(starts, ends, 1)
+
+        segments = []
+        for start, end in self._group(starts, ends):
+            segments.append(pcm[start * frame_len * 2:end * frame_len * 2])
+        speech_samples = sum(len(segment) // 2 for segment in segments)
+        stats.update(speech_ms=round(speech_samples * 1000 / sample_rate), segments=len(segments))
+        stats["trimmed_ms"] = stats["input_ms"] - stats["speech_ms"]
+        return segments, stats
+
+    def _group(self, starts, ends):
+        # Consecutive regions share a segment (pauses included) up to the length cap
+        if not len(starts):
+            return []
+        if not self.max_segment_s:
+            return [(starts[0], ends[-1])]
+        max_frames = int(self.max_segment_s * 1000 / self.frame_ms)
+        groups = [[starts[0], ends[0]]]
+        for start, end in zip(starts[1:], ends[1:]):
+            if end - groups[-1][0] <= max_frames:
+                groups[-1][1] = end
+            else:
+                groups.append([start, end])
+        return groups
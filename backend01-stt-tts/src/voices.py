@@ -0,0 +1,143 @@
+"""Registry of Piper voices, loaded on first use within a memory budget.
+
+Voices are discovered as `<voice>.onnx` / `<voice>.onnx.json` pairs in a
+models directory. A voice loads the first time a request asks for it and then
+stays resident, so later requests only pay for synthesis. Once the resident
+voices exceed the memory budget, the least recently used ones are unloaded.
+Concurrent first requests for the same voice share a single load.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from tts_cache import LruTier
+from tts_engine import PiperEngine
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownVoice(Exception):
+    """The requested voice is not in the registry"""
+
+
+class VoiceRegistry:
+    """Piper engines by voice id, loaded lazily and evicted least-recently-used
+
+    A voice's resident size is estimated as its ONNX model size times the
+    number of engine workers, which is what onnxruntime keeps in memory per
+    loaded session. The voice just loaded is always kept, even if it alone
+    exceeds the budget. An unloaded voice's memory is released once the
+    requests still synthesizing with it finish. A voice that fails to load is
+    not retried for retry_after seconds, so a file still being copied does not
+    disable it until restart.
+    """
+
+    def __init__(self, models_dir, default_voice, memory_budget, workers=1, retry_after=30.0):
+        self.models_dir = models_dir
+        self.default_voice = default_voice
+        self.workers = workers
+        self.retry_after = retry_after
+        self.voices = {}  # voice_id -> (model_path, config_path)
+        self._resident = LruTier(memory_budget)  # voice_id -> loaded PiperEngine
+        self._loading = {}  # voice_id -> Future of the load in progress
+        self._failed = {}  # voice_id -> (why its load failed, when to retry)
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.load_times = {}  # voice_id -> seconds of its last load
+
+    def discover(self):
+        """Register every voice with both its model and config file in models_dir"""
+        if not os.path.isdir(self.models_dir):
+            logger.warning(f"Piper models directory not found: {self.models_dir}")
+            return
+        for filename in sorted(os.listdir(self.models_dir)):
+            model_path = os.path.join(self.models_dir, filename)
+            if filename.endswith('.onnx') and os.path.exists(f"{model_path}.json"):
+                self.add(filename[:-len('.onnx')], model_path, f"{model_path}.json")
+        logger.info(f"[WORKFLOW] Discovered {len(self.voices)} Piper voice(s) in {self.models_dir}")
+
+    def add(self, voice_id, model_path, config_path):
+        with self._lock:
+            self.voices[voice_id] = (model_path, config_path)
+
+    def resolve(self, voice_id=None):
+        """Voice id to use for a request; raises UnknownVoice if it is not registered"""
+        voice_id = voice_id or self.default_voice
+        if voice_id not in self.voices:
+            raise UnknownVoice(f"Unknown voice '{voice_id}', available: {', '.join(sorted(self.voices))}")
+        return voice_id
+
+    def get(self, voice_id=None):
+        """Return the loaded engine of a voice, loading it if needed; None if it cannot load"""
+        voice_id = self.resolve(voice_id)
+        with self._lock:
+            engine = self._resident.get(voice_id)
+            if engine is not None:
+                return engine
+            failed = self._failed.get(voice_id)
+            if failed is not None and time.time() < failed[1]:
+                return None
+            pending = self._loading.get(voice_id)
+            loading = pending is None
+            if loading:
+                pending = self._loading[voice_id] = Future()
+        if not loading:
+            # Another request is loading this voice; share its result
+            return pending.result()
+
+        engine = None
+        try:
+            engine = self._load(voice_id)
+        finally:
+            pending.set_result(engine)
+            with self._lock:
+                del self._loading[voice_id]
+        return engine
+
+    def _load(self, voice_id):
+        model_path, config_path = self.voices[voice_id]
+        engine = PiperEngine(model_path, config_path, workers=self.workers)
+        start_time = time.time()
+        if not engine.load():
+            with self._lock:
+                self._failed[voice_id] = ("Piper TTS not available", time.time() + self.retry_after)
+            return None
+        load_time = time.time() - start_time
+
+        # The CLI fallback loads the model per call, so nothing stays resident
+        size = os.path.getsize(model_path) * engine.workers if engine.mode == "python" else 0
+        with self._lock:
+            self._failed.pop(voice_id, None)
+            evicted = self._resident.put(voice_id, engine, size)
+            self.loads += 1
+            self.evictions += len(evicted)
+            self.load_times[voice_id] = load_time
+        logger.info(f"[WORKFLOW] Loaded Piper voice {voice_id} in {load_time*1000:.0f}ms "
+                    f"({size / 1024 / 1024:.1f}MB resident)")
+        for old_voice, _ in evicted:
+            logger.info(f"[WORKFLOW] Unloaded Piper voice {old_voice} to stay within the memory budget")
+        return engine
+
+    @property
+    def available(self):
+        """True once any voice has loaded"""
+        with self._lock:
+            return bool(self._resident.entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "default": self.default_voice,
+                "voices": sorted(self.voices),
+                "resident": list(self._resident.entries),
+                "loading": list(self._loading),
+                "failed": {voice_id: reason for voice_id, (reason, _) in self._failed.items()},
+                "bytes": self._resident.size,
+                "budget": self._resident.budget,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_ms": {voice_id: round(seconds * 1000) for voice_id, seconds in self.load_times.items()}
+            }
@@ -0,0 +1,40 @@
+"""Tests for the TTS artifact store"""
+import time
+
+from artifacts import ArtifactStore
+
+
+def test_fetched_artifacts_linger_then_expire():
+    store = ArtifactStore(max_bytes=1024, ttl=0.05, unfetched_ttl=60)
+    store.put("a", b"audio")
+    assert store.get("a").data == b"audio"
+    # Re-fetches (e.g. range requests) are still served during the linger TTL
+    assert store.get("a") is not None
+    time.sleep(0.1)
+    assert store.get("a") is None
+    assert store.stats()["expired"] == 1
+
+
+def test_unfetched_artifacts_are_not_evicted_for_space():
+    store = ArtifactStore(max_bytes=10, ttl=60, unfetched_ttl=60)
+    store.put("fetched", b"x" * 6)
+    store.get("fetched")
+    store.put("pending", b"y" * 6)
+    assert store.get("fetched") is None
+    assert store.stats()["evicted"] == 1
+
+    store.put("also-pending", b"z" * 6)
+    stats = store.stats()
+    assert stats["pending"] == 2 and stats["fetched"] == 0
+    assert stats["bytes"] > stats["max_bytes"]
+
+
+def test_re_adding_pins_for_each_client():
+    store = ArtifactStore(max_bytes=1024, ttl=60, unfetched_ttl=60)
+    store.put("a", b"audio")
+    store.put("a", b"audio")
+    store.get("a")
+    assert store.stats()["pending"] == 1
+    store.get("a")
+    stats = store.stats()
+    assert stats["pending"] == 0 and stats["fetched"] == 1 and stats["bytes"] == 5
@@ -0,0 +1,64 @@
+"""Tests for the chat history store"""
+from history import ChatHistoryStore, JsonLinesLog, SqliteLog
+
+
+def test_ring_buffer_keeps_latest_messages_and_pages_backwards():
+    store = ChatHistoryStore(max_messages_per_user=3)
+    for i in range(5):
+        store.append("alice", "user", f"message {i}")
+
+    messages, cursor, total = store.page("alice", limit=2)
+    assert [m["content"] for m in messages] == ["message 3", "message 4"]
+    assert total == 3
+    messages, cursor, _ = store.page("alice", before=cursor, limit=2)
+    assert [m["content"] for m in messages] == ["message 2"]
+    assert cursor is None
+    assert store.page("bob") == ([], None, 0)
+
+
+def test_least_recently_active_user_is_evicted_over_budget():
+    store = ChatHistoryStore(max_bytes=700)
+    store.append("alice", "user", "hello")
+    store.append("bob", "user", "hello")
+    store.append("carol", "user", "hello")
+    store.append("carol", "ai", "hi")
+    assert store.page("alice")[2] == 0
+    assert store.page("carol")[2] == 2
+    assert store.stats()["evicted_users"] == 1
+
+
+def test_clear():
+    store = ChatHistoryStore()
+    store.append("alice", "user", "hello")
+    assert store.clear("alice")
+    assert not store.clear("alice")
+    assert store.page("alice")[2] == 0
+
+
+def replay_roundtrip(log_class, path):
+    store = ChatHistoryStore(persistence=log_class(str(path)))
+    store.append("alice", "user", "hello")
+    store.append("alice", "ai", "hi there")
+    store.append("bob", "user", "gone soon")
+    store.clear("bob")
+    store.close()
+
+    restored = ChatHistoryStore(persistence=log_class(str(path)))
+    messages, _, _ = restored.page("alice")
+    assert [(m["type"], m["content"], m["seq"]) for m in messages] == [("user", "hello", 1), ("ai", "hi there", 2)]
+    assert restored.page("bob")[2] == 0
+
+
+def test_json_lines_log_is_replayed(tmp_path):
+    replay_roundtrip(JsonLinesLog, tmp_path / "history.jsonl")
+
+
+def test_sqlite_log_is_replayed(tmp_path):
+    replay_roundtrip(SqliteLog, tmp_path / "history.db")
+
+
+def test_zero_limit_returns_nothing():
+    store = ChatHistoryStore()
+    for i in range(3):
+        store.append("alice", "user", f"message {i}")
+    assert store.page("alice", limit=0) == ([], None, 3)
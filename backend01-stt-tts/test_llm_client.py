@@ -0,0 +1,120 @@
+"""Tests for the LLM backend client's retries and circuit breaker"""
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from llm_client import CircuitBreaker, CircuitOpen, LlmBackendError, LlmClient
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+
+    def json(self):
+        return self.payload
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Returns (or raises) the queued outcomes in order and counts the calls"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def refused():
+    """The ConnectionError requests raises when nothing listens on the port"""
+    return requests.ConnectionError(MaxRetryError(None, "/generate", NewConnectionError(None, "Connection refused")))
+
+
+def make_client(*outcomes, breaker=None):
+    client = LlmClient("http://llm", retries=2, backoff=0, breaker=breaker)
+    client.session = FakeSession(*outcomes)
+    return client
+
+
+def test_breaker_opens_after_threshold_and_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    assert not breaker.allow()
+    breaker.reset_timeout = 0
+    assert breaker.allow()
+    breaker.record_failure()
+    breaker.reset_timeout = 60
+    assert breaker.state == "open"
+
+
+def test_unexpected_error_during_probe_does_not_leave_it_stuck():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    client = make_client(requests.exceptions.ChunkedEncodingError("torn"), FakeResponse(200), breaker=breaker)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.generate("hi")
+    # The probe settled as a failure, so the next request may probe again
+    assert client.generate("hi") == {}
+    assert breaker.state == "closed"
+
+
+def test_connection_errors_and_bare_503_are_retried():
+    client = make_client(refused(), FakeResponse(503), FakeResponse(200, {"response": "ok"}))
+    assert client.generate("hi") == {"response": "ok"}
+    assert client.session.calls == 3
+
+    client = make_client(requests.ConnectTimeout("slow connect"), FakeResponse(200))
+    assert client.generate("hi") == {}
+    assert client.session.calls == 2
+
+
+@pytest.mark.parametrize("error", [requests.ReadTimeout("still generating"),
+                                   requests.ConnectionError("Connection aborted.")])
+def test_failures_after_the_request_was_sent_are_not_retried(error):
+    client = make_client(error, FakeResponse(200))
+    with pytest.raises(type(error)):
+        client.generate("hi")
+    assert client.session.calls == 1
+    assert client.breaker.failures == 1
+
+
+@pytest.mark.parametrize("response", [FakeResponse(504, {"reason": "deadline_expired"}),
+                                      FakeResponse(503, {"reason": "overloaded"})])
+def test_scheduler_rejections_are_not_retried_and_keep_the_breaker_closed(response):
+    breaker = CircuitBreaker(failure_threshold=1)
+    client = make_client(response, breaker=breaker)
+    with pytest.raises(LlmBackendError) as error:
+        client.generate("hi")
+    assert error.value.status_code == response.status_code
+    assert client.session.calls == 1
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    client = make_client(refused(), refused(), refused(), breaker=breaker)
+    with pytest.raises(requests.ConnectionError):
+        client.generate("hi")
+    with pytest.raises(CircuitOpen):
+        client.generate("hi")
+    assert client.session.calls == 3
@@ -0,0 +1,40 @@
+"""Tests for the overlapped LLM -> TTS voice turn pipeline"""
+import queue
+import time
+
+import pipeline as pipeline_module
+from pipeline import VoiceTurnPipeline
+
+
+def llm_stream(tokens):
+    for token in tokens:
+        yield {"type": "token", "token": token}
+    yield {"type": "done", "latency": {"processing": 5}}
+
+
+class SlowEndQueue(queue.Queue):
+    """Pauses the producer right after it queues the end marker"""
+
+    def put(self, item, *args, **kwargs):
+        super().put(item, *args, **kwargs)
+        if item is pipeline_module._END:
+            time.sleep(0.05)
+
+
+def test_sentences_are_synthesized_while_text_streams():
+    pipeline = VoiceTurnPipeline(time.time(), 0.1)
+    tokens = ["The lights are now on. ", "The front door is locked", " as well."]
+    events = list(pipeline.run(llm_stream(tokens), synthesize=lambda text: text.encode()))
+    assert [e["token"] for e in events if e["type"] == "text"] == tokens
+    assert [e["text"] for e in events if e["type"] == "audio"] == [
+        "The lights are now on.", "The front door is locked as well."]
+    assert pipeline.llm_latency == {"processing": 5}
+
+
+def test_response_is_set_when_the_turn_ends(monkeypatch):
+    # The caller reads response as soon as the last event is out
+    monkeypatch.setattr(pipeline_module.queue, "Queue", SlowEndQueue)
+    pipeline = VoiceTurnPipeline(time.time(), 0)
+    for _ in pipeline.run(llm_stream(["Hello", " there."])):
+        pass
+    assert pipeline.response == "Hello there."
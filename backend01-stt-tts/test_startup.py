@@ -0,0 +1,29 @@
+"""Tests for startup tracking and readiness"""
+from startup import Degraded, StartupTracker
+
+
+def missing_engine():
+    raise Degraded("Piper TTS not available")
+
+
+def broken_step():
+    raise RuntimeError("warm-up crashed")
+
+
+def test_missing_engine_degrades_without_failing_readiness():
+    startup = StartupTracker()
+    startup.run_in_background([("piper_load", missing_engine), ("warmup", lambda: None)])
+    assert startup.wait(5)
+    status = startup.status()
+    assert status["ready"]
+    assert status["degraded"] == {"piper_load": "Piper TTS not available"}
+    assert "piper_load" in status["timings"] and "warmup" in status["timings"]
+
+
+def test_failed_step_is_not_ready():
+    startup = StartupTracker()
+    startup.step("warmup", broken_step)
+    startup.run_in_background([])
+    assert startup.wait(5)
+    assert not startup.ready
+    assert startup.status()["errors"] == {"warmup": "warm-up crashed"}
@@ -0,0 +1,42 @@
+"""Tests for the Vosk model registry"""
+import time
+
+import pytest
+
+import stt_models
+from stt_models import SttModelRegistry, UnknownLanguage, language_of
+
+
+class FlakyModel:
+    """Fails to load until its model directory has a "ready" file"""
+
+    def __init__(self, model_path=None, lang=None):
+        if not (model_path and (model_path / "ready").exists()):
+            raise Exception("Failed to create a model")
+
+
+def test_language_of_model_directories():
+    assert language_of("vosk-model-small-en-us-0.15") == "en-us"
+    assert language_of("vosk-model-de-0.21") == "de"
+
+
+def test_short_codes_match_registered_variants():
+    registry = SttModelRegistry("en-us", 1024)
+    registry.add("en-us", "/models/en-us")
+    assert registry.resolve("EN") == "en-us"
+    with pytest.raises(UnknownLanguage):
+        registry.resolve("fr")
+
+
+def test_failed_model_is_retried_after_the_backoff(tmp_path, monkeypatch):
+    monkeypatch.setattr(stt_models, "Model", FlakyModel)
+    registry = SttModelRegistry("en-us", 1024 * 1024, retry_after=0.1)
+    registry.add("en-us", tmp_path)
+
+    assert registry.get() is None
+    assert registry.stats()["failed"] == {"en-us": "Failed to create a model"}
+    (tmp_path / "ready").write_text("")
+    assert registry.get() is None  # within the backoff
+    time.sleep(0.15)
+    assert isinstance(registry.get(), FlakyModel)
+    assert registry.stats()["failed"] == {}
@@ -0,0 +1,70 @@
+"""Tests for batch pre-rendering into the TTS cache"""
+import os
+import sys
+
+from tts_batch import BatchRenderer
+from tts_cache import TtsCache
+
+# Stand-in for the piper CLI: a WAV of one 16-bit sample per character, or garbage for "broken" texts
+FAKE_PIPER = f"""#!{sys.executable}
+import sys, wave
+if "--help" in sys.argv:
+    sys.exit(0)
+text = sys.stdin.read()
+path = sys.argv[sys.argv.index("--output_file") + 1]
+if "broken" in text:
+    open(path, "wb").write(b"not a wav")
+    sys.exit(0)
+with wave.open(path, "wb") as wav_file:
+    wav_file.setnchannels(1)
+    wav_file.setsampwidth(2)
+    wav_file.setframerate(16000)
+    wav_file.writeframes(bytes(2 * len(text)))
+"""
+
+
+def make_renderer(tmp_path, monkeypatch, disk_budget=1024 * 1024):
+    piper = tmp_path / "piper"
+    piper.write_text(FAKE_PIPER)
+    piper.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{os.environ['PATH']}")
+    (tmp_path / "voice.onnx").write_bytes(b"")
+    (tmp_path / "voice.onnx.json").write_text("{}")
+    cache = TtsCache(str(tmp_path / "cache"), 0, disk_budget, voice_id="voice.onnx")
+    return BatchRenderer(cache, workers=2), str(tmp_path / "voice.onnx")
+
+
+def render(renderer, model_path, texts):
+    events = list(renderer.render(texts, model_path, f"{model_path}.json"))
+    return events[:-1], events[-1]
+
+
+def test_duplicates_and_cached_texts_render_once(tmp_path, monkeypatch):
+    renderer, model_path = make_renderer(tmp_path, monkeypatch)
+    events, done = render(renderer, model_path, ["Hello there.", "Hello  there. ", "", "Goodbye."])
+    assert done["rendered"] == 2 and done["failed"] == 1 and done["unique"] == 2
+    assert sorted(index for e in events if e["type"] == "result" for index in e["indexes"]) == [0, 1, 3]
+
+    _, done = render(renderer, model_path, ["Hello there.", "Goodbye."])
+    assert done["cached"] == 2 and done["rendered"] == 0
+
+
+def test_malformed_audio_fails_only_its_text(tmp_path, monkeypatch):
+    renderer, model_path = make_renderer(tmp_path, monkeypatch)
+    events, done = render(renderer, model_path, ["This one is broken.", "This one is fine."])
+    assert done["rendered"] == 1 and done["failed"] == 1
+    assert [e["indexes"] for e in events if e["type"] == "error"] == [[0]]
+
+
+def test_batch_never_evicts_its_own_clips(tmp_path, monkeypatch):
+    # Each clip is a 44-byte header plus 2 bytes per character: three fit, five do not
+    renderer, model_path = make_renderer(tmp_path, monkeypatch, disk_budget=3 * (44 + 2 * 20))
+    texts = [f"Prompt number {i} here." for i in range(5)]
+    events, done = render(renderer, model_path, texts)
+    results = [e for e in events if e["type"] == "result"]
+    errors = [e for e in events if e["type"] == "error"]
+    assert len(results) == done["rendered"] <= 3
+    assert len(errors) == done["failed"] == 5 - len(results)
+    assert all("disk budget" in e["error"] for e in errors)
+    for result in results:
+        assert os.path.exists(renderer.cache.path(result["key"]))
@@ -0,0 +1,63 @@
+"""Tests for the two-tier TTS cache"""
+import os
+
+from tts_cache import TtsCache
+
+
+def make_cache(cache_dir, memory_budget=1024, disk_budget=1024):
+    return TtsCache(str(cache_dir), memory_budget, disk_budget, voice_id="voice.onnx")
+
+
+def test_key_normalizes_text_and_depends_on_voice(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.key("Hello  world ") == cache.key("Hello world")
+    assert cache.key("Hello world") != cache.key("Hello world", "other.onnx")
+
+
+def test_get_or_synthesize_caches_on_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    def synthesize(text):
+        calls.append(text)
+        return b"RIFF" + text.encode()
+
+    key, wav_bytes = cache.get_or_synthesize("hi", synthesize)
+    assert cache.get_or_synthesize("hi", synthesize) == (key, wav_bytes)
+    assert calls == ["hi"]
+    assert os.path.exists(cache.path(key))
+    assert cache.stats()["hits"]["memory"] == 1
+
+
+def test_disk_hit_after_memory_eviction(tmp_path):
+    cache = make_cache(tmp_path, memory_budget=10)
+    cache.put("a" * 64, b"x" * 8)
+    cache.put("b" * 64, b"y" * 8)
+    assert cache.get("a" * 64) == b"x" * 8
+    assert cache.stats()["hits"]["disk"] == 1
+
+
+def test_disk_eviction_removes_files(tmp_path):
+    cache = make_cache(tmp_path, disk_budget=10)
+    cache.put("a" * 64, b"x" * 8)
+    cache.put("b" * 64, b"y" * 8)
+    assert not os.path.exists(cache.path("a" * 64))
+    assert cache.stats()["disk"]["entries"] == 1
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    key = make_cache(tmp_path).key("persisted")
+    make_cache(tmp_path).put(key, b"RIFFdata")
+    assert make_cache(tmp_path).stats()["disk"]["entries"] == 1
+
+
+def test_clips_written_by_another_instance_are_found(tmp_path):
+    writer = make_cache(tmp_path)
+    reader = make_cache(tmp_path)
+    key = writer.key("rendered elsewhere")
+    writer.put(key, b"RIFFdata")
+
+    assert reader.contains(key)
+    assert reader.get(key) == b"RIFFdata"
+    assert reader.stats()["disk"]["entries"] == 1
+    assert reader.stats()["misses"] == 0
@@ -0,0 +1,81 @@
+"""Tests for the resident Piper engine and sentence segmentation of streamed replies"""
+import os
+import sys
+import threading
+import time
+
+import tts_engine
+from cancellation import CancelToken
+from tts_engine import PiperEngine, SentenceBuffer, split_sentences
+
+# Stand-in for the piper CLI: answers --help, writes its stdin to --output_file, after FAKE_PIPER_SLEEP seconds
+FAKE_PIPER = f"""#!{sys.executable}
+import os, sys, time
+if "--help" in sys.argv:
+    sys.exit(0)
+time.sleep(float(os.environ.get("FAKE_PIPER_SLEEP", "0")))
+text = sys.stdin.read()
+with open(sys.argv[sys.argv.index("--output_file") + 1], "wb") as f:
+    f.write(b"RIFF" + text.encode())
+"""
+
+
+def cli_engine(tmp_path, monkeypatch):
+    piper = tmp_path / "piper"
+    piper.write_text(FAKE_PIPER)
+    piper.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{os.environ['PATH']}")
+    monkeypatch.setattr(tts_engine, "PIPER_PYTHON_AVAILABLE", False)
+    (tmp_path / "voice.onnx").write_bytes(b"")
+    (tmp_path / "voice.onnx.json").write_text("{}")
+    engine = PiperEngine(str(tmp_path / "voice.onnx"), str(tmp_path / "voice.onnx.json"))
+    assert engine.load()
+    assert engine.mode == "cli"
+    return engine
+
+
+def test_load_fails_without_model_files(tmp_path):
+    engine = PiperEngine(str(tmp_path / "missing.onnx"), str(tmp_path / "missing.onnx.json"))
+    assert not engine.load()
+    assert not engine.available
+
+
+def test_synthesize_returns_none_when_not_loaded():
+    engine = PiperEngine("missing.onnx", "missing.onnx.json")
+    assert engine.synthesize("Hello there") is None
+
+
+def test_cli_mode_synthesizes(tmp_path, monkeypatch):
+    engine = cli_engine(tmp_path, monkeypatch)
+    assert engine.synthesize("Hello there") == b"RIFFHello there"
+
+
+def test_cancel_kills_the_cli_process(tmp_path, monkeypatch):
+    engine = cli_engine(tmp_path, monkeypatch)
+    monkeypatch.setenv("FAKE_PIPER_SLEEP", "30")
+    token = CancelToken("req-1")
+    threading.Timer(0.2, token.cancel).start()
+    start_time = time.time()
+    assert engine.synthesize("Hello there", cancel=token) is None
+    assert time.time() - start_time < 10
+    assert token.reclaimed == {"tts_processes": 1}
+
+
+def test_split_sentences_merges_short_fragments():
+    assert split_sentences("Yes. It is ready now. Shall I start the washing machine?") == [
+        "Yes. It is ready now.", "Shall I start the washing machine?"]
+
+
+def test_long_sentences_are_split_at_clauses():
+    text = "First of all, this is a long sentence, it keeps going, and it ends here."
+    assert split_sentences(text, min_chars=5, max_chars=30) == [
+        "First of all,", "this is a long sentence,", "it keeps going,", "and it ends here."]
+
+
+def test_streamed_tokens_release_sentences_as_they_close():
+    sentence_buffer = SentenceBuffer(min_chars=10)
+    assert sentence_buffer.feed("The lights are") == []
+    assert sentence_buffer.feed(" now on. The door") == ["The lights are now on."]
+    assert sentence_buffer.feed(" is locked") == []
+    assert sentence_buffer.flush() == ["The door is locked"]
+    assert sentence_buffer.flush() == []
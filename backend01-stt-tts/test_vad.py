@@ -0,0 +1,46 @@
+"""Tests for voice activity detection"""
+import numpy as np
+
+from vad import VoiceActivityDetector, find_runs, merge_gaps
+
+RATE = 16000
+
+
+def tone(seconds, amplitude=8000):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.int16)
+
+
+def test_find_runs_and_merge_gaps():
+    starts, ends = find_runs(np.array([0, 1, 1, 0, 0, 1, 0, 1], dtype=bool))
+    assert starts.tolist() == [1, 5, 7] and ends.tolist() == [3, 6, 8]
+    starts, ends = merge_gaps(starts, ends, 2)
+    assert starts.tolist() == [1, 5] and ends.tolist() == [3, 8]
+
+
+def test_leading_and_trailing_silence_is_trimmed():
+    pcm = np.concatenate([silence(1.0), tone(1.0), silence(1.0)]).tobytes()
+    segments, stats = VoiceActivityDetector().segments(pcm, RATE)
+    assert len(segments) == 1
+    # One second of speech plus padding on both sides
+    assert 1000 <= stats["speech_ms"] <= 1400
+    assert stats["trimmed_ms"] == stats["input_ms"] - stats["speech_ms"]
+
+
+def test_short_pauses_stay_in_one_segment_and_long_clips_are_split():
+    pcm = np.concatenate([tone(1.0), silence(0.1), tone(1.0)]).tobytes()
+    assert len(VoiceActivityDetector().segments(pcm, RATE)[0]) == 1
+
+    pcm = np.concatenate([tone(1.0), silence(1.0), tone(1.0)]).tobytes()
+    segments, stats = VoiceActivityDetector(max_segment_s=1.5).segments(pcm, RATE)
+    assert len(segments) == 2 and stats["segments"] == 2
+
+
+def test_silence_has_no_segments():
+    segments, stats = VoiceActivityDetector().segments(silence(2.0).tobytes(), RATE)
+    assert segments == []
+    assert stats["trimmed_ms"] == 2000
@@ -0,0 +1,34 @@
+"""Tests for the Piper voice registry"""
+import time
+
+import pytest
+
+import tts_engine
+from voices import UnknownVoice, VoiceRegistry
+
+
+def test_failed_voice_is_retried_after_the_backoff(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_engine, "PIPER_PYTHON_AVAILABLE", False)
+    monkeypatch.setenv("PATH", str(tmp_path))  # no piper CLI either
+    model_path = tmp_path / "voice.onnx"
+    registry = VoiceRegistry(str(tmp_path), "voice", 1024, retry_after=0.1)
+    registry.add("voice", str(model_path), f"{model_path}.json")
+
+    # Still being copied: the voice files are not there yet
+    assert registry.get() is None
+    assert registry.stats()["failed"] == {"voice": "Piper TTS not available"}
+
+    (tmp_path / "piper").write_text("#!/bin/sh\nexit 0\n")
+    (tmp_path / "piper").chmod(0o755)
+    model_path.write_bytes(b"")
+    (tmp_path / "voice.onnx.json").write_text("{}")
+    assert registry.get() is None  # within the backoff
+    time.sleep(0.15)
+    assert registry.get() is not None
+    assert registry.stats()["failed"] == {}
+
+
+def test_unknown_voice():
+    registry = VoiceRegistry("/nonexistent", "voice", 1024)
+    with pytest.raises(UnknownVoice):
+        registry.get("other")
@@ -0,0 +1,163 @@
+"""Per-request cancellation tokens.
+
+Each request that does model work opens a token under its request id and an
+owner (the user or conversation session). Interruptible work, such as a
+subprocess, an upstream stream or a queued job, registers a callback that
+runs as soon as the token is cancelled. Loops check the token and stop at
+their next step. Work cut short is counted on the token, so a stop can
+report what it reclaimed.
+
+The services are deployed as separate images, so this module is copied into
+both and the copies must be kept identical.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Cancelled(Exception):
+    """The request was cancelled before this work finished"""
+
+
+class CancelToken:
+    """Cancellation state of one request"""
+
+    def __init__(self, request_id, owner=None):
+        self.request_id = request_id
+        self.owner = owner
+        self.started = time.time()
+        self.cancelled_at = None
+        self.reason = None
+        self.reclaimed = {}
+        self._event = threading.Event()
+        self._closed = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        """Cancel and run the registered callbacks; returns False if already cancelled"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.cancelled_at = time.time()
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"[WORKFLOW] Cancel callback for {self.request_id} failed: {e}")
+        return True
+
+    def on_cancel(self, callback):
+        """Run callback on cancellation (now, if already cancelled); returns an unregister function"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def check(self):
+        """Raise Cancelled if the request has been cancelled"""
+        if self._event.is_set():
+            raise Cancelled(f"Request {self.request_id} was cancelled")
+
+    def wait(self, timeout):
+        """Sleep up to timeout seconds; returns True early if cancelled"""
+        return self._event.wait(timeout)
+
+    def wait_closed(self, timeout):
+        """Wait up to timeout seconds for the request to finish; returns True if it did"""
+        return self._closed.wait(timeout)
+
+    def reclaim(self, kind, amount=1):
+        """Count work that the cancellation cut short"""
+        with self._lock:
+            self.reclaimed[kind] = self.reclaimed.get(kind, 0) + amount
+
+    def describe(self):
+        with self._lock:
+            return {
+                "request_id": self.request_id,
+                "owner": self.owner,
+                "elapsed_ms": round(((self.cancelled_at or time.time()) - self.started) * 1000),
+                "reclaimed": dict(self.reclaimed)
+            }
+
+    def _discard(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class CancellationRegistry:
+    """Tokens of in-flight requests by request id, with totals of reclaimed work"""
+
+    def __init__(self):
+        self._tokens = {}  # request_id -> CancelToken
+        self._lock = threading.Lock()
+        self.cancelled = 0
+        self.reclaimed = {}
+
+    def open(self, request_id, owner=None):
+        token = CancelToken(request_id, owner)
+        with self._lock:
+            self._tokens[request_id] = token
+        return token
+
+    def close(self, token):
+        """Forget a finished request; safe to call more than once"""
+        with self._lock:
+            if self._tokens.get(token.request_id) is not token:
+                return
+            del self._tokens[token.request_id]
+            if token.cancelled:
+                self.cancelled += 1
+                for kind, amount in token.describe()["reclaimed"].items():
+                    self.reclaimed[kind] = self.reclaimed.get(kind, 0) + amount
+        token._closed.set()
+
+    def find(self, request_ids=(), owner=None):
+        """Tokens of in-flight requests matching any of request_ids, or owned by owner"""
+        with self._lock:
+            return [token for token in self._tokens.values()
+                    if token.request_id in request_ids or (owner is not None and token.owner == owner)]
+
+    def cancel(self, request_ids=(), owner=None, reason="cancelled", wait=0.0):
+        """Cancel requests by id and/or owner and return their tokens
+
+        Tokens that were already cancelled are returned too. With wait > 0, up
+        to that many seconds are spent waiting for the requests to wind down,
+        so their reclaimed counts are final.
+        """
+        return self.cancel_tokens(self.find(request_ids, owner), reason, wait)
+
+    def cancel_tokens(self, tokens, reason="cancelled", wait=0.0):
+        """Cancel tokens found earlier with find(), even if they have finished since"""
+        for token in tokens:
+            token.cancel(reason)
+        deadline = time.time() + wait
+        for token in tokens:
+            token.wait_closed(max(0, deadline - time.time()))
+        return tokens
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._tokens), "cancelled": self.cancelled, "reclaimed": dict(self.reclaimed)}
+
+
+def total_reclaimed(tokens):
+    """Sum the reclaimed counts of several tokens"""
+    totals = {}
+    for token in tokens:
+        for kind, amount in token.describe()["reclaimed"].items():
+            totals[kind] = totals.get(kind, 0) + amount
+    return totals
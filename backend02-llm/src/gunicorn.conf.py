@@ -0,0 +1,25 @@
+"""Gunicorn settings for serving the LLM backend in production.
+
+    gunicorn -c gunicorn.conf.py server:app
+
+The request scheduler and conversation sessions live in process memory, so
+the default is one worker with many threads: every request then shares one
+in-flight limit and a user's follow-ups find their session.
+"""
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5002')
+workers = int(os.getenv('WEB_WORKERS', '1'))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '32'))
+preload_app = True
+# Generations can legitimately take as long as OLLAMA_READ_TIMEOUT
+timeout = int(os.getenv('WEB_TIMEOUT', '180'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+accesslog = '-'
+
+
+def worker_exit(server, worker):
+    import server as llm_server
+    llm_server.ollama_session.close()
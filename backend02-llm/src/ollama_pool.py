@@ -0,0 +1,189 @@
+"""Pool of Ollama hosts with least-outstanding-requests routing.
+
+Each generation goes to the healthy host with the fewest requests in flight.
+Hosts that already have the model loaded are preferred unless they are
+more than `affinity_slack` requests busier than the least busy host. This
+avoids paying a model load for a small gain in queueing. A background thread
+polls every host's /api/ps, which tells whether the host is up and which
+models it has loaded. A host is ejected after `eject_after` consecutive
+failed requests, or as many consecutive failed checks; a host that answers
+checks but fails generations is ejected too. It is re-admitted after
+`readmit_after` consecutive passing checks.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def model_key(name):
+    """Ollama treats "llama3.2" and "llama3.2:latest" as the same model"""
+    return name if not name or ":" in name else f"{name}:latest"
+
+
+class NoHostAvailable(Exception):
+    """Every Ollama host has been tried or ejected"""
+
+
+class OllamaHost:
+    """Routing state and counters of one Ollama server"""
+
+    def __init__(self, url, window=256):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.in_flight = 0
+        self.models = set()  # models loaded on the host, as of the last check or generation
+        self.failures = 0  # consecutive failed requests
+        self.check_failures = 0  # consecutive failed checks
+        self.passes = 0  # consecutive passing checks while ejected
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.last_error = None
+        self.last_check = None
+        self.first_token = deque(maxlen=window)  # seconds from request to first token
+
+    def describe(self):
+        samples = sorted(self.first_token)
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "models": sorted(self.models),
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+            "first_token_ms": {f"p{int(q * 100)}": round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000)
+                               for q in QUANTILES} if samples else {}
+        }
+
+
+class OllamaPool:
+    """Route generations over several Ollama hosts and track their health"""
+
+    def __init__(self, urls, session, check_interval=5.0, check_timeout=2.0, eject_after=3, readmit_after=2,
+                 affinity_slack=2):
+        self.hosts = [OllamaHost(url) for url in urls]
+        self.session = session
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.eject_after = eject_after
+        self.readmit_after = readmit_after
+        self.affinity_slack = affinity_slack
+        self._lock = threading.Lock()
+        self._started_pid = None
+
+    def _ensure_started(self):
+        # The checker thread does not survive fork, so each server worker starts its own
+        with self._lock:
+            if self._started_pid == os.getpid() or self.check_interval <= 0:
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._check_loop, name="ollama-health", daemon=True).start()
+
+    def acquire(self, model, exclude=()):
+        """Pick a host for a generation of model and count it in flight
+
+        Raises NoHostAvailable when every host is excluded. Ejected hosts are
+        only used when no healthy host is left, since trying one beats
+        failing the request outright.
+        """
+        self._ensure_started()
+        model = model_key(model)
+        with self._lock:
+            candidates = [host for host in self.hosts if host not in exclude]
+            if not candidates:
+                raise NoHostAvailable("No Ollama host left to try")
+            candidates = [host for host in candidates if host.healthy] or candidates
+            least = min(host.in_flight for host in candidates)
+            warm = [host for host in candidates if model in host.models
+                    and host.in_flight <= least + self.affinity_slack]
+            host = min(warm or candidates, key=lambda h: (h.in_flight, h.requests))
+            host.in_flight += 1
+            host.requests += 1
+            return host
+
+    def can_retry(self, exclude):
+        """True if a host not in exclude is left to retry on"""
+        with self._lock:
+            return any(host not in exclude for host in self.hosts)
+
+    def release(self, host, model, error=None, first_token=None):
+        """Return a host after a generation; error counts toward ejecting it"""
+        with self._lock:
+            host.in_flight -= 1
+            if first_token is not None:
+                host.first_token.append(first_token)
+            if error is None:
+                host.failures = 0
+                host.models.add(model_key(model))
+                return
+            host.errors += 1
+            host.failures += 1
+            self._record_failure(host, host.failures, error)
+
+    def check(self, host):
+        """Probe one host's /api/ps and update its health and loaded models"""
+        try:
+            response = self.session.get(f"{host.url}/api/ps", timeout=self.check_timeout)
+            if response.status_code == 404:
+                # Ollama before /api/ps: up, but loaded models are only known from our own traffic
+                models = None
+            else:
+                response.raise_for_status()
+                models = {model_key(model.get("name")) for model in response.json().get("models", [])}
+        except Exception as e:
+            with self._lock:
+                host.last_check = time.time()
+                host.check_failures += 1
+                self._record_failure(host, host.check_failures, e)
+            return
+        with self._lock:
+            host.last_check = time.time()
+            if models is not None:
+                host.models = models
+            host.check_failures = 0
+            if not host.healthy:
+                host.passes += 1
+                if host.passes >= self.readmit_after:
+                    host.healthy = True
+                    host.failures = 0
+                    logger.info(f"[WORKFLOW] Ollama host {host.url} re-admitted after {host.passes} passing checks")
+
+    def check_all(self):
+        for host in self.hosts:
+            self.check(host)
+
+    def _record_failure(self, host, consecutive, error):
+        host.passes = 0
+        host.last_error = str(error)
+        if host.healthy and consecutive >= self.eject_after:
+            host.healthy = False
+            host.ejections += 1
+            logger.warning(f"[WORKFLOW] Ollama host {host.url} ejected after {consecutive} failures: {error}")
+
+    def _check_loop(self):
+        while True:
+            self.check_all()
+            time.sleep(self.check_interval)
+
+    @property
+    def available(self):
+        with self._lock:
+            return any(host.healthy for host in self.hosts)
+
+    def stats(self):
+        self._ensure_started()
+        with self._lock:
+            return {
+                "healthy": sum(host.healthy for host in self.hosts),
+                "in_flight": sum(host.in_flight for host in self.hosts),
+                "hosts": [host.describe() for host in self.hosts]
+            }
@@ -0,0 +1,152 @@
+"""Admission-controlled priority scheduler for model requests.
+
+At most max_in_flight requests run against the model at once. Everything else
+waits in a bounded queue per priority class, and a free slot always goes to
+the highest class with work waiting (voice before text before batch). Waiters
+whose deadline passes are dropped instead of being sent to the model after
+their caller has already given up, and so are waiters whose request is
+cancelled.
+"""
+import threading
+import time
+from collections import deque
+
+from cancellation import Cancelled
+
+PRIORITIES = ("voice", "text", "batch")
+
+
+class SchedulerFull(Exception):
+    """The queue for this priority class is full"""
+
+
+class DeadlineExpired(Exception):
+    """The request's deadline passed while it was waiting for a slot"""
+
+
+class Ticket:
+    """One request's place in the scheduler"""
+
+    def __init__(self, priority, deadline):
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued = time.time()
+        self.started = None
+        self.released = False
+        self.dropped = False
+        self.cancelled = False
+        self._granted = threading.Event()
+
+    @property
+    def queue_wait(self):
+        """Seconds spent waiting for a slot"""
+        return (self.started or time.time()) - self.enqueued
+
+
+class PriorityScheduler:
+    """Bounded in-flight limit with strict-priority, per-class bounded queues"""
+
+    def __init__(self, max_in_flight, queue_limits):
+        self.max_in_flight = max_in_flight
+        self.queue_limits = dict(queue_limits)
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.admitted = {priority: 0 for priority in PRIORITIES}
+        self.rejected = {priority: 0 for priority in PRIORITIES}
+        self.expired = {priority: 0 for priority in PRIORITIES}
+        self.cancelled = {priority: 0 for priority in PRIORITIES}
+
+    def acquire(self, priority, deadline=None, cancel=None):
+        """Block until a slot is granted and return its Ticket
+
+        Raises SchedulerFull if the class queue is full, DeadlineExpired if
+        the deadline passes before a slot frees up, or Cancelled if the cancel
+        token fires while the request is still queued.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority}")
+        ticket = Ticket(priority, deadline)
+        with self._lock:
+            if len(self._queues[priority]) >= self.queue_limits.get(priority, 0):
+                self.rejected[priority] += 1
+                raise SchedulerFull(f"{priority} queue is full")
+            self._queues[priority].append(ticket)
+            self._dispatch()
+
+        timeout = None if deadline is None else max(0, deadline - time.time())
+        unregister = cancel.on_cancel(lambda: self._withdraw(ticket, cancel)) if cancel else None
+        try:
+            granted = ticket._granted.wait(timeout)
+        finally:
+            if unregister:
+                unregister()
+        if ticket.cancelled:
+            raise Cancelled(f"{priority} request cancelled after waiting {ticket.queue_wait:.2f}s")
+        if granted:
+            return ticket
+        with self._lock:
+            if ticket.started is not None:
+                # Granted between the wait timing out and taking the lock
+                return ticket
+            if not ticket.dropped:
+                self._queues[priority].remove(ticket)
+                self.expired[priority] += 1
+        raise DeadlineExpired(f"{priority} request waited {ticket.queue_wait:.2f}s and missed its deadline")
+
+    def release(self, ticket):
+        """Give a ticket's slot back; safe to call more than once"""
+        with self._lock:
+            if ticket.released or ticket.started is None:
+                return
+            ticket.released = True
+            self._in_flight -= 1
+            self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queued": {priority: len(queue) for priority, queue in self._queues.items()},
+                "queue_limits": dict(self.queue_limits),
+                "admitted": dict(self.admitted),
+                "rejected": dict(self.rejected),
+                "expired": dict(self.expired),
+                "cancelled": dict(self.cancelled)
+            }
+
+    def _withdraw(self, ticket, cancel):
+        # A cancelled waiter leaves the queue at once; a running one is stopped by its own loop
+        with self._lock:
+            if ticket.started is not None or ticket.dropped:
+                return
+            self._queues[ticket.priority].remove(ticket)
+            ticket.dropped = True
+            ticket.cancelled = True
+            self.cancelled[ticket.priority] += 1
+        cancel.reclaim("llm_queued")
+        ticket._granted.set()
+
+    def _dispatch(self):
+        # Called with the lock held: hand free slots to the highest class waiting
+        now = time.time()
+        while self._in_flight < self.max_in_flight:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            if ticket.deadline is not None and ticket.deadline <= now:
+                # The caller has timed out; its waiter will notice and give up
+                ticket.dropped = True
+                self.expired[ticket.priority] += 1
+                continue
+            ticket.started = now
+            self._in_flight += 1
+            self.admitted[ticket.priority] += 1
+            ticket._granted.set()
+
+    def _next_ticket(self):
+        for priority in PRIORITIES:
+            if self._queues[priority]:
+                return self._queues[priority].popleft()
+        return None
@@ -1,9 +1,21 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
 import time
+import json
+import random
 import logging
 
+import requests
+from requests.adapters import HTTPAdapter
+
+from response_cache import ResponseCache, is_deterministic
+from sessions import SessionStore
+from scheduler import PriorityScheduler, SchedulerFull, DeadlineExpired, PRIORITIES
+from cancellation import CancellationRegistry, Cancelled, total_reclaimed
+from metrics import LatencyMetrics, Trace, render_gauge
+from ollama_pool import OllamaPool
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,53 +24,363 @@ logger = logging.getLogger(__name__)
 USE_OLLAMA = os.getenv("USE_OLLAMA", "False").lower() == "true"
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:latest")
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Several inference servers, comma-separated; defaults to OLLAMA_HOST alone
+OLLAMA_HOSTS = [host.strip() for host in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if host.strip()]
+# Rate at which simulation mode emits fake tokens on /generate/stream
+SIMULATION_TOKENS_PER_SEC = float(os.getenv("SIMULATION_TOKENS_PER_SEC", "20"))
+SIMULATION_RESPONSE = "I got it"
+# Ollama calls: (connect, read) timeouts and keep-alive pool size
+OLLAMA_TIMEOUT = (float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3.05")), float(os.getenv("OLLAMA_READ_TIMEOUT", "120")))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+
+# Response cache: "auto" caches deterministic requests only, "force" caches
+# everything, "off" disables it; requests can still opt out with "cache": false.
+# With the default sampling (temperature 0.7, no seed) "auto" caches nothing,
+# and turns that continue a session are never cached
+RESPONSE_CACHE_MODE = os.getenv("RESPONSE_CACHE_MODE", "auto").lower()
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_MB", "16")) * 1024 * 1024,
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+)
+
+# Conversation sessions carrying Ollama's context between turns
+session_store = SessionStore(
+    max_context_tokens=int(os.getenv("SESSION_MAX_CONTEXT_TOKENS", "2048")),
+    idle_ttl=int(os.getenv("SESSION_IDLE_TTL", "1800")),
+    max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+)
+
+# Admission control toward the model: at most SCHEDULER_MAX_IN_FLIGHT
+# generations at once, queued per priority class (voice > text > batch)
+SCHEDULER_MAX_QUEUE_WAIT = float(os.getenv("SCHEDULER_MAX_QUEUE_WAIT", "30"))
+scheduler = PriorityScheduler(
+    max_in_flight=int(os.getenv("SCHEDULER_MAX_IN_FLIGHT", "2")),
+    queue_limits={
+        "voice": int(os.getenv("SCHEDULER_QUEUE_VOICE", "16")),
+        "text": int(os.getenv("SCHEDULER_QUEUE_TEXT", "32")),
+        "batch": int(os.getenv("SCHEDULER_QUEUE_BATCH", "64"))
+    }
+)
+
+# Cancellation tokens of in-flight generations, by request id and session;
+# POST /generate/cancel waits up to CANCEL_WAIT seconds for them to stop
+cancellations = CancellationRegistry()
+CANCEL_WAIT = float(os.getenv("CANCEL_WAIT", "1.0"))
+
+# One pooled keep-alive session for all Ollama traffic, with a connection pool per host
+ollama_session = requests.Session()
+ollama_session.mount("http://", HTTPAdapter(pool_connections=len(OLLAMA_HOSTS), pool_maxsize=OLLAMA_POOL_SIZE))
+ollama_session.mount("https://", HTTPAdapter(pool_connections=len(OLLAMA_HOSTS), pool_maxsize=OLLAMA_POOL_SIZE))
+
+# Generations go to the least busy healthy host, preferring hosts that have
+# the model loaded; hosts are health-checked every OLLAMA_CHECK_INTERVAL
+# seconds, ejected after OLLAMA_EJECT_AFTER consecutive failures and
+# re-admitted after OLLAMA_READMIT_AFTER passing checks. A request that fails
+# before its first token is retried on up to OLLAMA_RETRIES other hosts
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "2"))
+ollama_pool = OllamaPool(
+    OLLAMA_HOSTS,
+    ollama_session,
+    check_interval=float(os.getenv("OLLAMA_CHECK_INTERVAL", "5")),
+    check_timeout=float(os.getenv("OLLAMA_CHECK_TIMEOUT", "2")),
+    eject_after=int(os.getenv("OLLAMA_EJECT_AFTER", "3")),
+    readmit_after=int(os.getenv("OLLAMA_READMIT_AFTER", "2")),
+    affinity_slack=int(os.getenv("OLLAMA_AFFINITY_SLACK", "2"))
+)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-def generate_with_ollama(prompt, max_tokens=100):
-    """Generate text using Ollama API"""
+# Per-stage latency histograms fed by request traces, served on /metrics
+metrics = LatencyMetrics('sts_backend02')
+
+@app.before_request
+def start_trace():
+    # backend01 sends its request id so a voice turn can be followed end to end
+    g.trace = Trace(metrics, request.headers.get('X-Request-ID'))
+
+@app.after_request
+def finish_trace(response):
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['X-Request-ID'] = trace.request_id
+        if trace.spans:
+            logger.debug(f"[TRACE] {trace.request_id} {request.path} {trace.describe()}")
+    return response
+
+def generation_options(data):
+    """Ollama generation options for a request, with the server defaults"""
+    options = {
+        "num_predict": data.get('max_tokens', 100),
+        "temperature": data.get('temperature', 0.7),
+        "top_p": data.get('top_p', 0.9)
+    }
+    if data.get('seed') is not None:
+        options["seed"] = data['seed']
+    return options
+
+def ollama_headers(request_id):
+    """Forward the request id to Ollama so proxies in front of it can log it"""
+    return {"X-Request-ID": request_id} if request_id else {}
+
+def build_ollama_payload(prompt, options, stream=False, context=None):
+    """Build the Ollama /api/generate request payload"""
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "stream": stream,
+        "options": options
+    }
+    if context:
+        # Continue from the previous turn's KV state instead of re-prefilling it
+        payload["context"] = context
+    return payload
+
+def cache_key_for(prompt, options, data):
+    """Return the response cache key for a request, or None if it must not be cached"""
+    requested = data.get('cache', True)
+    if RESPONSE_CACHE_MODE == "off" or requested is False:
+        return None
+    forced = requested == "force" or RESPONSE_CACHE_MODE == "force"
+    # Sampling with temperature > 0 and no seed gives a different answer each time
+    if not forced and not is_deterministic(options):
+        return None
+    return ResponseCache.key(prompt, OLLAMA_MODEL if USE_OLLAMA else "simulation", options)
+
+def generate_with_ollama(prompt, options, context=None, request_id=None, cancel=None):
+    """Generate text using Ollama API; returns (response text, new context)
+
+    The reply is read as a stream even though it is returned whole, so a
+    cancelled request stops the generation instead of waiting for it.
+    """
     try:
-        import requests
-        
-        # Ollama API endpoint
-        url = f"{OLLAMA_HOST}/api/generate"
-        
-        # Request payload
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "num_predict": max_tokens,
-                "temperature": 0.7,
-                "top_p": 0.9
-            }
-        }
+        result = {}
+        tokens = list(stream_with_ollama(prompt, options, context, result, request_id, cancel))
+        if cancel is not None and cancel.cancelled:
+            record_cancelled_generation(cancel, options, len(tokens))
+        return "".join(tokens) or "No response generated", result.get("context")
         
-        # Make request to Ollama
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        
-        # Parse response
-        result = response.json()
-        return result.get("response", "No response generated")
-        
-    except ImportError:
-        logger.error("Requests library not available for Ollama integration")
-        return "Error: Requests library not available"
     except Exception as e:
         logger.error(f"Error generating with Ollama: {e}")
-        return f"Error: {str(e)}"
+        return f"Error: {str(e)}", None
+
+def stream_with_ollama(prompt, options, context=None, result=None, request_id=None, cancel=None):
+    """Yield response tokens from Ollama as they are generated
+
+    The new context from the final chunk is stored in result["context"].
+    Cancelling stops reading and closes the connection, which makes Ollama
+    abandon the generation. A host that fails before the first token is
+    retried on another host; once tokens have been sent, errors propagate.
+    """
+    payload = build_ollama_payload(prompt, options, stream=True, context=context)
+    tried = []
+    while True:
+        host = ollama_pool.acquire(OLLAMA_MODEL, exclude=tried)
+        tried.append(host)
+        progress = {"first_token": None}
+        error = None
+        try:
+            yield from stream_from_host(host.url, payload, result, request_id, cancel, progress)
+        except requests.HTTPError as e:
+            # A 4xx is about the request, not the host, so it is neither retried nor held against it
+            if e.response is not None and e.response.status_code < 500:
+                raise
+            error = e
+        except Exception as e:
+            error = e
+        finally:
+            ollama_pool.release(host, OLLAMA_MODEL, error, progress["first_token"])
+        if error is None:
+            return
+        retry = (progress["first_token"] is None and len(tried) <= OLLAMA_RETRIES
+                 and not (cancel is not None and cancel.cancelled) and ollama_pool.can_retry(tried))
+        if not retry:
+            raise error
+        logger.warning(f"[WORKFLOW] Ollama host {host.url} failed before the first token ({error}), "
+                       f"retrying on another host")
+
+def stream_from_host(host_url, payload, result, request_id, cancel, progress):
+    """Yield tokens of one /api/generate call; progress["first_token"] is set on the first"""
+    started = time.time()
+    with ollama_session.post(f"{host_url}/api/generate", json=payload, headers=ollama_headers(request_id),
+                             stream=True, timeout=OLLAMA_TIMEOUT) as response:
+        response.raise_for_status()
+        # Ollama streams one JSON object per line until "done" is set
+        for line in response.iter_lines():
+            if cancel is not None and cancel.cancelled:
+                break
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            if chunk.get("response"):
+                if progress["first_token"] is None:
+                    progress["first_token"] = time.time() - started
+                yield chunk["response"]
+            if chunk.get("done"):
+                if result is not None:
+                    result["context"] = chunk.get("context")
+                break
+
+def simulate_processing_delay(prompt, cancel=None):
+    """Sleep for a realistic simulated LLM processing time, or until cancelled"""
+    # Simulate more realistic LLM processing time based on prompt length
+    # This simulates that longer prompts take more time to process
+    base_delay = 0.3  # Base 300ms delay
+    prompt_length_factor = min(len(prompt) * 0.005, 0.7)  # Up to 700ms extra for very long prompts
+    processing_delay = base_delay + prompt_length_factor
+    
+    # Add some random variation to simulate real-world variance
+    variation = random.uniform(-0.1, 0.1)  # +/- 100ms variation
+    processing_delay = max(0.1, processing_delay + variation)  # Minimum 100ms
+    
+    if cancel is not None:
+        cancel.wait(processing_delay)
+    else:
+        time.sleep(processing_delay)
+
+def stream_simulated(prompt, cancel=None):
+    """Yield fake tokens at SIMULATION_TOKENS_PER_SEC after a simulated prefill"""
+    sleep = cancel.wait if cancel is not None else time.sleep
+    # Use roughly a third of the usual delay as time-to-first-token
+    sleep(0.1 + min(len(prompt) * 0.002, 0.3))
+    words = SIMULATION_RESPONSE.split(" ")
+    for index, word in enumerate(words):
+        if index > 0 and SIMULATION_TOKENS_PER_SEC > 0:
+            sleep(1.0 / SIMULATION_TOKENS_PER_SEC)
+        if cancel is not None and cancel.cancelled:
+            return
+        yield word if index == 0 else f" {word}"
+
+def record_cancelled_generation(cancel, options, tokens_generated):
+    """Count a generation stopped early, with the tokens it no longer has to produce"""
+    cancel.reclaim("llm_generations")
+    cancel.reclaim("llm_tokens_skipped", max(0, options.get("num_predict", 0) - tokens_generated))
+
+def simulated_context(context, prompt, response_text):
+    """Fake token state so session budgeting can be exercised without Ollama"""
+    return (context or []) + [0] * (len(prompt.split()) + len(response_text.split()))
+
+def resolve_session(data):
+    """Return the conversation session named in the request, if any"""
+    session_id = data.get('session_id')
+    if not session_id:
+        return None
+    if data.get('reset_session'):
+        session_store.reset(session_id)
+    return session_store.get(session_id)
+
+def request_deadline(data, start_time):
+    """Absolute time after which the caller no longer wants an answer"""
+    deadline_ms = data.get('deadline_ms')
+    return start_time + (deadline_ms / 1000 if deadline_ms else SCHEDULER_MAX_QUEUE_WAIT)
+
+def scheduler_error(e):
+    """HTTP response for a request the scheduler would not run"""
+    if isinstance(e, SchedulerFull):
+        logger.warning(f"[WORKFLOW] Rejected LLM request: {e}")
+        # "reason" tells clients this is load shedding, not an outage to retry through
+        response = jsonify({"error": f"LLM busy: {e}", "reason": "overloaded"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    logger.warning(f"[WORKFLOW] Dropped LLM request: {e}")
+    return jsonify({"error": str(e), "reason": "deadline_expired"}), 504
+
+def cancelled_response(cancel):
+    """HTTP response for a request cancelled before it produced an answer"""
+    logger.info(f"[WORKFLOW] Request {cancel.request_id} cancelled, reclaimed {cancel.describe()['reclaimed']}")
+    # 499 (client closed request) keeps cancellations apart from real failures
+    return jsonify({"error": "Request cancelled", "cancelled": True, **cancel.describe()}), 499
 
 @app.route('/')
 def index():
     return jsonify({
         "message": "LLM Backend Server Running",
         "use_ollama": USE_OLLAMA,
-        "ollama_model": OLLAMA_MODEL if USE_OLLAMA else None
+        "ollama_model": OLLAMA_MODEL if USE_OLLAMA else None,
+        "response_cache": RESPONSE_CACHE_MODE
     })
 
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    """Forget a conversation session and its context"""
+    return jsonify({"status": "success", "session_id": session_id, "existed": session_store.reset(session_id)})
+
+@app.route('/sessions/stats')
+def sessions_stats():
+    """Conversation session counts and limits"""
+    return jsonify(session_store.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage latency histograms and scheduler gauges in Prometheus text format"""
+    stats = scheduler.stats()
+    body = metrics.render()
+    body += render_gauge("sts_backend02_in_flight", "Generations running against the model", {"": stats["in_flight"]})
+    body += render_gauge("sts_backend02_queued", "Requests waiting for a generation slot",
+                         {f'priority="{priority}"': depth for priority, depth in stats["queued"].items()})
+    hosts = ollama_pool.stats()["hosts"] if USE_OLLAMA else []
+    body += render_gauge("sts_backend02_ollama_host_healthy", "1 while an Ollama host receives traffic",
+                         {f'host="{host["url"]}"': int(host["healthy"]) for host in hosts})
+    body += render_gauge("sts_backend02_ollama_host_in_flight", "Generations running on each Ollama host",
+                         {f'host="{host["url"]}"': host["in_flight"] for host in hosts})
+    body += render_gauge("sts_backend02_ollama_host_errors", "Failed generations and checks per Ollama host",
+                         {f'host="{host["url"]}"': host["errors"] for host in hosts})
+    body += render_gauge("sts_backend02_ollama_host_first_token_seconds", "Time to first token per Ollama host",
+                         {f'host="{host["url"]}",quantile="{quantile}"': ms / 1000
+                          for host in hosts for quantile, ms in host["first_token_ms"].items()})
+    body += render_gauge("sts_backend02_cancelled_work", "Work cut short by cancelled requests, by kind",
+                         {f'kind="{kind}"': amount for kind, amount in cancellations.stats()["reclaimed"].items()})
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/scheduler/stats')
+def scheduler_stats():
+    """In-flight generations and per-class queue depths"""
+    return jsonify(scheduler.stats())
+
+@app.route('/ollama/hosts')
+def ollama_hosts():
+    """Health, in-flight generations, loaded models and latency of each Ollama host"""
+    if not USE_OLLAMA:
+        return jsonify({"use_ollama": False, "hosts": []})
+    return jsonify({"use_ollama": True, "model": OLLAMA_MODEL, **ollama_pool.stats()})
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Response cache hit rate and memory usage"""
+    return jsonify({"mode": RESPONSE_CACHE_MODE, **response_cache.stats()})
+
+@app.route('/generate/cancel', methods=['POST'])
+def cancel_generation():
+    """Cancel in-flight generations by request id and/or session id
+
+    Queued requests leave the scheduler, running ones stop at their next
+    token and close the Ollama stream. The response lists what each
+    cancelled request had done and what it no longer has to do.
+    """
+    data = request.get_json() or {}
+    request_ids = data.get('request_ids') or []
+    session_id = data.get('session_id')
+    if not request_ids and not session_id:
+        return jsonify({"error": "request_ids or session_id is required"}), 400
+    
+    tokens = cancellations.cancel(request_ids, owner=session_id, reason=data.get('reason', 'cancelled'),
+                                  wait=CANCEL_WAIT)
+    logger.info(f"[API CALL] POST /generate/cancel - Cancelled {len(tokens)} generation(s)")
+    return jsonify({
+        "status": "success",
+        "cancelled": [token.describe() for token in tokens],
+        "reclaimed": total_reclaimed(tokens)
+    })
+
+@app.route('/cancellations/stats')
+def cancellation_stats():
+    """In-flight cancellable requests and totals of reclaimed work"""
+    return jsonify(cancellations.stats())
+
 @app.route('/generate', methods=['POST'])
 def generate_response():
     start_time = time.time()
@@ -66,70 +388,240 @@ def generate_response():
     try:
         data = request.get_json()
         prompt = data.get('prompt', '')
-        max_tokens = data.get('max_tokens', 100)
+        options = generation_options(data)
         
         if not prompt:
             return jsonify({"error": "Prompt is required"}), 400
+        priority = data.get('priority', 'text')
+        if priority not in PRIORITIES:
+            return jsonify({"error": f"priority must be one of {', '.join(PRIORITIES)}"}), 400
         
-        # Generate response using Ollama or simulation
-        if USE_OLLAMA:
-            response_text = generate_with_ollama(prompt, max_tokens)
-        else:
-            # Simulate more realistic LLM processing time based on prompt length
-            # This simulates that longer prompts take more time to process
-            base_delay = 0.3  # Base 300ms delay
-            prompt_length_factor = min(len(prompt) * 0.005, 0.7)  # Up to 700ms extra for very long prompts
-            processing_delay = base_delay + prompt_length_factor
-            
-            # Add some random variation to simulate real-world variance
-            import random
-            variation = random.uniform(-0.1, 0.1)  # +/- 100ms variation
-            processing_delay = max(0.1, processing_delay + variation)  # Minimum 100ms
-            
-            time.sleep(processing_delay)
+        session = resolve_session(data)
+        model_prompt, context = session_store.prepare(session, prompt) if session else (prompt, None)
+        
+        # Serve repeated prompts from the response cache; answers that depend
+        # on earlier turns are never cached
+        cache_key = cache_key_for(prompt, options, data) if model_prompt == prompt and not context else None
+        cached_text = response_cache.get(cache_key) if cache_key else None
+        if cached_text is not None:
+            if session:
+                session_store.record(session, prompt, cached_text, None)
+            return jsonify({
+                "response": cached_text,
+                "cached": True,
+                "session": session.describe() if session else None,
+                "latency": {
+                    "processing": round((time.time() - start_time) * 1000),
+                    "queue_wait": 0,
+                    "generation": 0
+                }
+            })
+        
+        # Wait for a generation slot; cache hits above never queue
+        cancel = cancellations.open(g.trace.request_id, session.id if session else None)
+        try:
+            try:
+                ticket = scheduler.acquire(priority, request_deadline(data, start_time), cancel)
+            except (SchedulerFull, DeadlineExpired) as e:
+                return scheduler_error(e)
+            except Cancelled:
+                return cancelled_response(cancel)
             
-            # Simple response for testing
-            response_text = "I got it"
+            # Generate response using Ollama or simulation
+            try:
+                if USE_OLLAMA:
+                    response_text, new_context = generate_with_ollama(model_prompt, options, context,
+                                                                      g.trace.request_id, cancel)
+                else:
+                    simulate_processing_delay(model_prompt, cancel)
+                    if cancel.cancelled:
+                        record_cancelled_generation(cancel, options, 0)
+                    
+                    # Simple response for testing
+                    response_text = SIMULATION_RESPONSE
+                    new_context = simulated_context(context, model_prompt, response_text)
+            finally:
+                scheduler.release(ticket)
+            if cancel.cancelled:
+                # A partial answer is neither cached nor remembered
+                return cancelled_response(cancel)
+        finally:
+            cancellations.close(cancel)
+        generation_time = time.time() - ticket.started
+        g.trace.record("llm_queue", ticket.queue_wait)
+        g.trace.record("llm_generation", generation_time)
+        
+        # Errors come back as "Error: ..." text and must not be cached or remembered
+        if not response_text.startswith("Error:"):
+            if cache_key:
+                response_cache.put(cache_key, response_text)
+            if session:
+                session_store.record(session, prompt, response_text, new_context)
         
         # Calculate processing time
         processing_time = time.time() - start_time
+        g.trace.record("generate_total", processing_time)
         
         return jsonify({
             "response": response_text,
+            "cached": False,
+            "session": session.describe() if session else None,
             "latency": {
-                "processing": round(processing_time * 1000)  # Convert to milliseconds
+                "processing": round(processing_time * 1000),  # Convert to milliseconds
+                "queue_wait": round(ticket.queue_wait * 1000),
+                "generation": round(generation_time * 1000)
             }
         })
     except Exception as e:
         logger.error(f"Error in generate_response: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/generate/stream', methods=['POST'])
+def generate_stream():
+    """Stream generated tokens as newline-delimited JSON"""
+    start_time = time.time()
+    data = request.get_json() or {}
+    prompt = data.get('prompt', '')
+    options = generation_options(data)
+    
+    if not prompt:
+        return jsonify({"error": "Prompt is required"}), 400
+    priority = data.get('priority', 'text')
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"priority must be one of {', '.join(PRIORITIES)}"}), 400
+    
+    session = resolve_session(data)
+    model_prompt, context = session_store.prepare(session, prompt) if session else (prompt, None)
+    cache_key = cache_key_for(prompt, options, data) if model_prompt == prompt and not context else None
+    cached_text = response_cache.get(cache_key) if cache_key else None
+    
+    if cached_text is not None:
+        if session:
+            session_store.record(session, prompt, cached_text, None)
+        
+        def replay():
+            # A cache hit is relayed as a single token
+            processing = round((time.time() - start_time) * 1000)
+            yield json.dumps({"type": "token", "token": cached_text}) + "\n"
+            yield json.dumps({
+                "type": "done",
+                "response": cached_text,
+                "tokens": 1,
+                "cached": True,
+                "session": session.describe() if session else None,
+                "latency": {"processing": processing, "first_token": processing, "tokens_per_sec": 0,
+                            "queue_wait": 0, "generation": 0}
+            }) + "\n"
+        
+        return Response(stream_with_context(replay()), mimetype='application/x-ndjson')
+    
+    # Queue before the response starts so overload is still a plain 503/504
+    cancel = cancellations.open(g.trace.request_id, session.id if session else None)
+    try:
+        ticket = scheduler.acquire(priority, request_deadline(data, start_time), cancel)
+    except (SchedulerFull, DeadlineExpired) as e:
+        cancellations.close(cancel)
+        return scheduler_error(e)
+    except Cancelled:
+        cancellations.close(cancel)
+        return cancelled_response(cancel)
+    
+    trace = g.trace
+    
+    def generate():
+        tokens = []
+        first_token_time = None
+        ollama_result = {}
+        try:
+            if USE_OLLAMA:
+                token_stream = stream_with_ollama(model_prompt, options, context, ollama_result, trace.request_id,
+                                                  cancel)
+            else:
+                token_stream = stream_simulated(model_prompt, cancel)
+            for token in token_stream:
+                if first_token_time is None:
+                    first_token_time = time.time()
+                tokens.append(token)
+                yield json.dumps({"type": "token", "token": token}) + "\n"
+            if cancel.cancelled:
+                record_cancelled_generation(cancel, options, len(tokens))
+                logger.info(f"[WORKFLOW] Stream {cancel.request_id} cancelled after {len(tokens)} tokens")
+                yield json.dumps({"type": "cancelled", "response": "".join(tokens), **cancel.describe()}) + "\n"
+                return
+        except GeneratorExit:
+            # The caller went away mid-stream; stop generating for nobody
+            if cancel.cancel("disconnected"):
+                record_cancelled_generation(cancel, options, len(tokens))
+            raise
+        except Exception as e:
+            logger.error(f"Error in generate_stream: {e}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+            return
+        finally:
+            scheduler.release(ticket)
+            cancellations.close(cancel)
+        
+        end_time = time.time()
+        first_token_time = first_token_time or end_time
+        trace.record("llm_queue", ticket.queue_wait)
+        trace.record("llm_first_token", first_token_time - ticket.started)
+        trace.record("llm_generation", end_time - ticket.started)
+        trace.record("generate_stream_total", end_time - start_time)
+        generation_time = end_time - first_token_time
+        # The first token marks the end of prefill, so it is excluded from the decode rate
+        tokens_per_sec = (len(tokens) - 1) / generation_time if generation_time > 0 else 0
+        
+        response_text = "".join(tokens)
+        if cache_key:
+            response_cache.put(cache_key, response_text)
+        if session:
+            new_context = ollama_result.get("context") if USE_OLLAMA else simulated_context(context, model_prompt, response_text)
+            session_store.record(session, prompt, response_text, new_context)
+        
+        yield json.dumps({
+            "type": "done",
+            "response": response_text,
+            "tokens": len(tokens),
+            "cached": False,
+            "session": session.describe() if session else None,
+            "latency": {
+                "processing": round((end_time - start_time) * 1000),
+                "first_token": round((first_token_time - start_time) * 1000),
+                "tokens_per_sec": round(tokens_per_sec, 2),
+                "queue_wait": round(ticket.queue_wait * 1000),
+                "generation": round((end_time - ticket.started) * 1000)
+            }
+        }) + "\n"
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Also frees the slot if the client disconnects before the stream is read
+    response.call_on_close(lambda: (scheduler.release(ticket), cancellations.close(cancel)))
+    return response
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
     if USE_OLLAMA:
-        try:
-            import requests
-            # Check if Ollama is running
-            response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
-            ollama_status = "available" if response.status_code == 200 else "unavailable"
-        except:
-            ollama_status = "unavailable"
+        # Reported from the pool's background checks instead of probing on every call
+        pool_stats = ollama_pool.stats()
+        ollama_status = "available" if pool_stats["healthy"] else "unavailable"
     else:
         ollama_status = "not enabled"
     
     return jsonify({
         "status": "healthy",
         "use_ollama": USE_OLLAMA,
-        "ollama_status": ollama_status
+        "ollama_status": ollama_status,
+        "ollama_hosts": {"healthy": pool_stats["healthy"], "total": len(ollama_pool.hosts)} if USE_OLLAMA else None
     })
 
 if __name__ == '__main__':
     logger.info("Starting LLM Backend Server")
     if USE_OLLAMA:
         logger.info(f"Using Ollama with model: {OLLAMA_MODEL}")
-        logger.info(f"Ollama host: {OLLAMA_HOST}")
+        logger.info(f"Ollama hosts: {', '.join(OLLAMA_HOSTS)}")
     else:
         logger.info("Running in simulation mode")
     
-    app.run(host='0.0.0.0', port=5002, debug=True)
\ No newline at end of file
+    # Development server only; production serving goes through gunicorn.conf.py
+    app.run(host='0.0.0.0', port=5002, debug=True, use_reloader=os.getenv('FLASK_RELOAD', 'false').lower() == 'true')
\ No newline at end of file
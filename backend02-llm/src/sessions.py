@@ -0,0 +1,112 @@
+"""Per-user conversation sessions that carry Ollama's KV context between turns.
+
+Ollama returns the conversation's token state as `context`; sending it back
+with the next prompt lets the model continue without re-prefilling earlier
+turns, so a follow-up only pays for its own tokens. When there is no usable
+context (it outgrew the token budget, or the previous answer came from the
+response cache) the next turn is seeded with a short text recap of the
+latest turns instead.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ConversationSession:
+    """Token state and recent turns of one user's conversation"""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.context = None
+        self.turns = []  # (prompt, response) pairs kept for recaps
+        self.truncations = 0
+        self.last_used = time.time()
+
+    @property
+    def context_tokens(self):
+        return len(self.context) if self.context else 0
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "turns": len(self.turns),
+            "context_tokens": self.context_tokens,
+            "truncations": self.truncations
+        }
+
+
+class SessionStore:
+    """Bounded store of conversation sessions with idle eviction"""
+
+    def __init__(self, max_context_tokens=2048, idle_ttl=1800, max_sessions=1000,
+                 recap_turns=3, recap_chars=600):
+        self.max_context_tokens = max_context_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.recap_turns = recap_turns
+        self.recap_chars = recap_chars
+        self._sessions = OrderedDict()  # id -> ConversationSession, least recently used first
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, session_id):
+        """Return the session for session_id, creating it if needed"""
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+                session = ConversationSession(session_id)
+                self._sessions[session_id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def prepare(self, session, prompt):
+        """Return (prompt, context) to send to the model for the next turn"""
+        with self._lock:
+            if session.turns and not session.context:
+                # No token state to continue from; re-prefill only a short recap
+                prompt = f"Conversation so far:\n{self._recap(session.turns)}\n\nUser: {prompt}"
+            return prompt, session.context
+
+    def record(self, session, prompt, response, context):
+        """Store the turn and the model's new context, enforcing the token budget"""
+        with self._lock:
+            session.turns = (session.turns + [(prompt, response)])[-self.recap_turns:]
+            session.context = context
+            if context and len(context) > self.max_context_tokens:
+                session.context = None
+                session.truncations += 1
+            session.last_used = time.time()
+
+    def reset(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_context_tokens": self.max_context_tokens,
+                "idle_ttl": self.idle_ttl,
+                "evicted": self.evicted
+            }
+
+    def _recap(self, turns):
+        recap = "\n".join(f"User: {prompt}\nAssistant: {response}" for prompt, response in turns)
+        # Keep the most recent part if the recap itself is too long
+        return recap[-self.recap_chars:]
+
+    def _evict(self, now):
+        # Least recently used sessions sit at the front of the OrderedDict
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used < self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
@@ -0,0 +1,86 @@
+"""Tests for Ollama host routing and health tracking"""
+import pytest
+
+from ollama_pool import NoHostAvailable, OllamaPool, model_key
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"status {self.status_code}")
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Answers /api/ps with a fixed response per host URL"""
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def get(self, url, timeout=None):
+        response = self.responses[url.rsplit("/api/ps", 1)[0]]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def make_pool(session=None, **kwargs):
+    # check_interval=0 keeps the background checker from starting
+    return OllamaPool(["http://a", "http://b"], session, check_interval=0, **kwargs)
+
+
+def test_model_key():
+    assert model_key("llama3.2") == "llama3.2:latest"
+    assert model_key("llama3.2:1b") == "llama3.2:1b"
+
+
+def test_routes_to_least_busy_host_unless_another_has_the_model():
+    pool = make_pool(affinity_slack=1)
+    a, b = pool.hosts
+    assert pool.acquire("llama3.2") is a
+    assert pool.acquire("llama3.2") is b
+
+    pool.release(b, "llama3.2")
+    # b has the model loaded; a is idle but only one request less busy
+    pool.release(a, "mistral")
+    b.in_flight = 1
+    assert pool.acquire("llama3.2:latest") is b
+    # Beyond the slack the cold host wins
+    b.in_flight = 3
+    assert pool.acquire("llama3.2") is a
+
+
+def test_exclude_and_no_host_left():
+    pool = make_pool()
+    a, b = pool.hosts
+    assert pool.acquire("m", exclude=(a,)) is b
+    assert not pool.can_retry((a, b))
+    with pytest.raises(NoHostAvailable):
+        pool.acquire("m", exclude=(a, b))
+
+
+def test_failing_host_is_ejected_and_readmitted_by_checks():
+    session = FakeSession({"http://a": FakeResponse(200, {"models": [{"name": "llama3.2:latest"}]}),
+                           "http://b": ConnectionError("refused")})
+    pool = make_pool(session, eject_after=2, readmit_after=2)
+    a, b = pool.hosts
+
+    for _ in range(2):
+        host = pool.acquire("m", exclude=(a,))
+        pool.release(host, "m", error=RuntimeError("boom"))
+    assert not b.healthy and b.ejections == 1
+    assert pool.acquire("m") is a
+
+    session.responses["http://b"] = FakeResponse(200, {"models": [{"name": "mistral"}]})
+    pool.check_all()
+    assert not b.healthy
+    pool.check_all()
+    assert b.healthy
+    assert b.models == {"mistral:latest"}
+    assert a.models == {"llama3.2:latest"}
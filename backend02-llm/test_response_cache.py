@@ -0,0 +1,59 @@
+"""Tests for the prompt/response cache"""
+from response_cache import ResponseCache, is_deterministic
+
+
+def test_key_ignores_case_and_whitespace_but_not_options():
+    options = {"temperature": 0, "num_predict": 64}
+    key = ResponseCache.key("  Turn on   the LIGHTS ", "llama3.2", options)
+    assert key == ResponseCache.key("turn on the lights", "llama3.2", options)
+    assert key != ResponseCache.key("turn on the lights", "llama3.2", {**options, "num_predict": 128})
+    assert key != ResponseCache.key("turn on the lights", "llama3.2:8b", options)
+
+
+def test_deterministic_options():
+    assert is_deterministic({"temperature": 0})
+    assert is_deterministic({"temperature": 0.7, "seed": 42})
+    assert not is_deterministic({"temperature": 0.7})
+
+
+def test_lru_eviction_by_entry_count():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "first")
+    cache.put("b", "second")
+    assert cache.get("a") == "first"
+    cache.put("c", "third")
+    assert cache.get("b") is None
+    assert cache.get("a") == "first"
+    assert cache.get("c") == "third"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget_and_ttl():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", "x" * 20)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+
+    expired = ResponseCache(ttl=0)
+    expired.put("a", "answer")
+    assert expired.get("a") is None
+    assert expired.stats()["entries"] == 0
+
+
+def test_server_caches_only_deterministic_session_less_prompts():
+    import server
+    client = server.app.test_client()
+
+    def generate(**fields):
+        response = client.post('/generate', json={"prompt": "What time is it?", **fields})
+        assert response.status_code == 200
+        return response.get_json()["cached"]
+
+    # Default sampling (temperature 0.7, no seed) is never cached in auto mode
+    assert not generate()
+    assert not generate()
+    assert not generate(temperature=0)
+    assert generate(temperature=0)
+    # A session's first turn has no context yet; later turns depend on it
+    assert generate(temperature=0, session_id="alice")
+    assert not generate(temperature=0, session_id="alice")
@@ -0,0 +1,86 @@
+"""Tests for the priority scheduler"""
+import threading
+import time
+
+import pytest
+
+from cancellation import CancelToken, Cancelled
+from scheduler import DeadlineExpired, PriorityScheduler, SchedulerFull
+
+LIMITS = {"voice": 4, "text": 4, "batch": 4}
+
+
+def wait_queued(scheduler, count):
+    deadline = time.time() + 2
+    while sum(scheduler.stats()["queued"].values()) < count:
+        assert time.time() < deadline, "waiters never queued"
+        time.sleep(0.01)
+
+
+def test_free_slot_goes_to_highest_priority():
+    scheduler = PriorityScheduler(1, LIMITS)
+    running = scheduler.acquire("text")
+    order = []
+
+    def waiter(priority):
+        ticket = scheduler.acquire(priority)
+        order.append(priority)
+        scheduler.release(ticket)
+
+    threads = [threading.Thread(target=waiter, args=("batch",))]
+    threads[0].start()
+    wait_queued(scheduler, 1)
+    threads.append(threading.Thread(target=waiter, args=("voice",)))
+    threads[1].start()
+    wait_queued(scheduler, 2)
+
+    scheduler.release(running)
+    for thread in threads:
+        thread.join(2)
+    assert order == ["voice", "batch"]
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_full_queue_is_rejected():
+    scheduler = PriorityScheduler(1, {"voice": 0, "text": 1, "batch": 1})
+    with pytest.raises(SchedulerFull):
+        scheduler.acquire("voice")
+    assert scheduler.stats()["rejected"]["voice"] == 1
+
+
+def test_waiter_past_its_deadline_is_dropped():
+    scheduler = PriorityScheduler(1, LIMITS)
+    running = scheduler.acquire("voice")
+    with pytest.raises(DeadlineExpired):
+        scheduler.acquire("text", deadline=time.time() + 0.05)
+    stats = scheduler.stats()
+    assert stats["expired"]["text"] == 1
+    assert stats["queued"]["text"] == 0
+
+    # Releasing does not hand the slot to the expired waiter
+    scheduler.release(running)
+    scheduler.release(running)
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = PriorityScheduler(1, LIMITS)
+    scheduler.acquire("voice")
+    token = CancelToken("req-1")
+    errors = []
+
+    def waiter():
+        try:
+            scheduler.acquire("text", cancel=token)
+        except Cancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    wait_queued(scheduler, 1)
+    token.cancel()
+    thread.join(2)
+    assert len(errors) == 1
+    assert token.reclaimed == {"llm_queued": 1}
+    assert scheduler.stats()["queued"]["text"] == 0
+    assert scheduler.stats()["cancelled"]["text"] == 1
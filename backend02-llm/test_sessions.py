@@ -0,0 +1,37 @@
+"""Tests for conversation sessions"""
+from sessions import SessionStore
+
+
+def test_context_is_carried_between_turns():
+    store = SessionStore()
+    session = store.get("alice")
+    assert store.prepare(session, "hello") == ("hello", None)
+
+    store.record(session, "hello", "Hi there", [1, 2, 3])
+    assert store.prepare(session, "and then?") == ("and then?", [1, 2, 3])
+    assert session.describe()["context_tokens"] == 3
+
+
+def test_context_over_budget_falls_back_to_a_recap():
+    store = SessionStore(max_context_tokens=4)
+    session = store.get("alice")
+    store.record(session, "what time is it", "Noon", list(range(10)))
+    assert session.context is None
+    assert session.truncations == 1
+
+    prompt, context = store.prepare(session, "and tomorrow?")
+    assert context is None
+    assert "User: what time is it\nAssistant: Noon" in prompt
+    assert prompt.endswith("User: and tomorrow?")
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(max_sessions=2)
+    first = store.get("a")
+    store.get("b")
+    assert store.get("a") is first
+    store.get("c")
+    assert store.stats()["evicted"] == 1
+    assert store.get("a") is first
+    assert not store.reset("b")
+    assert store.reset("a")
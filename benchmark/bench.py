@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+Load test and benchmark for the STS/TTT pipeline
+
+Drives /chat/text, /chat/voice and /chat/voice/stream on backend01 at a fixed
+concurrency (closed loop) or arrival rate (open loop) and reports requests/sec,
+client latency percentiles, per-stage p50/p99 from each response's trace spans
+and the memory of the backend processes. Results are saved as JSON so runs can
+be compared between commits.
+
+By default the whole stack runs locally and offline: backend02 in front of a
+fake Ollama server (or in its own simulation mode), backend01 with a fake
+Piper CLI (or a real voice via --piper-model), both under gunicorn as in
+production, fed with the synthetic speech corpus.
+
+Examples:
+    python3 benchmark/bench.py --concurrency 8 --duration 30
+    python3 benchmark/bench.py --rate 5 --mix text=1,voice=2 --vosk-model /models/vosk-small
+    python3 benchmark/bench.py --target http://localhost:5001 --duration 60
+    python3 benchmark/bench.py --compare benchmark/results/old.json benchmark/results/new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from corpus import load_corpus
+from fake_ollama import start_fake_ollama
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BACKEND01_SRC = os.path.join(REPO_DIR, "backend01-stt-tts", "src")
+BACKEND02_SRC = os.path.join(REPO_DIR, "backend02-llm", "src")
+ENDPOINTS = ("text", "voice", "voice_stream")
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values (q in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def process_tree(pid):
+    """pid and all of its descendants, from /proc"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def process_memory(pid):
+    """Memory of a process in bytes: PSS when available (counts shared pages once), else RSS"""
+    for path, field in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return 0
+
+
+class MemorySampler:
+    """Samples the memory of each service's process tree on a background thread"""
+
+    def __init__(self, pids, interval=0.5):
+        self.pids = pids  # service name -> root pid
+        self.interval = interval
+        self.peak = {name: 0 for name in pids}
+        self.last = {name: 0 for name in pids}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def start(self):
+        if self.pids and os.path.isdir("/proc"):
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return {name: {"peak_mb": round(self.peak[name] / 2**20, 1), "last_mb": round(self.last[name] / 2**20, 1)}
+                for name in self.pids}
+
+    def _run(self):
+        while not self._stop.is_set():
+            for name, pid in self.pids.items():
+                total = sum(process_memory(child) for child in process_tree(pid))
+                self.last[name] = total
+                self.peak[name] = max(self.peak[name], total)
+            self._stop.wait(self.interval)
+
+
+class LocalStack:
+    """Fake Ollama, backend02 and backend01 started for the duration of a run"""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = {}
+        self.ollama = []
+        self.temp_dir = tempfile.mkdtemp(prefix="sts-bench-")
+        self.backend01_url = f"http://127.0.0.1:{args.backend01_port}"
+        self.backend02_url = f"http://127.0.0.1:{args.backend02_port}"
+
+    def start(self):
+        args = self.args
+        backend02_env = {"USE_OLLAMA": "false"}
+        if args.llm == "fake-ollama":
+            self.ollama = [start_fake_ollama(prefill=args.ollama_prefill, tokens_per_sec=args.ollama_tokens_per_sec,
+                                             tokens=args.ollama_tokens, fail_rate=args.ollama_fail_rate)
+                           for _ in range(args.ollama_hosts)]
+            hosts = ",".join(f"http://127.0.0.1:{server.server_port}" for server in self.ollama)
+            backend02_env = {"USE_OLLAMA": "true", "OLLAMA_HOSTS": hosts}
+        self._spawn("backend02", BACKEND02_SRC, "server:app", args.backend02_port, backend02_env)
+
+        backend01_env = {
+            "LLM_BACKEND_URL": self.backend02_url,
+            "TTS_CACHE_DIR": os.path.join(self.temp_dir, "tts_cache"),
+            "HISTORY_BACKEND": "memory"
+        }
+        if args.piper_model:
+            backend01_env.update({"PIPER_MODEL_PATH": args.piper_model,
+                                  "PIPER_MODEL_CONFIG": f"{args.piper_model}.json"})
+        elif not args.no_tts:
+            # Placeholder model files so backend01 falls back to the fake `piper` CLI on PATH
+            model_path = os.path.join(self.temp_dir, "fake-voice.onnx")
+            for path in (model_path, f"{model_path}.json"):
+                open(path, "w").close()
+            backend01_env.update({"PIPER_MODEL_PATH": model_path, "PIPER_MODEL_CONFIG": f"{model_path}.json",
+                                  "PATH": os.path.join(BENCH_DIR, "fake_piper") + os.pathsep + os.environ["PATH"],
+                                  "FAKE_PIPER_RTF": str(args.fake_piper_rtf)})
+        else:
+            backend01_env.update({"PIPER_MODEL_PATH": os.path.join(self.temp_dir, "missing.onnx")})
+        if args.vosk_model:
+            backend01_env["VOSK_MODEL_PATH"] = args.vosk_model
+        else:
+            # Placeholder transcriptions, so voice requests measure everything but Vosk
+            backend01_env["STT_SIMULATION"] = "true"
+        self._spawn("backend01", BACKEND01_SRC, "app:app", args.backend01_port, backend01_env)
+
+        wait_for(f"{self.backend02_url}/health", args.startup_timeout)
+        wait_for(f"{self.backend01_url}/health", args.startup_timeout)
+        return self
+
+    def pids(self):
+        return {name: process.pid for name, process in self.processes.items()}
+
+    def stop(self):
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for server in self.ollama:
+            server.shutdown()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _spawn(self, name, cwd, app, port, extra_env):
+        env = {**os.environ, "WEB_WORKERS": str(self.args.workers), **extra_env}
+        log = open(os.path.join(self.temp_dir, f"{name}.log"), "w")
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                   "--bind", f"127.0.0.1:{port}", "--access-logfile", "/dev/null", app]
+        self.processes[name] = subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    def log_tail(self, name, lines=20):
+        with open(os.path.join(self.temp_dir, f"{name}.log")) as f:
+            return "".join(f.readlines()[-lines:])
+
+
+def wait_for(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}, expected one of {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class LoadGenerator:
+    """Issues requests against backend01 and collects one record per request"""
+
+    def __init__(self, base_url, corpus, mix, seed=0):
+        self.base_url = base_url
+        self.corpus = corpus
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.rng = random.Random(seed)
+        self.records = []
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._local = threading.local()
+
+    def next_request(self):
+        with self._lock:
+            index = self._counter
+            self._counter += 1
+            endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+        return endpoint, self.corpus[index % len(self.corpus)], f"bench-{index % 64}"
+
+    def run_one(self, endpoint, utterance, user_id, scheduled=None):
+        """Send one request; latency counts from `scheduled` so queueing in the client is not hidden"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        start = scheduled or time.time()
+        record = {"endpoint": endpoint, "start": start, "status": None, "error": None, "spans": {}}
+        text, audio, filename = utterance
+        try:
+            if endpoint == "text":
+                response = session.post(f"{self.base_url}/chat/text", json={"message": text, "user_id": user_id},
+                                        timeout=120)
+                record["status"] = response.status_code
+                record["spans"] = response.json().get("latency", {}).get("spans", {})
+            elif endpoint == "voice":
+                response = session.post(f"{self.base_url}/chat/voice", data={"user_id": user_id},
+                                        files={"audio": (filename, audio, "audio/wav")}, timeout=120)
+                record["status"] = response.status_code
+                record["spans"] = response.json().get("latency", {}).get("spans", {})
+            else:
+                record.update(self._run_stream(session, audio, filename, user_id, start))
+        except (requests.RequestException, ValueError) as e:
+            record["error"] = str(e)
+        record["latency"] = time.time() - start
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def _run_stream(self, session, audio, filename, user_id, start):
+        result = {"spans": {}}
+        with session.post(f"{self.base_url}/chat/voice/stream", data={"user_id": user_id},
+                          files={"audio": (filename, audio, "audio/wav")}, stream=True, timeout=120) as response:
+            result["status"] = response.status_code
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "audio" and "first_audio" not in result:
+                    result["first_audio"] = time.time() - start
+                elif event.get("type") == "error":
+                    result["error"] = event.get("error")
+                elif event.get("type") == "done":
+                    result["spans"] = event.get("latency", {}).get("spans", {})
+        return result
+
+    def closed_loop(self, concurrency, deadline, max_requests):
+        def worker():
+            while time.time() < deadline and (max_requests is None or self._counter < max_requests):
+                self.run_one(*self.next_request())
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def open_loop(self, rate, concurrency, deadline, max_requests):
+        # Poisson arrivals; each request's clock starts at its scheduled time
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            next_time = time.time()
+            while next_time < deadline and (max_requests is None or self._counter < max_requests):
+                time.sleep(max(0, next_time - time.time()))
+                pool.submit(self.run_one, *self.next_request(), scheduled=next_time)
+                next_time += self.rng.expovariate(rate)
+
+
+def summarize(records, duration):
+    endpoints = {}
+    for name in sorted({r["endpoint"] for r in records}):
+        rows = [r for r in records if r["endpoint"] == name]
+        ok = [r for r in rows if r["status"] == 200 and not r["error"]]
+        latencies = [r["latency"] * 1000 for r in ok]
+        summary = {
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            "throughput": round(len(ok) / duration, 2) if duration else 0,
+            "p50_ms": round(percentile(latencies, 50) or 0),
+            "p95_ms": round(percentile(latencies, 95) or 0),
+            "p99_ms": round(percentile(latencies, 99) or 0)
+        }
+        first_audio = [r["first_audio"] * 1000 for r in ok if "first_audio" in r]
+        if first_audio:
+            summary["first_audio_p50_ms"] = round(percentile(first_audio, 50))
+            summary["first_audio_p99_ms"] = round(percentile(first_audio, 99))
+        statuses = {}
+        for r in rows:
+            key = str(r["status"]) if not r["error"] else "error"
+            statuses[key] = statuses.get(key, 0) + 1
+        summary["statuses"] = statuses
+        endpoints[name] = summary
+
+    stage_values = {}
+    for r in records:
+        for stage, ms in r["spans"].items():
+            stage_values.setdefault(stage, []).append(ms)
+    stages = {stage: {"count": len(values), "p50_ms": percentile(values, 50), "p99_ms": percentile(values, 99)}
+              for stage, values in sorted(stage_values.items())}
+
+    ok_total = sum(e["requests"] - e["errors"] for e in endpoints.values())
+    return {
+        "duration_s": round(duration, 2),
+        "requests": len(records),
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "throughput": round(ok_total / duration, 2) if duration else 0,
+        "endpoints": endpoints,
+        "stages": stages
+    }
+
+
+def print_report(result):
+    summary = result["summary"]
+    print(f"\n{summary['requests']} requests in {summary['duration_s']}s, {summary['errors']} errors, "
+          f"{summary['throughput']} req/s")
+    print(f"\n{'endpoint':<14}{'requests':>9}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, e in summary["endpoints"].items():
+        print(f"{name:<14}{e['requests']:>9}{e['errors']:>8}{e['throughput']:>8}"
+              f"{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}")
+    print(f"\n{'stage':<24}{'count':>7}{'p50 ms':>9}{'p99 ms':>9}")
+    for stage, s in summary["stages"].items():
+        print(f"{stage:<24}{s['count']:>7}{s['p50_ms']:>9}{s['p99_ms']:>9}")
+    if result.get("memory"):
+        print(f"\n{'service':<14}{'peak MB':>9}{'last MB':>9}")
+        for name, m in result["memory"].items():
+            print(f"{name:<14}{m['peak_mb']:>9}{m['last_mb']:>9}")
+
+
+def compare(base_path, new_path):
+    """Print throughput and latency changes between two result files"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def delta(old, current):
+        if not old:
+            return ""
+        return f"{(current - old) / old * 100:+.1f}%"
+
+    print(f"{base['meta'].get('git_revision')} -> {new['meta'].get('git_revision')}")
+    print(f"{'metric':<40}{'base':>10}{'new':>10}{'change':>10}")
+    rows = [("throughput req/s", base["summary"]["throughput"], new["summary"]["throughput"])]
+    for name, e in new["summary"]["endpoints"].items():
+        old = base["summary"]["endpoints"].get(name, {})
+        for key in ("throughput", "p50_ms", "p99_ms"):
+            rows.append((f"{name} {key}", old.get(key), e[key]))
+    for stage, s in new["summary"]["stages"].items():
+        old = base["summary"]["stages"].get(stage, {})
+        for key in ("p50_ms", "p99_ms"):
+            rows.append((f"stage {stage} {key}", old.get(key), s[key]))
+    for label, old, current in rows:
+        print(f"{label:<40}{'' if old is None else old:>10}{current:>10}{delta(old, current):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the STS/TTT pipeline")
+    parser.add_argument("--target", help="Benchmark a running backend01 at this URL instead of starting one")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("text=1,voice=1,voice_stream=1"),
+                        help="Endpoint weights, e.g. text=1,voice=2,voice_stream=1")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients (max in flight with --rate)")
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate in requests/sec")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of load excluded from the results")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--audio-dir", help="Use recorded audio files instead of the synthetic corpus")
+    parser.add_argument("--llm", choices=("fake-ollama", "simulation"), default="fake-ollama",
+                        help="Run backend02 against a fake Ollama server or in its simulation mode")
+    parser.add_argument("--ollama-prefill", type=float, default=0.15)
+    parser.add_argument("--ollama-tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--ollama-tokens", type=int, default=24)
+    parser.add_argument("--ollama-hosts", type=int, default=1, help="Fake Ollama servers behind backend02's host pool")
+    parser.add_argument("--ollama-fail-rate", type=float, default=0.0,
+                        help="Share of generations each fake Ollama fails before the first token")
+    parser.add_argument("--piper-model", help="Real Piper .onnx voice (default: fake Piper CLI)")
+    parser.add_argument("--fake-piper-rtf", type=float, default=0.05, help="Fake Piper synthesis time per audio second")
+    parser.add_argument("--no-tts", action="store_true", help="Run backend01 without TTS")
+    parser.add_argument("--vosk-model", help="Vosk model directory (default: backend01 runs with STT_SIMULATION=true)")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers per backend")
+    parser.add_argument("--backend01-port", type=int, default=5101)
+    parser.add_argument("--backend02-port", type=int, default=5102)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--output", help="Result file (default: benchmark/results/<time>-<revision>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    corpus = load_corpus(args.audio_dir)
+    if not corpus:
+        parser.error(f"no audio files found in {args.audio_dir}")
+
+    stack = None
+    base_url = args.target
+    if not base_url:
+        print("Starting local stack...")
+        stack = LocalStack(args).start()
+        base_url = stack.backend01_url
+    sampler = MemorySampler(stack.pids() if stack else {}).start()
+
+    try:
+        ready = requests.get(f"{base_url}/ready", timeout=5)
+        readiness = ready.json() if ready.status_code in (200, 503) else {}
+        generator = LoadGenerator(base_url, corpus, args.mix, args.seed)
+        mode = f"rate {args.rate}/s" if args.rate else f"concurrency {args.concurrency}"
+        print(f"Running {mode} for {args.warmup}s warm-up + {args.duration}s against {base_url}")
+
+        start = time.time()
+        deadline = start + args.warmup + args.duration
+        if args.rate:
+            generator.open_loop(args.rate, args.concurrency, deadline, args.requests)
+        else:
+            generator.closed_loop(args.concurrency, deadline, args.requests)
+        measured_from = start + args.warmup
+        records = [r for r in generator.records if r["start"] >= measured_from]
+        duration = max(r["start"] + r["latency"] for r in records) - measured_from if records else 0
+        # How backend02 spread the generations over the fake Ollama hosts
+        llm_hosts = requests.get(f"{stack.backend02_url}/ollama/hosts", timeout=5).json()["hosts"] if stack else []
+    except Exception:
+        if stack:
+            for name in stack.processes:
+                print(f"--- {name} log ---\n{stack.log_tail(name)}", file=sys.stderr)
+        raise
+    finally:
+        memory = sampler.stop()
+        if stack:
+            stack.stop()
+
+    result = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.target or "local",
+            "args": {k: v for k, v in vars(args).items() if k != "compare"},
+            "host": {"cpus": os.cpu_count(), "python": platform.python_version(), "platform": platform.platform()},
+            "corpus": {"utterances": len(corpus), "source": args.audio_dir or "synthetic"},
+            "readiness": readiness
+        },
+        "summary": summarize(records, duration),
+        "memory": memory,
+        "llm_hosts": llm_hosts
+    }
+    print_report(result)
+    for name, summary in result["summary"]["endpoints"].items():
+        if summary["requests"] and summary["errors"] == summary["requests"]:
+            print(f"Warning: every {name} request failed ({summary['statuses']}); its results are meaningless",
+                  file=sys.stderr)
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['meta']['git_revision'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Synthetic speech corpus for benchmarks
+
+Utterances come from corpus.txt. Their audio is generated deterministically:
+each word becomes a short voiced segment (a harmonic tone with a pitch glide
+and an attack/decay envelope) separated by short pauses, written as 16 kHz
+mono PCM16 WAV. It is not intelligible speech, but it has speech-like length,
+energy and pauses, so upload, ffmpeg decode and Vosk decode cost scale the
+way they do for real utterances. Real recordings can be used instead by
+pointing the benchmark at a directory of audio files.
+"""
+
+import io
+import math
+import os
+import random
+import wave
+from array import array
+
+SAMPLE_RATE = 16000
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.txt")
+AUDIO_EXTENSIONS = (".wav", ".webm", ".ogg", ".mp3", ".flac")
+
+
+def load_sentences(path=CORPUS_FILE):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def synthesize_utterance(text, seed=0):
+    """Return WAV bytes of a speech-like signal with one voiced segment per word"""
+    rng = random.Random(f"{seed}:{text}")
+    samples = array("h", [0]) * int(0.25 * SAMPLE_RATE)  # leading silence
+    for word in text.split():
+        duration = 0.12 + 0.06 * len(word.strip(",.?!"))
+        f0 = rng.uniform(100, 220)
+        glide = rng.uniform(-30, 30)
+        count = int(duration * SAMPLE_RATE)
+        phase = 0.0
+        for i in range(count):
+            t = i / count
+            phase += 2 * math.pi * (f0 + glide * t) / SAMPLE_RATE
+            # Attack and decay so segment edges look like word onsets and offsets
+            envelope = min(1.0, t * 10) * min(1.0, (1 - t) * 6)
+            value = math.sin(phase) + 0.5 * math.sin(2 * phase) + 0.25 * math.sin(3 * phase)
+            samples.append(int(6000 * envelope * value + rng.uniform(-200, 200)))
+        samples.extend(array("h", [0]) * int(rng.uniform(0.05, 0.15) * SAMPLE_RATE))  # pause
+    samples.extend(array("h", [0]) * int(0.25 * SAMPLE_RATE))  # trailing silence
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def load_corpus(audio_dir=None):
+    """Return a list of (text, audio bytes, filename) utterances
+
+    With audio_dir, every audio file in it is used and its text is the file
+    name; otherwise the synthetic corpus is generated from corpus.txt.
+    """
+    if audio_dir:
+        utterances = []
+        for filename in sorted(os.listdir(audio_dir)):
+            if filename.lower().endswith(AUDIO_EXTENSIONS):
+                with open(os.path.join(audio_dir, filename), "rb") as f:
+                    utterances.append((os.path.splitext(filename)[0], f.read(), filename))
+        return utterances
+    return [(text, synthesize_utterance(text, seed=index), f"utterance-{index:02d}.wav")
+            for index, text in enumerate(load_sentences())]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Fake Ollama server for benchmarks
+
+Implements the parts of the Ollama API the LLM backend uses (/api/generate,
+streamed or not, /api/tags and /api/ps) with a configurable prefill delay and
+token rate, so backend02 can run its real Ollama code path without a GPU or
+model. A model "loads" on its first request, which costs --load-delay and
+then shows up in /api/ps; --fail-rate answers that share of generations with
+a 500 before any token. Start several on different ports to exercise
+backend02's host pool.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_WORDS = ("Sure, here is a short answer to your question. It is generated by a fake "
+                  "model so the benchmark only measures the serving path.").split(" ")
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOllama/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.model}]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [{"name": name, "model": name} for name in sorted(self.server.loaded)]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, status=404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if random.random() < self.server.fail_rate:
+            self.server.record_failure()
+            self._send_json({"error": "injected failure"}, status=500)
+            return
+        num_predict = payload.get("options", {}).get("num_predict", self.server.tokens)
+        # Number every reply so downstream caches see distinct text, as with sampled output
+        words = [f"Answer {self.server.record_request()}."] + RESPONSE_WORDS
+        words = [words[i % len(words)] for i in range(min(num_predict, self.server.tokens))]
+        tokens = [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+        context = (payload.get("context") or []) + [0] * (len(payload.get("prompt", "").split()) + len(tokens))
+
+        time.sleep(self.server.prefill + self.server.load(payload.get("model", self.server.model)))
+        if not payload.get("stream", True):
+            time.sleep(len(tokens) / self.server.tokens_per_sec)
+            self._send_json({"model": self.server.model, "response": "".join(tokens), "done": True,
+                             "context": context, "prompt_eval_count": len(payload.get("prompt", "").split())})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, token in enumerate(tokens):
+            if index > 0:
+                time.sleep(1.0 / self.server.tokens_per_sec)
+            self._write_chunk({"model": self.server.model, "response": token, "done": False})
+        self._write_chunk({"model": self.server.model, "response": "", "done": True, "context": context})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, obj):
+        data = (json.dumps(obj) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, obj, status=200):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, prefill=0.15, tokens_per_sec=40.0, tokens=24, model="fake:latest", load_delay=0.0,
+                 fail_rate=0.0):
+        super().__init__(address, FakeOllamaHandler)
+        self.prefill = prefill
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = tokens
+        self.model = model
+        self.load_delay = load_delay
+        self.fail_rate = fail_rate
+        self.loaded = set()
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def load(self, model):
+        """Seconds this request spends loading model, which stays loaded afterwards"""
+        with self._lock:
+            if model in self.loaded:
+                return 0.0
+            self.loaded.add(model)
+        return self.load_delay
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled connections at shutdown are expected, not errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_fake_ollama(port=0, **options):
+    """Start a fake Ollama server on a background thread and return it"""
+    server = FakeOllamaServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--prefill", type=float, default=0.15, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--tokens", type=int, default=24, help="Tokens per reply")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="Extra seconds on a model's first request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of generations answered with a 500")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(("127.0.0.1", args.port), args.prefill, args.tokens_per_sec, args.tokens,
+                              load_delay=args.load_delay, fail_rate=args.fail_rate)
+    print(f"Fake Ollama listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -38,8 +38,17 @@ const ttsLatencyBar = document.getElementById('tts-latency-bar');
 const STT_TTS_BACKEND_URL = 'http://localhost:5001';
 const LLM_BACKEND_URL = 'http://localhost:5002';
 
+// Streaming STT settings
+const STT_TIMESLICE_MS = 250;       // MediaRecorder chunk size sent over the WebSocket
+const PCM_SAMPLE_RATE = 16000;      // What Vosk decodes; the AudioWorklet downsamples the mic to it
+const PCM_CHUNK_SAMPLES = 4000;     // 250ms of PCM per chunk sent over the WebSocket
+const PCM_WORKLET_URL = '../src/js/pcm-recorder-worklet.js';
+const STT_FINAL_TIMEOUT_MS = 5000;  // How long to wait for the final transcription
+
 // Voice recording variables
 let mediaRecorder;
+let pcmRecorder = null;  // AudioWorklet PCM capture; MediaRecorder webm is the fallback
+let pcmWorkletContext = null;  // Audio context the PCM worklet module was added to
 let audioChunks = [];
 let isRecording = false;
 let userId = 'user-' + Date.now(); // Simple user ID generation
@@ -54,6 +63,9 @@ let isSpeaking = false;
 // Media stream variables
 let mediaStream = null;
 
+// WebSocket streaming STT session for the current recording (null when unavailable)
+let sttSession = null;
+
 // Latency tracking variables
 let interactionStartTime = 0;
 let sttStartTime = 0;
@@ -85,6 +97,9 @@ let currentPlayingAudio = null;
 let currentAudioContext = null;
 let currentAudioAnalyser = null;
 
+// Abort controller for the sentence-level TTS stream currently playing
+let ttsStreamAbortController = null;
+
 // Add all event listeners
 function addEventListeners() {
     // Speech to Speech events
@@ -418,6 +433,23 @@ function showTypingIndicator() {
     chatContainer.scrollTop = chatContainer.scrollHeight;
 }
 
+// Replace the typing dots with the partial response streamed so far
+function updateTypingIndicatorText(text) {
+    const typingIndicator = document.getElementById('typing-indicator');
+    if (!typingIndicator) return;
+    
+    let partialEl = typingIndicator.querySelector('.partial-response');
+    if (!partialEl) {
+        const dots = typingIndicator.querySelector('.flex.space-x-1');
+        if (dots) dots.remove();
+        partialEl = document.createElement('div');
+        partialEl.className = 'partial-response mt-1 text-gray-700 dark:text-gray-300';
+        typingIndicator.querySelector('.font-medium').after(partialEl);
+    }
+    partialEl.textContent = text;
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+}
+
 // Remove typing indicator
 function removeTypingIndicator() {
     const typingIndicator = document.getElementById('typing-indicator');
@@ -700,6 +732,7 @@ function permanentlyStopMicrophone() {
     // Reset recording state
     isRecording = false;
     mediaRecorder = null;
+    pcmRecorder = null;
     audioChunks = [];
 }
 
@@ -719,22 +752,30 @@ async function startRecording() {
         // Start audio visualization
         startUserSpeechVisualization();
         
-        // Start recording
+        // Start recording: raw PCM where AudioWorklet is available, so the server needs no ffmpeg
         const stream = microphone.mediaStream;
-        mediaRecorder = new MediaRecorder(stream);
         audioChunks = [];
+        pcmRecorder = await startPcmRecorder();
         
-        mediaRecorder.ondataavailable = event => {
-            audioChunks.push(event.data);
-        };
-        
-        mediaRecorder.onstop = async () => {
-            const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
-            await sendAudioToBackend(audioBlob);
-            stopUserSpeechVisualization();
-        };
+        // Stream audio to the server while recording so recognition keeps pace with speech
+        sttSession = openSttSession(pcmRecorder ? pcmRecorder.rate : null);
         
-        mediaRecorder.start();
+        if (pcmRecorder) {
+            pcmRecorder.onchunk = chunk => {
+                audioChunks.push(chunk);
+                sendPendingSttChunks(sttSession);
+            };
+        } else {
+            mediaRecorder = new MediaRecorder(stream);
+            mediaRecorder.ondataavailable = event => {
+                audioChunks.push(event.data);
+                sendPendingSttChunks(sttSession);
+            };
+            mediaRecorder.onstop = () => finishRecording(new Blob(audioChunks, { type: 'audio/webm' }));
+            
+            // Emit small timeslices instead of one blob at the end
+            mediaRecorder.start(STT_TIMESLICE_MS);
+        }
         isRecording = true;
         
         // Update UI
@@ -754,10 +795,81 @@ async function startRecording() {
     }
 }
 
+// Capture mono PCM16 at PCM_SAMPLE_RATE from the microphone with an AudioWorklet;
+// resolves to null where AudioWorklet is unavailable
+async function startPcmRecorder() {
+    if (!audioContext.audioWorklet) return null;
+    try {
+        if (pcmWorkletContext !== audioContext) {
+            await audioContext.audioWorklet.addModule(PCM_WORKLET_URL);
+            pcmWorkletContext = audioContext;
+        }
+        const node = new AudioWorkletNode(audioContext, 'pcm-recorder', {
+            numberOfOutputs: 0,
+            processorOptions: { targetRate: PCM_SAMPLE_RATE, chunkSamples: PCM_CHUNK_SAMPLES }
+        });
+        const source = microphone;
+        source.connect(node);
+        
+        let flushed;
+        const allFlushed = new Promise(resolve => { flushed = resolve; });
+        const recorder = {
+            // The worklet never upsamples, so a slower context records at its own rate
+            rate: Math.min(PCM_SAMPLE_RATE, audioContext.sampleRate),
+            onchunk: null,
+            // Collect the last partial chunk, then detach from the microphone
+            stop: async () => {
+                node.port.postMessage({ type: 'flush' });
+                await allFlushed;
+                try {
+                    source.disconnect(node);
+                } catch (e) {
+                    console.warn('Error disconnecting PCM recorder:', e);
+                }
+                node.port.close();
+            }
+        };
+        node.port.onmessage = event => {
+            if (event.data instanceof ArrayBuffer) {
+                if (recorder.onchunk) recorder.onchunk(event.data);
+            } else if (event.data.type === 'flushed') {
+                flushed();
+            }
+        };
+        return recorder;
+    } catch (error) {
+        console.warn('AudioWorklet PCM capture unavailable, recording webm instead:', error);
+        return null;
+    }
+}
+
+// Finish the streaming STT session and send the turn to the backend
+async function finishRecording(audio) {
+    const session = sttSession;
+    sttSession = null;
+    // Fall back to uploading the whole recording if streaming STT is unavailable
+    const streamedResult = session ? await finishSttSession(session) : null;
+    removeLiveTranscript();
+    await sendAudioToBackend(audio, streamedResult);
+    stopUserSpeechVisualization();
+}
+
+// Stop the PCM recorder once its last samples are in, then finish the turn
+async function stopPcmRecording() {
+    const recorder = pcmRecorder;
+    pcmRecorder = null;
+    await recorder.stop();
+    await finishRecording({ pcm: new Blob(audioChunks), rate: recorder.rate });
+}
+
 // Stop voice recording
 function stopRecording() {
-    if (mediaRecorder && isRecording) {
-        mediaRecorder.stop();
+    if ((mediaRecorder || pcmRecorder) && isRecording) {
+        if (pcmRecorder) {
+            stopPcmRecording();
+        } else {
+            mediaRecorder.stop();
+        }
         isRecording = false;
         
         // Update UI
@@ -773,6 +885,94 @@ function stopRecording() {
     }
 }
 
+// Open a streaming recognition WebSocket; partial results update a live transcript.
+// With pcmRate the chunks are raw PCM16 at that rate, otherwise MediaRecorder webm
+function openSttSession(pcmRate = null) {
+    let socket;
+    try {
+        const query = pcmRate ? `?sample_rate=${pcmRate}` : '';
+        socket = new WebSocket(`${STT_TTS_BACKEND_URL.replace(/^http/, 'ws')}/stt/stream${query}`);
+    } catch (error) {
+        console.warn('Streaming STT unavailable:', error);
+        return null;
+    }
+    
+    const session = { socket: socket, sentChunks: 0 };
+    let committedText = '';
+    
+    // Chunks recorded before the socket opened are sent as soon as it does
+    socket.onopen = () => sendPendingSttChunks(session);
+    session.final = new Promise(resolve => {
+        socket.onmessage = event => {
+            const message = JSON.parse(event.data);
+            if (message.type === 'partial') {
+                showLiveTranscript(`${committedText} ${message.text}`.trim());
+            } else if (message.type === 'result') {
+                committedText = `${committedText} ${message.text}`.trim();
+                showLiveTranscript(committedText);
+            } else if (message.type === 'final') {
+                resolve(message);
+                socket.close();
+            } else if (message.type === 'error') {
+                console.warn('Streaming STT error:', message.error);
+                resolve(null);
+                socket.close();
+            }
+        };
+        socket.onerror = () => resolve(null);
+        socket.onclose = () => resolve(null);
+    });
+    
+    return session;
+}
+
+// Send any recorded chunks the streaming STT session has not seen yet
+function sendPendingSttChunks(session) {
+    if (!session || session.socket.readyState !== WebSocket.OPEN) return;
+    while (session.sentChunks < audioChunks.length) {
+        session.socket.send(audioChunks[session.sentChunks]);
+        session.sentChunks++;
+    }
+}
+
+// Signal end of speech and wait briefly for the final transcription
+async function finishSttSession(session) {
+    if (session.socket.readyState !== WebSocket.OPEN) {
+        session.socket.close();
+        return null;
+    }
+    
+    sendPendingSttChunks(session);
+    session.socket.send(JSON.stringify({ type: 'end' }));
+    const timeout = new Promise(resolve => setTimeout(() => resolve(null), STT_FINAL_TIMEOUT_MS));
+    const result = await Promise.race([session.final, timeout]);
+    if (!result) {
+        session.socket.close();
+    }
+    return result;
+}
+
+// Show what the recognizer has heard so far while the user is still speaking
+function showLiveTranscript(text) {
+    let liveDiv = document.getElementById('live-transcript');
+    if (!liveDiv) {
+        liveDiv = document.createElement('div');
+        liveDiv.id = 'live-transcript';
+        liveDiv.className = 'message-animation mb-3 p-3 rounded-lg bg-blue-100 dark:bg-blue-900 mr-4 w-[70%] ml-auto opacity-70 text-blue-700 dark:text-blue-300 italic';
+        chatContainer.appendChild(liveDiv);
+    }
+    liveDiv.textContent = `🎤 ${text}`;
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+}
+
+// Remove the live transcript once the final text is known
+function removeLiveTranscript() {
+    const liveDiv = document.getElementById('live-transcript');
+    if (liveDiv) {
+        liveDiv.remove();
+    }
+}
+
 // Toggle recording state
 function toggleRecording() {
     if (isRecording) {
@@ -782,72 +982,112 @@ function toggleRecording() {
     }
 }
 
-// Send audio blob to backend
-async function sendAudioToBackend(audioBlob) {
-    const formData = new FormData();
-    formData.append('audio', audioBlob, 'recording.webm');
-    formData.append('user_id', userId);
+// Send the recording (a webm blob, or { pcm, rate } from the AudioWorklet) or text
+// already recognized over /stt/stream to backend and consume the pipelined
+// STT -> LLM -> TTS stream
+async function sendAudioToBackend(audio, streamedResult = null) {
+    let url = `${STT_TTS_BACKEND_URL}/chat/voice/stream`;
+    let body;
+    const headers = {};
+    if (!streamedResult && audio.pcm) {
+        // Raw PCM is the whole request body, so the other fields go in the query string
+        body = audio.pcm;
+        headers['Content-Type'] = `audio/pcm;rate=${audio.rate}`;
+        url += `?${new URLSearchParams({ user_id: userId })}`;
+    } else {
+        body = new FormData();
+        if (streamedResult) {
+            body.append('transcription', streamedResult.text);
+        } else {
+            body.append('audio', audio, 'recording.webm');
+        }
+        body.append('user_id', userId);
+    }
+    // With streaming STT only the decode time left after speech ended counts
+    const streamedSttTime = streamedResult ? streamedResult.latency.stt : null;
+    
+    // Audio segments start playing while the LLM is still generating
+    const player = startChunkPlayer();
+    let partialResponse = '';
+    let firstAudioShown = false;
     
     try {
         // Start STT timing
         sttStartTime = Date.now();
         
-        const response = await fetch(`${STT_TTS_BACKEND_URL}/chat/voice`, {
+        const response = await fetch(url, {
             method: 'POST',
-            body: formData
+            headers: headers,
+            body: body,
+            signal: player.signal
         });
         
-        const data = await response.json();
-        
-        // Calculate STT latency
-        const sttTime = Date.now() - sttStartTime;
-        
-        // Calculate total interaction time
-        const totalTime = Date.now() - interactionStartTime;
-        
-        // Extract LLM latency from response
-        let llmLatency = 0;
-        if (data.latency && data.latency.llm) {
-            llmLatency = data.latency.llm;
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error || 'Failed to process voice message');
         }
         
-        // Update latency from backend if provided
-        if (data.latency) {
-            const sttLatency = data.latency.stt || 0;
-            const ttsLatency = data.latency.tts || 0;
-            updateLatencyDisplay(totalTime, sttLatency, llmLatency, ttsLatency);
-        } else {
-            updateLatencyDisplay(totalTime, sttTime, 0, 0);
-        }
-        
-        if (data.status === 'success') {
-            // Add transcribed text to chat (input voice as text)
-            addMessage(`🎤 You said: ${data.transcription}`, true);
-            
-            // Add AI response to chat (response text with voice) including latency info
-            addMessage(data.response, false, llmLatency);
-            
-            // Play TTS audio if available
-            if (data.tts_file) {
-                playTTS(data.tts_file);
+        let streamError = null;
+        await readNdjsonStream(response, event => {
+            switch (event.type) {
+                case 'transcription':
+                    // Add transcribed text to chat (input voice as text)
+                    addMessage(`🎤 You said: ${event.text}`, true);
+                    showTypingIndicator();
+                    sttLatency.textContent = formatTime(streamedSttTime ?? event.latency.stt);
+                    updateProgressBar(sttLatencyBar, streamedSttTime ?? event.latency.stt, 2000);
+                    break;
+                case 'no_speech':
+                    // The recording was silence; nothing was sent to the LLM
+                    showNotification('No speech detected, please try again', 'warning');
+                    break;
+                case 'text':
+                    partialResponse += event.token;
+                    updateTypingIndicatorText(partialResponse);
+                    break;
+                case 'audio':
+                    if (!firstAudioShown) {
+                        firstAudioShown = true;
+                        updateFirstAudioLatency(Date.now() - sttStartTime);
+                    }
+                    player.push(event.audio);
+                    break;
+                case 'error':
+                    streamError = event;
+                    break;
+                case 'done': {
+                    removeTypingIndicator();
+                    // Add AI response to chat (response text with voice) including latency info
+                    const latency = event.latency || {};
+                    addMessage(event.response, false, latency.llm || 0);
+                    const totalTime = Date.now() - interactionStartTime;
+                    updateLatencyDisplay(totalTime, streamedSttTime ?? latency.stt ?? 0, latency.llm || 0, latency.first_audio || 0);
+                    console.log('Voice pipeline latency:', latency);
+                    break;
+                }
             }
-            
-            // Update status
-            sttStatus.textContent = 'Ready';
-            sttStatus.classList.remove('text-warning');
-            sttStatus.classList.add('text-success');
-        } else {
-            showNotification(`Error: ${data.error || 'Failed to process voice message'}`, 'error');
-            sttStatus.textContent = 'Error';
-            sttStatus.classList.remove('text-warning');
-            sttStatus.classList.add('text-danger');
+        });
+        
+        if (streamError && streamError.stage === 'stt') {
+            throw new Error(streamError.error);
         }
+        
+        // Update status
+        sttStatus.textContent = 'Ready';
+        sttStatus.classList.remove('text-warning');
+        sttStatus.classList.add('text-success');
     } catch (error) {
+        removeTypingIndicator();
+        if (error.name === 'AbortError') {
+            return;
+        }
         console.error('Error sending audio to backend:', error);
-        showNotification("Failed to send voice message. Please try again.", 'error');
+        showNotification(`Error: ${error.message || 'Failed to send voice message. Please try again.'}`, 'error');
         sttStatus.textContent = 'Error';
         sttStatus.classList.remove('text-warning');
         sttStatus.classList.add('text-danger');
+    } finally {
+        player.finish();
     }
 }
 
@@ -1020,6 +1260,177 @@ async function playTTS(ttsFilePath) {
     }
 }
 
+// Read a newline-delimited JSON response body and call onEvent for each line
+async function readNdjsonStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let newlineIndex;
+        while ((newlineIndex = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newlineIndex).trim();
+            buffer = buffer.slice(newlineIndex + 1);
+            if (line) onEvent(JSON.parse(line));
+        }
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+}
+
+// Convert a base64 WAV chunk into an object URL the Audio element can play
+function wavChunkToUrl(base64Audio) {
+    const bytes = Uint8Array.from(atob(base64Audio), c => c.charCodeAt(0));
+    return URL.createObjectURL(new Blob([bytes], { type: 'audio/wav' }));
+}
+
+// Play one audio chunk; resolves when it ends, fails or is stopped
+function playAudioChunk(url, signal) {
+    return new Promise(resolve => {
+        if (signal.aborted) {
+            resolve();
+            return;
+        }
+        
+        const audio = new Audio(url);
+        currentPlayingAudio = audio;
+        stopAiVoiceBtn.disabled = false;
+        stopAiVoiceBtn.classList.remove('opacity-50');
+        
+        const finish = () => {
+            signal.removeEventListener('abort', finish);
+            audio.pause();
+            if (currentPlayingAudio === audio) {
+                currentPlayingAudio = null;
+            }
+            resolve();
+        };
+        
+        audio.addEventListener('playing', startSimpleAssistantVisualization);
+        audio.addEventListener('ended', finish);
+        audio.addEventListener('error', finish);
+        signal.addEventListener('abort', finish);
+        
+        audio.play().catch(error => {
+            console.error('Error playing TTS chunk:', error);
+            if (error.name === 'NotAllowedError') {
+                showNotification("Autoplay blocked. Click the mic again to hear responses.", 'warning');
+            }
+            finish();
+        });
+    });
+}
+
+// Start playback of a new reply streamed in audio chunks, stopping the previous one.
+// Chunks pushed to the returned player are played back in order as they arrive.
+function startChunkPlayer() {
+    if (ttsStreamAbortController) {
+        ttsStreamAbortController.abort();
+    }
+    if (currentPlayingAudio) {
+        currentPlayingAudio.pause();
+        currentPlayingAudio = null;
+    }
+    
+    const controller = new AbortController();
+    ttsStreamAbortController = controller;
+    
+    const chunkQueue = [];
+    let streamFinished = false;
+    let wakePlayer = null;
+    const wake = () => {
+        if (wakePlayer) {
+            wakePlayer();
+            wakePlayer = null;
+        }
+    };
+    
+    const playback = (async () => {
+        while (!controller.signal.aborted) {
+            if (chunkQueue.length > 0) {
+                const url = chunkQueue.shift();
+                await playAudioChunk(url, controller.signal);
+                URL.revokeObjectURL(url);
+            } else if (streamFinished) {
+                break;
+            } else {
+                await new Promise(resolve => { wakePlayer = resolve; });
+            }
+        }
+        chunkQueue.forEach(url => URL.revokeObjectURL(url));
+        stopSimpleAssistantVisualization();
+        stopAiVoiceBtn.disabled = true;
+        stopAiVoiceBtn.classList.add('opacity-50');
+        if (ttsStreamAbortController === controller) {
+            ttsStreamAbortController = null;
+        }
+    })();
+    
+    return {
+        signal: controller.signal,
+        push(base64Audio) {
+            chunkQueue.push(wavChunkToUrl(base64Audio));
+            wake();
+        },
+        finish() {
+            streamFinished = true;
+            wake();
+        },
+        playback
+    };
+}
+
+// Show time-to-first-audio in the TTS latency slot
+function updateFirstAudioLatency(firstAudioTime) {
+    ttsLatency.textContent = formatTime(firstAudioTime);
+    updateProgressBar(ttsLatencyBar, firstAudioTime, 2000);
+}
+
+// Stream TTS sentence by sentence and start playback as soon as the first chunk arrives
+async function playTTSStream(text) {
+    const player = startChunkPlayer();
+    const requestStartTime = Date.now();
+    
+    try {
+        const response = await fetch(`${STT_TTS_BACKEND_URL}/tts/stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ text: text, user_id: userId }),
+            signal: player.signal
+        });
+        
+        if (!response.ok) {
+            throw new Error(`TTS stream failed with status ${response.status}`);
+        }
+        
+        await readNdjsonStream(response, event => {
+            if (event.type === 'audio') {
+                if (event.index === 0) {
+                    // Time-to-first-audio is what the listener actually waits for
+                    updateFirstAudioLatency(Date.now() - requestStartTime);
+                }
+                player.push(event.audio);
+            } else if (event.type === 'done') {
+                console.log('TTS stream completed:', event.latency);
+            }
+        });
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Error streaming TTS audio:', error);
+            showNotification("Failed to play AI voice response.", 'error');
+        }
+    } finally {
+        player.finish();
+    }
+    
+    await player.playback;
+}
+
 // Simple assistant visualization without audio context
 function startSimpleAssistantVisualization() {
     console.log('Starting simple visualization');
@@ -1064,6 +1475,12 @@ function stopSimpleAssistantVisualization() {
 function stopAiVoice() {
     showNotification("🔇 AI voice output stopped", 'info');
     
+    // Stop any streamed TTS that is still arriving or queued
+    if (ttsStreamAbortController) {
+        ttsStreamAbortController.abort();
+        ttsStreamAbortController = null;
+    }
+    
     // Stop any currently playing audio
     if (currentPlayingAudio) {
         currentPlayingAudio.pause();
@@ -1084,15 +1501,8 @@ function stopAiVoice() {
     stopAiVoiceBtn.disabled = true;
     stopAiVoiceBtn.classList.add('opacity-50');
     
-    // Send request to backend to stop the current TTS playback
-    fetch(`${STT_TTS_BACKEND_URL}/voice/stop`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ user_id: userId })
-    })
-    .then(response => response.json())
+    // Tell the backend to stop synthesis and generation for this turn too
+    cancelServerTurn()
     .then(data => {
         if (data.status === 'success') {
             showNotification("🔇 AI voice output stopped", 'info');
@@ -1106,10 +1516,28 @@ function stopAiVoice() {
     });
 }
 
+// Cancel this user's in-flight turns on the server; aborting the fetch alone
+// leaves the LLM generation and Piper running to completion
+async function cancelServerTurn() {
+    const response = await fetch(`${STT_TTS_BACKEND_URL}/voice/stop`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ user_id: userId })
+    });
+    const data = await response.json();
+    if (data.reclaimed) {
+        console.log('Compute reclaimed by stop:', data.reclaimed);
+    }
+    return data;
+}
+
 // Stop generating response
 function stopGeneratingResponse() {
     if (isGeneratingResponse && currentAbortController) {
         currentAbortController.abort();
+        cancelServerTurn().catch(error => console.error('Error cancelling response generation:', error));
         isGeneratingResponse = false;
         toggleSendStopButtons();
         removeTypingIndicator();
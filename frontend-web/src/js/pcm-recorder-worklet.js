@@ -0,0 +1,53 @@
+// AudioWorklet that turns microphone audio into 16 kHz mono PCM16 chunks,
+// so uploads can skip MediaRecorder's webm and the server's ffmpeg decode
+
+class PcmRecorderProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        const { targetRate = 16000, chunkSamples = 4000 } = options.processorOptions || {};
+        // Never upsample; a slower context is sent at its own rate and declared as such
+        this.outputRate = Math.min(targetRate, sampleRate);
+        this.step = sampleRate / this.outputRate;  // input samples per output sample
+        this.nextOutput = this.step;
+        this.position = 0;
+        this.sum = 0;
+        this.count = 0;
+        this.chunk = new Int16Array(chunkSamples);
+        this.filled = 0;
+        this.port.onmessage = event => {
+            if (event.data.type === 'flush') {
+                this.flush();
+                this.port.postMessage({ type: 'flushed' });
+            }
+        };
+    }
+
+    process(inputs) {
+        const channel = inputs[0] && inputs[0][0];
+        if (!channel) return true;
+        for (let i = 0; i < channel.length; i++) {
+            // Average the input samples behind each output sample, a cheap low-pass before decimating
+            this.sum += channel[i];
+            this.count++;
+            this.position++;
+            if (this.position < this.nextOutput) continue;
+            this.nextOutput += this.step;
+            const sample = Math.max(-1, Math.min(1, this.sum / this.count));
+            this.chunk[this.filled++] = sample < 0 ? sample * 0x8000 : sample * 0x7fff;
+            this.sum = 0;
+            this.count = 0;
+            if (this.filled === this.chunk.length) this.flush();
+        }
+        return true;
+    }
+
+    // Hand the samples collected so far to the main thread
+    flush() {
+        if (this.filled === 0) return;
+        const pcm = this.chunk.slice(0, this.filled);
+        this.port.postMessage(pcm.buffer, [pcm.buffer]);
+        this.filled = 0;
+    }
+}
+
+registerProcessor('pcm-recorder', PcmRecorderProcessor);